@@ -0,0 +1,108 @@
+"""
+Checks of the Moran's I of `spatial_autocorrelation.py` against values computed by hand,
+on a 4x4 lattice with rook weights.
+
+Usage (from the 'code' folder):
+    python benchmarks/check_spatial_autocorrelation.py
+
+The exit code is 1 if a value differs from the expected one.
+"""
+
+# Import Libraries
+import os
+import sys
+import numpy as np
+from scipy import sparse
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+from functions.spatial_autocorrelation import moran, local_moran, row_standardize, _sample_without_replacement
+
+
+# side of the lattice
+SIDE = 4
+
+
+def rook_lattice(side):
+    """
+    returns the binary rook weights (sparse) of a side x side lattice, cells numbered by row
+    """
+    rows = []
+    cols = []
+    for i in range(side):
+        for j in range(side):
+            for di, dj in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                if 0 <= i + di < side and 0 <= j + dj < side:
+                    rows.append(i * side + j)
+                    cols.append((i + di) * side + j + dj)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(side * side, side * side))
+
+
+def expected_values():
+    """
+    returns the (name, computed, expected) checks, the expected values are computed by hand:
+
+    gradient y = column index, binary weights (24 edges, S0 = 48):
+        z = -1.5, -0.5, 0.5, 1.5 on each row, sum(z^2) = 20
+        z'Wz = 2 * (4 rows * 1.25 + 4 columns * 3 * 5/4) = 40, I = 16/48 * 40/20 = 2/3
+        S1 = 96, S2 = 4 * 4^2 + 8 * 6^2 + 4 * 8^2 = 608, var (normality) = 1/27 - 1/225
+        corner (0, 0): z = -1.5, neighbours -0.5 and -1.5, m2 = 1.25, Ii = -1.5 / 1.25 * -2 = 2.4
+
+    checkerboard y = (row + column) % 2, row standardized weights:
+        every neighbour has the opposite value, so I = -1 and every Ii = -1
+    """
+    W = rook_lattice(SIDE)
+    gradient = np.tile(np.arange(SIDE), SIDE).astype(float)
+    checkerboard = np.array([(i + j) % 2 for i in range(SIDE) for j in range(SIDE)], dtype=float)
+
+    gradient_global = moran(gradient, W, permutations=0)
+    gradient_local = local_moran(gradient, W, permutations=999, n_workers=1)
+    checkerboard_global = moran(checkerboard, row_standardize(W), permutations=999, n_workers=1)
+    checkerboard_local = local_moran(checkerboard, row_standardize(W), permutations=0)
+
+    return [
+        ("gradient I", gradient_global["I"], 2 / 3),
+        ("gradient expectation", gradient_global["expectation"], -1 / 15),
+        ("gradient variance (normality)", gradient_global["variance_normality"], 1 / 27 - 1 / 225),
+        ("gradient Ii of the corner", gradient_local["Ii"].values[0], 2.4),
+        ("gradient sum of Ii", gradient_local["Ii"].sum(), 40 / 1.25),
+        ("gradient quadrant of the corner", gradient_local["quadrant"].values[0], 3),
+        ("checkerboard I", checkerboard_global["I"], -1.0),
+        ("checkerboard Ii", checkerboard_local["Ii"].values, np.full(SIDE * SIDE, -1.0)),
+        ("checkerboard quadrants", np.isin(checkerboard_local["quadrant"].values, [2, 4]).all(), True),
+        ("checkerboard p-value (permutation)", checkerboard_global["p_permutation"] <= 0.01, True)
+    ]
+
+
+def check_sampling():
+    """
+    returns the (name, computed, expected) checks of the draw of distinct neighbours, with k close to the pool
+    """
+    sample = _sample_without_replacement(np.random.default_rng(0), 20000, 133, 60)
+    counts = np.bincount(sample.ravel(), minlength=133)
+    first_counts = np.bincount(sample[:, 0], minlength=133)
+    return [
+        ("distinct neighbours", all(len(set(row)) == 60 for row in sample), True),
+        ("neighbours in range", sample.min() >= 0 and sample.max() < 133, True),
+        ("uniform neighbours", counts.min() > 0.8 * counts.mean() and counts.max() < 1.2 * counts.mean(), True),
+        ("uniform first neighbour", first_counts.min() > 0.6 * first_counts.mean() and first_counts.max() < 1.4 * first_counts.mean(), True)
+    ]
+
+
+def main():
+    failures = []
+    for name, computed, expected in expected_values() + check_sampling():
+        ok = np.allclose(computed, expected)
+        print("  - %-36s %s" % (name, "ok" if ok else "FAILED (" + str(computed) + " instead of " + str(expected) + ")"))
+        if not ok:
+            failures.append(name)
+
+    if failures:
+        print("\n> Failed:", ", ".join(failures))
+        sys.exit(1)
+    print("\n> All checks passed")
+
+
+if __name__ == "__main__":
+    main()
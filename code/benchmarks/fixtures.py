@@ -0,0 +1,170 @@
+# Import Libraries
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+
+
+# center of the synthetic data (Udine)
+CENTER_LAT = 46.0637
+CENTER_LON = 13.2353
+
+# degrees of latitude in a meter (approximation, enough for synthetic data)
+DEG_PER_METER = 1 / 111320
+
+
+def make_gpx(path, n_points, seed=0):
+    """
+    Input:
+        > path          path of the gpx file to write
+        > n_points      number of points of the track
+        > seed          seed of the random walk
+
+    Output:
+        > path of the written file (one track, one segment, a point every second with elevation and time)
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 3, size=(n_points, 2)).cumsum(axis=0) * DEG_PER_METER
+    lats = CENTER_LAT + steps[:, 0]
+    lons = CENTER_LON + steps[:, 1] / np.cos(np.radians(CENTER_LAT))
+    elevations = 110 + rng.normal(0, 0.5, size=n_points).cumsum()
+    times = pd.date_range("2021-12-27 08:00:00", periods=n_points, freq="s").strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    with open(path, "w", encoding="UTF-8") as gpx_file:
+        gpx_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        gpx_file.write('<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="benchmarks">\n')
+        gpx_file.write(' <trk>\n  <name>Synthetic track</name>\n  <trkseg>\n')
+        for lat, lon, ele, time in zip(lats, lons, elevations, times):
+            gpx_file.write('   <trkpt lat="%.6f" lon="%.6f"><ele>%.1f</ele><time>%s</time></trkpt>\n' % (lat, lon, ele, time))
+        gpx_file.write('  </trkseg>\n </trk>\n</gpx>\n')
+
+    return path
+
+
+def make_gpx_folder(folder, n_files, n_points, seed=0):
+    """
+    writes n_files synthetic gpx files in the given folder (see `make_gpx()`), returns the folder
+    """
+    os.makedirs(folder, exist_ok=True)
+    for i in range(n_files):
+        make_gpx(os.path.join(folder, "track_%04d.gpx" % i), n_points, seed + i)
+    return folder
+
+
+def make_municipalities(n_side, cell_size=2000, seed=0):
+    """
+    Input:
+        > n_side        the municipalities are a grid of n_side x n_side squares
+        > cell_size     side of each square (m)
+        > seed          seed of the random costs
+
+    Output:
+        > geodataframe (EPSG:4326) with columns 'COMUNE', 'Municipality', 'Sale', 'Rent', 'geometry'
+          (like the ISTAT shapefile joined with the house costs)
+    """
+    rng = np.random.default_rng(seed)
+    step_lat = cell_size * DEG_PER_METER
+    step_lon = step_lat / np.cos(np.radians(CENTER_LAT))
+    lat0 = CENTER_LAT - step_lat * n_side / 2
+    lon0 = CENTER_LON - step_lon * n_side / 2
+
+    geoms = []
+    for i in range(n_side):
+        for j in range(n_side):
+            geoms.append(box(lon0 + j * step_lon, lat0 + i * step_lat, lon0 + (j + 1) * step_lon, lat0 + (i + 1) * step_lat))
+
+    names = ["Comune %d" % i for i in range(len(geoms))]
+    return gpd.GeoDataFrame({
+        "COMUNE": names,
+        "Municipality": names,
+        "Sale": rng.uniform(800, 2500, size=len(geoms)),
+        "Rent": rng.uniform(5, 12, size=len(geoms))
+        }, geometry=geoms, crs=4326)
+
+
+def make_points(n_points, radius=5000, seed=0, categories=None):
+    """
+    Input:
+        > n_points      number of points
+        > radius        the points are uniformly distributed in a square of side 2*radius (m) around the center
+        > seed          seed of the random positions
+        > categories    list of categories, assigned at random to the 'category' column (optional)
+
+    Output:
+        > geodataframe (EPSG:4326) with columns 'name' and 'geometry' (and 'category')
+    """
+    rng = np.random.default_rng(seed)
+    lats = CENTER_LAT + rng.uniform(-radius, radius, size=n_points) * DEG_PER_METER
+    lons = CENTER_LON + rng.uniform(-radius, radius, size=n_points) * DEG_PER_METER / np.cos(np.radians(CENTER_LAT))
+    points = gpd.GeoDataFrame({"name": ["Point %d" % i for i in range(n_points)]}, geometry=gpd.points_from_xy(lons, lats), crs=4326)
+    if categories is not None:
+        points["category"] = rng.choice(categories, size=n_points)
+    return points
+
+
+def make_grid_network(n_side, spacing=50):
+    """
+    Input:
+        > n_side        the network is a grid of n_side x n_side nodes
+        > spacing       distance between two adjacent nodes (m)
+
+    Output:
+        > tuple (nodes, edges), with the columns returned by pyrosm (see `build_routing_graph()`):
+            - nodes: 'id', 'lon', 'lat', 'geometry'
+            - edges: 'u', 'v', 'length'
+    """
+    step_lat = spacing * DEG_PER_METER
+    step_lon = step_lat / np.cos(np.radians(CENTER_LAT))
+    i, j = np.meshgrid(np.arange(n_side), np.arange(n_side), indexing="ij")
+    ids = (i * n_side + j).ravel() + 1
+    lats = (CENTER_LAT - step_lat * n_side / 2 + i * step_lat).ravel()
+    lons = (CENTER_LON - step_lon * n_side / 2 + j * step_lon).ravel()
+    nodes = gpd.GeoDataFrame({"id": ids, "lon": lons, "lat": lats}, geometry=gpd.points_from_xy(lons, lats), crs=4326)
+
+    horizontal = (j < n_side - 1).ravel()
+    vertical = (i < n_side - 1).ravel()
+    u = np.concatenate([ids[horizontal], ids[vertical]])
+    v = np.concatenate([ids[horizontal] + 1, ids[vertical] + n_side])
+    edges = pd.DataFrame({"u": u, "v": v, "length": float(spacing)})
+
+    return (nodes, edges)
+
+
+def make_pbf(path, n_side, spacing=50, n_pois=200, seed=0):
+    """
+    Input:
+        > path          path of the PBF file to write
+        > n_side        the street network is a grid of n_side x n_side nodes
+        > spacing       distance between two adjacent nodes (m)
+        > n_pois        number of supermarkets, restaurants and universities (as tagged nodes)
+        > seed          seed of the random positions of the places
+
+    Output:
+        > path of the written file, None if `osmium` (pyosmium) is not available
+    """
+    try:
+        import osmium
+    except ImportError:
+        return None
+
+    nodes, edges = make_grid_network(n_side, spacing)
+    pois = make_points(n_pois, radius=spacing * n_side / 2, seed=seed)
+    tags = [("shop", "supermarket"), ("amenity", "restaurant"), ("amenity", "university")]
+
+    if os.path.exists(path):
+        os.remove(path)
+    writer = osmium.SimpleWriter(path)
+    try:
+        for node_id, lon, lat in zip(nodes["id"].values, nodes["lon"].values, nodes["lat"].values):
+            writer.add_node(osmium.osm.mutable.Node(id=int(node_id), location=(float(lon), float(lat)), version=1, tags={}))
+        for k, geom in enumerate(pois.geometry):
+            key, value = tags[k % len(tags)]
+            poi_tags = {key: value, "name": pois["name"].values[k]}
+            writer.add_node(osmium.osm.mutable.Node(id=int(len(nodes) + k + 1), location=(geom.x, geom.y), version=1, tags=poi_tags))
+        for k, (u, v) in enumerate(zip(edges["u"].values, edges["v"].values)):
+            writer.add_way(osmium.osm.mutable.Way(id=k + 1, nodes=[int(u), int(v)], version=1, tags={"highway": "residential", "name": "Via %d" % (k % 50)}))
+    finally:
+        writer.close()
+
+    return path
@@ -0,0 +1,209 @@
+"""
+Benchmarks of the pipeline stages, on synthetic data.
+
+Usage (from the 'code' folder):
+    python benchmarks/run_benchmarks.py                          # run and save the results of the current commit
+    python benchmarks/run_benchmarks.py --size medium            # larger fixtures
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<commit>.json
+
+The results are saved as benchmarks/results/<commit>.json, so that two commits can be compared:
+with --compare, the stages slower than the baseline by more than --threshold are reported
+and the exit code is 1.
+"""
+
+# Import Libraries
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+import numpy as np
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+from benchmarks.fixtures import make_gpx_folder, make_municipalities, make_points, make_grid_network, make_pbf, CENTER_LAT, CENTER_LON
+from functions.osm_extract import clip_to_area
+from functions.routing_graph import build_routing_graph
+from functions.routing import nearest_facility
+from functions.snapping import snap_to_nodes
+from functions.distance_fields import compute_distance_field
+from functions.dataviz_geopandas import count_points_in_area, count_points_in_areas, get_buffer_areas
+from functions.gpx_reader import read_gpx_arrays, read_gpx_folder
+from functions.route_stats import summarize_arrays
+from functions.polyline import simplify_coords
+from functions.dataviz_folium import create_folium_map, create_folium_map_choropleth
+
+
+# size of the fixtures
+SIZES = {
+    "small": {"grid": 100, "points": 2000, "gpx_files": 8, "gpx_points": 5000, "municipalities": 15, "facilities": 50, "pbf_grid": 60},
+    "medium": {"grid": 300, "points": 20000, "gpx_files": 32, "gpx_points": 20000, "municipalities": 45, "facilities": 200, "pbf_grid": 150}
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def measure(func, repeat):
+    """
+    Input:
+        > func      function without arguments, the stage to measure
+        > repeat    number of timed runs
+
+    Output:
+        > dictionary with the min and median wall time (s) of the runs, and the peak memory (MB)
+          allocated by python during one more run (traced with tracemalloc, not timed)
+    """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"time_min": min(times), "time_median": float(np.median(times)), "peak_memory_mb": peak / 2**20}
+
+
+def get_commit():
+    """
+    returns the short hash of the current commit ("unknown" outside of a git repository)
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_stages(size, tmp_dir):
+    """
+    returns a list of (stage name, function) on fixtures of the given size, created in tmp_dir
+    """
+    params = SIZES[size]
+    stages = []
+
+    # fixtures
+    nodes, edges = make_grid_network(params["grid"])
+    graph = build_routing_graph(nodes, edges)
+    points = make_points(params["points"], categories=["supermarket", "hospital", "eating place"])
+    facilities = make_points(params["facilities"], seed=1)
+    facility_nodes = snap_to_nodes(graph, facilities.geometry.x.values, facilities.geometry.y.values)[0]
+    municipalities = make_municipalities(params["municipalities"])
+    area = municipalities.unary_union.centroid.buffer(0.05)
+    area_geodf = get_buffer_areas(make_points(1, seed=2), [1000])
+    many_areas = get_buffer_areas(make_points(200, seed=3), [1000])
+    gpx_folder = make_gpx_folder(os.path.join(tmp_dir, "gpx"), params["gpx_files"], params["gpx_points"])
+    gpx_path = os.path.join(gpx_folder, sorted(os.listdir(gpx_folder))[0])
+    segment = read_gpx_arrays(gpx_path)[0]
+    routes = [(geodf, "Track " + name, ["run", "bike"][i % 2]) for i, (name, geodf) in enumerate(read_gpx_folder(gpx_folder, n_workers=1).items())]
+    fitness = make_points(params["points"], seed=4)
+    fitness["leisure"] = "fitness_centre"
+    reverse_geocoder = {"municipalities": municipalities[["COMUNE", "geometry"]], "streets": None, "cache": {}, "cache_path": None}
+
+    # OSM extraction, only if a PBF can be written
+    pbf_path = make_pbf(os.path.join(tmp_dir, "synthetic.osm.pbf"), params["pbf_grid"])
+    if pbf_path is not None:
+        import pyrosm
+        from functions.osm_extract import extract_layers
+        stages.append(("osm_extraction", lambda: extract_layers(pyrosm.OSM(pbf_path), ["all", "walking", "graph", "supermarket", "eating place", "university"], use_cache=False)))
+
+    stages += [
+        ("clip_to_area", lambda: clip_to_area(municipalities, area)),
+        ("graph_build", lambda: build_routing_graph(nodes, edges)),
+        ("snapping", lambda: snap_to_nodes(graph, points.geometry.x.values, points.geometry.y.values)),
+        ("nearest_facility", lambda: nearest_facility(graph, 0, facility_nodes)),
+        ("distance_field", lambda: compute_distance_field(graph, facility_nodes)),
+        ("count_points_in_area", lambda: count_points_in_area(points, area_geodf)),
+        ("count_points_in_areas", lambda: count_points_in_areas(points, many_areas, "category")),
+        ("gpx_ingest_file", lambda: read_gpx_arrays(gpx_path)),
+        ("gpx_ingest_folder", lambda: read_gpx_folder(gpx_folder)),
+        ("route_stats", lambda: summarize_arrays(segment["longitude"], segment["latitude"], segment["altitude"], segment["time"])),
+        ("route_simplification", lambda: simplify_coords(segment["latitude"], segment["longitude"], 14)),
+        ("folium_map", lambda: create_folium_map(CENTER_LAT, CENTER_LON, [], routes, [(fitness, "fitness")], reverse_geocoder).get_root().render()),
+        ("folium_choropleth", lambda: create_folium_map_choropleth(CENTER_LAT, CENTER_LON, [], municipalities, "Sale").get_root().render())
+    ]
+
+    return stages
+
+
+def compare(results, baseline, threshold):
+    """
+    prints the ratio between the times of the results and the ones of the baseline,
+    returns the list of the stages slower than threshold times the baseline
+    """
+    regressions = []
+    print("\n%-24s %12s %12s %8s" % ("stage", "baseline (s)", "current (s)", "ratio"))
+    for stage, result in results["results"].items():
+        if stage not in baseline["results"]:
+            continue
+        ratio = result["time_min"] / max(baseline["results"][stage]["time_min"], 1e-9)
+        flag = "  <-- regression" if ratio > threshold else ""
+        print("%-24s %12.4f %12.4f %8.2f%s" % (stage, baseline["results"][stage]["time_min"], result["time_min"], ratio, flag))
+        if ratio > threshold:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the pipeline stages, on synthetic data")
+    parser.add_argument("--size", choices=list(SIZES.keys()), default="small", help="size of the synthetic fixtures")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs of each stage")
+    parser.add_argument("--stages", nargs="*", default=None, help="run only the given stages")
+    parser.add_argument("--output", default=None, help="json file of the results (default: results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="json file of a previous run, used as baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio of the times above which a stage is a regression")
+    args = parser.parse_args()
+
+    results = {
+        "commit": get_commit(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "size": args.size,
+        "repeat": args.repeat,
+        "results": {}
+    }
+
+    tmp_dir = tempfile.mkdtemp(prefix="udine_benchmarks_")
+    try:
+        print("> Creating Fixtures (" + args.size + ")")
+        stages = build_stages(args.size, tmp_dir)
+        for stage, func in stages:
+            if args.stages and stage not in args.stages:
+                continue
+            results["results"][stage] = measure(func, args.repeat)
+            print("  - %-24s %10.4f s %10.2f MB" % (stage, results["results"][stage]["time_min"], results["results"][stage]["peak_memory_mb"]))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, results["commit"] + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="UTF-8") as output_file:
+        json.dump(results, output_file, indent=2)
+    print("> Results saved in", output)
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="UTF-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("size") != results["size"]:
+            print("WARNING: the baseline was run with size", baseline.get("size"))
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\n> Regressions:", ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# Import Libraries
+import os
+import time
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse.csgraph import dijkstra
+from .osm_extract import extract_layers
+from .municipality_store import as_crs
+from .geocoding import geocode, get_geocoder
+from .snapping import snap_geometries
+from .routing_graph import get_routing_graph, get_routing_graph_path, is_routing_graph_cached, load_routing_graph
+from .distance_fields import get_distance_fields, lookup_distance_field
+from .place_categories import PLACE_CATEGORIES, UNI_NAMES
+from .dataviz_geopandas import prepare_places, tag_places, count_places_in_areas, get_buffer_areas
+
+
+# state shared with the worker processes (set by `_init_worker()`)
+_WORKER_STATE = {}
+
+# number of sources handled by a single scipy search in a worker
+SOURCES_PER_TASK = 16
+
+
+def read_addresses(addresses, geocode_provider="offline", osm=None, geocode_fallback=None, use_cache=True):
+    """
+    Input:
+        > addresses         one of:
+                                - list of addresses (strings)
+                                - list of (lat, lon) tuples
+                                - path of a csv file, with an 'address' column or 'lat' and 'lon' columns
+        > geocode_provider  "offline" to geocode the addresses given as strings with the addresses of the PBF file
+                            (requires osm), or a geopy provider (e.g. "arcgis") to geocode them online
+        > osm               pyrosm.OSM object used by the offline geocoder
+        > geocode_fallback  geopy provider used if the offline geocoding fails, None to disable
+        > use_cache         boolean value, if set to True the offline geocoder uses the cache
+
+    Output:
+        > geodataframe (EPSG:4326) with columns 'address' and 'geometry', one row per address
+    """
+    # read the csv, if required
+    if isinstance(addresses, str):
+        addresses_df = pd.read_csv(addresses)
+        if "lat" in addresses_df.columns and "lon" in addresses_df.columns:
+            addresses = list(zip(addresses_df["lat"], addresses_df["lon"]))
+        else:
+            addresses = addresses_df["address"].tolist()
+
+    # coordinates
+    if len(addresses) > 0 and not isinstance(addresses[0], str):
+        lat = np.array([a[0] for a in addresses], dtype=float)
+        lon = np.array([a[1] for a in addresses], dtype=float)
+        return gpd.GeoDataFrame(
+            {"address": [str(a[0]) + "," + str(a[1]) for a in addresses]},
+            geometry=gpd.points_from_xy(lon, lat),
+            crs=4326
+            )
+
+    # addresses to geocode
+    if geocode_provider == "offline":
+        return geocode(get_geocoder(osm, use_cache), addresses, geocode_fallback)
+
+    locations = gpd.tools.geocode(addresses, provider=geocode_provider)
+    locations["address"] = addresses
+    return locations[["address", "geometry"]].reset_index(drop=True)
+
+
+def _init_worker(graph_source):
+    """
+    loads the routing graph in a worker process: memory-mapped from the cache if possible (the pages
+    of the files are then shared by all the workers), otherwise from the arrays sent by the main process
+    """
+    if isinstance(graph_source, str):
+        _WORKER_STATE["graph"] = load_routing_graph(graph_source)
+    else:
+        _WORKER_STATE["graph"] = graph_source
+
+
+def _distances_from_sources(sources, facility_nodes, cutoff=None):
+    """
+    returns a matrix (sources x facilities) with the route length from each source to each facility
+    """
+    limit = np.inf if cutoff is None else cutoff
+    distances = dijkstra(_WORKER_STATE["graph"]["matrix"], directed=True, indices=sources, limit=limit)
+    return distances.reshape(len(sources), -1)[:, facility_nodes]
+
+
+def _worker_task(args):
+    """
+    task executed by the worker processes
+    """
+    sources, facility_nodes, cutoff = args
+    return _distances_from_sources(sources, facility_nodes, cutoff)
+
+
+def compute_batch_distances(graph, sources, facility_nodes, n_workers=None, graph_path=None, cutoff=None):
+    """
+    Input:
+        > graph             routing graph
+        > sources           list of node positions (one for each address)
+        > facility_nodes    list of node positions (one for each facility)
+        > n_workers         number of worker processes (default: number of cores, 1 runs in the main process)
+        > graph_path        folder of the cached routing graph, the workers memory-map it instead of receiving a copy
+        > cutoff            maximum route length (m) to explore
+
+    Output:
+        > numpy matrix (sources x facilities) with the route lengths (inf if unreachable)
+    """
+    facility_nodes = np.asarray(facility_nodes, dtype=int)
+    sources = np.asarray(sources, dtype=int)
+    chunks = [sources[i:i + SOURCES_PER_TASK] for i in range(0, len(sources), SOURCES_PER_TASK)]
+
+    if len(chunks) == 0:
+        return np.zeros((0, len(facility_nodes)))
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    # single process
+    if n_workers <= 1 or len(chunks) == 1:
+        _init_worker(graph)
+        return np.vstack([_distances_from_sources(chunk, facility_nodes, cutoff) for chunk in chunks])
+
+    # pool of processes, each one with its own view of the graph
+    graph_source = graph_path if graph_path is not None else graph
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(graph_source,)) as executor:
+        results = executor.map(_worker_task, [(chunk, facility_nodes, cutoff) for chunk in chunks])
+        return np.vstack(list(results))
+
+
+def flatten_info_dict(info_dict):
+    """
+    Input:
+        > dictionary outputted from the function `plot_udine_map()` (or built by `score_addresses()`)
+
+    Output:
+        > dictionary column -> value, with the same information of `extract_info_from_dict()` in a single row
+    """
+    row = {}
+    for key, value in info_dict.items():
+        if key == "university":
+            for k, v in value.items():
+                row[k.replace("Università degli Studi di Udine - ", "") + " - Distance (m)"] = v
+        else:
+            row[key + " - Closest (name)"] = value["closest_name"]
+            row[key + " - Closest (distance)"] = value["closest_distance"]
+            row[key + " - Total in 1km Area"] = value["in_1km_area"]
+    return row
+
+
+def _info_from_routes(graph, universities, places, list_of_poi_places, sources, counts, n_workers, graph_path):
+    """
+    returns the info dictionary of each source, computing the routes to every facility with a pool of processes
+    """
+    # facilities: every location of every place, snapped to the graph
+    facility_place = []
+    facility_names = []
+    facility_points = []
+    for place, place_geodf in [("university", universities)] + [(place, places[place]) for place in list_of_poi_places]:
+        for name, geom in zip(place_geodf["name"], place_geodf.representative_point()):
+            facility_place.append(place)
+            facility_names.append(name)
+            facility_points.append(geom)
+    facility_nodes = list(snap_geometries(graph, facility_points))
+    facility_place = np.array(facility_place)
+    facility_names = np.array(facility_names, dtype=object)
+
+    distances = compute_batch_distances(graph, sources, facility_nodes, n_workers, graph_path)
+
+    info_dicts = []
+    for pos in range(len(sources)):
+
+        info_dict = {"university": {}}
+
+        for name, dist in zip(facility_names[facility_place == "university"], distances[pos][facility_place == "university"]):
+            info_dict["university"][name] = round(float(dist), 2) if np.isfinite(dist) else None
+
+        for place in list_of_poi_places:
+            place_dist = distances[pos][facility_place == place]
+            place_names = facility_names[facility_place == place]
+            place_dict = {"in_1km_area": int(counts[place][pos]), "closest_name": "", "closest_distance": 100000}
+            if len(place_dist) > 0 and np.isfinite(place_dist.min()):
+                place_dict["closest_name"] = place_names[np.argmin(place_dist)]
+                place_dict["closest_distance"] = round(float(place_dist.min()), 2)
+            info_dict[PLACE_CATEGORIES[place]["output_key"]] = place_dict
+
+        info_dicts.append(info_dict)
+
+    return info_dicts
+
+
+def _info_from_distance_fields(osm, graph, universities, places, list_of_poi_places, sources, counts, use_cache):
+    """
+    returns the info dictionary of each source, reading the precomputed distance fields
+    (one field for each university, one for each other place)
+    """
+    fields_places = {"university": universities}
+    fields_places.update({place: places[place] for place in list_of_poi_places})
+    fields = get_distance_fields(osm, graph, fields_places, use_cache, per_facility=["university"])
+
+    info_dicts = []
+    for pos, source in enumerate(sources):
+
+        info_dict = {"university": {}}
+
+        for name in universities["name"].values:
+            info_dict["university"][name] = None
+            _, dist = lookup_distance_field(fields["university: " + str(name)], source)
+            if dist is not None:
+                info_dict["university"][name] = round(dist, 2)
+
+        for place in list_of_poi_places:
+            place_dict = {"in_1km_area": int(counts[place][pos]), "closest_name": "", "closest_distance": 100000}
+            closest_name, closest_distance = lookup_distance_field(fields[place], source)
+            if closest_distance is not None:
+                place_dict["closest_name"] = closest_name
+                place_dict["closest_distance"] = round(closest_distance, 2)
+            info_dict[PLACE_CATEGORIES[place]["output_key"]] = place_dict
+
+        info_dicts.append(info_dict)
+
+    return info_dicts
+
+
+def score_addresses(udine_geodf, udine_osm, addresses, list_of_places, list_of_uni="all", n_workers=None, use_cache=True, geocode_provider="offline", geocode_fallback=None, use_distance_fields=True):
+    """
+    Input:
+        > udine_geodf       geodataframe of Udine
+        > udine_osm         pyrosm.OSM object based on Udine
+        > addresses         list of addresses, list of (lat, lon) tuples or path of a csv file (see `read_addresses()`)
+        > list_of_places    list of places to evaluate (see `plot_udine_map()`)
+        > list_of_uni       list of universities on which to obtain information about the nearest route
+        > n_workers         number of worker processes for the route computations (default: number of cores)
+        > use_cache         boolean value, if set to True the OSM layers and the graph are read from the cache
+        > geocode_provider  "offline" or a geopy provider (e.g. "arcgis"), see `read_addresses()`
+        > geocode_fallback  geopy provider used if the offline geocoding fails, None to disable
+        > use_distance_fields   boolean value, if set to True the routes are read from the precomputed distance
+                                fields (constant time per address), otherwise they are computed by the pool
+
+    Output:
+        > dataframe with one row per address and the information of `extract_info_from_dict()` as columns
+          (closest name and distance, total in 1km area, distance of each university)
+
+    The OSM layers and the routing graph are loaded once, the counts in the 1km areas are obtained
+    with a single spatial query for the whole batch, and the routes are read from the distance fields
+    (or computed by a pool of processes)
+    """
+    # keep track of time
+    start = time.time()
+
+    # obtain the addresses
+    print("> Reading Addresses")
+    locations = read_addresses(addresses, geocode_provider, udine_osm, geocode_fallback, use_cache)
+
+    # check that the coordinates are within the map of Udine
+    udine_polygon = as_crs(udine_geodf, 4326).geometry.values[0]
+    within_udine = (~locations.geometry.is_empty & locations.geometry.within(udine_polygon)).values
+
+    # obtain the layers and the graph, once for the whole batch
+    print("> Obtaining Places and Routing Graph")
+    list_of_poi_places = [place for place in list_of_places if place != "university"]
+    osm_layers = extract_layers(udine_osm, ["university"] + list_of_poi_places, use_cache)
+    places = prepare_places(osm_layers, ["university"] + list_of_poi_places)
+    graph = get_routing_graph(udine_osm, use_cache)
+    graph_path = get_routing_graph_path(udine_osm) if use_cache and is_routing_graph_cached(udine_osm) else None
+
+    if list_of_uni == "all":
+        list_of_uni = UNI_NAMES
+    universities = places["university"].loc[places["university"]["name"].isin(list_of_uni)]
+
+    # sources: the addresses within Udine, snapped to the graph
+    idx_within = np.flatnonzero(within_udine)
+    sources = snap_geometries(graph, locations.geometry.values[idx_within])
+
+    # counts in the 1km areas, a single query for all the places
+    print("> Counting Places in the 1km Areas")
+    areas = get_buffer_areas(locations.iloc[idx_within], [1000])
+    counts = count_places_in_areas(tag_places({place: places[place] for place in list_of_poi_places}), areas, list_of_poi_places)
+
+    # route lengths from each address, one info dictionary for each address (like `plot_udine_map()` does)
+    print("> Computing Routes")
+    if use_distance_fields:
+        info_dicts = _info_from_distance_fields(udine_osm, graph, universities, places, list_of_poi_places, sources, counts, use_cache)
+    else:
+        info_dicts = _info_from_routes(graph, universities, places, list_of_poi_places, sources, counts, n_workers, graph_path)
+
+    # one row for each address
+    rows = []
+    for i in range(len(locations)):
+        row = {"address": locations["address"].values[i], "within_udine": bool(within_udine[i])}
+        if within_udine[i]:
+            row.update(flatten_info_dict(info_dicts[np.searchsorted(idx_within, i)]))
+        rows.append(row)
+
+    # show throughput
+    end = time.time()
+    print("\n> Scored", len(locations), "addresses in", round(end - start, 2), "seconds (" + str(round(len(locations) / max(end - start, 1e-9), 2)), "addresses/s)")
+
+    return pd.DataFrame(rows)
@@ -1,21 +1,47 @@
+import json
 import gpxpy
+import numpy as np
 import pandas as pd
-from datetime import datetime,timezone,timedelta
 import geopandas as gpd
 from geopy.geocoders import Nominatim
-import movingpandas as mpd
 import contextily as ctx
 import folium
-from folium.plugins import MarkerCluster
+import branca.colormap
+import branca.utilities
+from folium.plugins import MarkerCluster, FastMarkerCluster
 import leafmap
+from .polyline import COORDS_PRECISION, simplify_coords, quantize_coords, coords_size, zoom_tolerance, quantize_geojson
+from .vector_export import export_topojson, export_vector_tiles, add_vector_tiles_layer, simplify_shared_borders
+from .instrumentation import span, traced
+from .route_stats import summarize_route, summary_to_html, save_summaries
+from .reverse_geocoding import get_default_reverse_geocoder, reverse_geocode_points
+from .municipality_store import as_crs
+
+
+# number of classes of the choropleth (the bins of folium.Choropleth)
+CHOROPLETH_BINS = 6
+
+# fill color of the municipalities without a value (like `nan_fill_color` of folium.Choropleth)
+NAN_FILL_COLOR = "black"
+
+# javascript that creates the markers of the fitness points in the browser (row: [lat, lon, name]),
+# the icon is created once and shared by all the markers
+FITNESS_CALLBACK = """(function () {
+    var icon = L.icon({iconUrl: '../images/icon_fitness.png', iconSize: [25, 25]});
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+        marker.bindTooltip(row[2]);
+        return marker;
+    };
+})()"""
 
 
 def read_gpx(path):
     """
     returns a gpx object, given its local path
     """
-    gpx_file = open(path, 'r', encoding='UTF-8')
-    return gpxpy.parse(gpx_file)
+    with open(path, 'r', encoding='UTF-8') as gpx_file:
+        return gpxpy.parse(gpx_file)
 
 
 def print_gpx_info(gpx_file):
@@ -39,6 +65,9 @@ def create_geodf_from_segment(gpx_file, track_idx, segment_idx):
 
     Output
         > pandas dataframe with information of required segment
+
+    Note: to read many files, `read_gpx_geodf()` and `read_gpx_folder()` (see `gpx_reader.py`)
+    build the same geodataframe without creating the gpxpy objects
     """
     data = []
     for point_idx, point in enumerate(gpx_file.tracks[track_idx].segments[segment_idx].points):
@@ -52,7 +81,8 @@ def create_geodf_from_segment(gpx_file, track_idx, segment_idx):
     columns_name = ['longitude', 'latitude', 'altitude', 'time'] 
     gpx_dataframe = pd.DataFrame(data, columns=columns_name)
 
-    gpx_dataframe['time'] = gpx_dataframe['time'].apply(lambda x: x.replace(tzinfo=None))
+    # from aware to naive datetimes (UTC), on the whole column at once
+    gpx_dataframe['time'] = pd.to_datetime(gpx_dataframe['time'], utc=True).dt.tz_convert(None)
 
     geo_df = gpd.GeoDataFrame(
         gpx_dataframe, 
@@ -66,10 +96,9 @@ def create_geodf_from_segment(gpx_file, track_idx, segment_idx):
 def get_total_distance(df):
     """
     Given a geodf with a 'time' column based on a gpx segment, it returns the total distance in meters (as html)
+    Note: the distance is the haversine length of `summarize_route()`, about 0.1% shorter than the geodesic length of movingpandas
     """
-    trajectory = mpd.Trajectory(df, traj_id="temp", t="time")
-    dis = trajectory.get_length()
-    return "<b>Distance</b>: %s m (%s km)" % (round(dis), round(dis/1000,2))
+    return summary_to_html(summarize_route(df))[0]
 
 
 def get_travel_time(df):
@@ -77,45 +106,42 @@ def get_travel_time(df):
     Given a geodf with a 'time' column, it returns the total time required (as html)
     Note: the 'time' column MUST be sorted in ascending order
     """
-    # obtain start and end times
-    start = df["time"][0]
-    end = df["time"][len(df["time"])-1]
-
-    # get travel time
-    travel_time = end - start
-    travel_time_hours = str(timedelta(seconds=travel_time.seconds))
-
-    # show res
-    print_travel_time = travel_time_hours.split(':')
-    return "<b>Time</b>: %sh %sm" % (print_travel_time[0], print_travel_time[1])
+    return summary_to_html(summarize_route(df))[1]
 
 
 def get_altitude(df):
     """
     Given a geodf with an 'altitude' column, it returns the min and max value present (as html)
     """
-    min_alt = min(df["altitude"])
-    max_alt = max(df["altitude"])
-    return "<b>Min Altitude</b>: %s meters<br><b>Max Altitude</b>: %s meters" % (min_alt, max_alt)
+    return summary_to_html(summarize_route(df))[2]
 
 
-def get_start_end_locations(df):
+def get_start_end_locations(df, reverse_geocoder="nominatim"):
     """
     Given a geodf with a 'geometry' column, it returns the first and last location (as html) 
-    """
 
-    # setup Nominatin
-    geolocator = Nominatim(user_agent="udine_project")
+    The locations are found with Nominatim (reverse_geocoder="nominatim", network calls),
+    or offline with a reverse geocoder obtained from `build_reverse_geocoder()`
+    """
 
     # obtain lat and lon for start point point
     lat_start = df["geometry"][0].y
     lon_start = df["geometry"][0].x
-    latlon_start = str(lat_start) + "," + str(lon_start)
 
     # obtain lat and lon for end point
     last_idx = len(df["geometry"]) - 1
     lat_end = df["geometry"][last_idx].y
     lon_end = df["geometry"][last_idx].x
+
+    # offline, using the spatial indexes and the cache of the reverse geocoder
+    if reverse_geocoder != "nominatim":
+        start_location, end_location = reverse_geocode_points(reverse_geocoder, [lat_start, lat_end], [lon_start, lon_end])
+        return "<b>Start Location</b>: %s <br><b>End Location</b>: %s" % (start_location, end_location)
+
+    # setup Nominatin
+    geolocator = Nominatim(user_agent="udine_project")
+
+    latlon_start = str(lat_start) + "," + str(lon_start)
     latlon_end = str(lat_end) + "," + str(lon_end)
 
     # obtain info and print them
@@ -125,20 +151,26 @@ def get_start_end_locations(df):
     return "<b>Start Location</b>: %s <br><b>End Location</b>: %s" % (start_location[0], end_location[0])
 
 
-def extract_lat_lon_for_folium(geodf):
+def extract_lat_lon_for_folium(geodf, zoom=None, method="douglas-peucker", precision=None):
     """
     Given a geodf with a 'geometry' columns, 
     it returns a list of tuples with all the values of lat/lon
+
+    Optionally:
+        > zoom          the line is simplified for the given zoom level (see `simplify_coords()`),
+                        None to keep every point
+        > method        simplification algorithm, "douglas-peucker" | "visvalingam"
+        > precision     number of decimals of the coordinates, None to keep full precision
     """
-    coords = []
-    for idx,row in geodf.iterrows():
-        lat = row["geometry"].y
-        lon = row["geometry"].x
-        coords.append( (lat,lon) )
-    return coords
+    lats, lons = simplify_coords(geodf.geometry.y.values, geodf.geometry.x.values, zoom, method)
+    if precision is not None:
+        lats, lons = quantize_coords(lats, lons, precision)
+    return list(zip(lats.tolist(), lons.tolist()))
 
 
-def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
+@traced("create_folium_map")
+def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points,reverse_geocoder="offline",route_stats_cache=None,
+                      simplify="douglas-peucker",simplify_zoom=14,precision=COORDS_PRECISION,points_mode="cluster"):
     """
     Input:
         > lat               latitude of the location we want to display
@@ -148,7 +180,27 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
                                 list_of_routes[i][0] -> geodf of the route
                                 list_of_routes[i][1] -> title of the route (used in the popup)
                                 list_of_routes[i][2] -> type of the route, can be [run|bike]
-        > list_of_points
+        > list_of_points    list of points related information. Note that:
+                                list_of_points[i][0] -> geodf of the points
+                                list_of_points[i][1] -> type of the points, can be [fitness]
+        > reverse_geocoder  how the start and end locations of the routes are found:
+                                - "offline"     ISTAT municipalities plus the nearest named street of the Udine PBF
+                                                (see `get_default_reverse_geocoder()`), with a persistent cache (no network calls);
+                                                Nominatim is used if the shapefile of the municipalities is missing
+                                - "nominatim"   Nominatim (two network calls per route)
+                                - a reverse geocoder obtained from `build_reverse_geocoder()`, e.g. with
+                                  the OSM data of another area
+        > route_stats_cache json file where the summaries of the routes are persisted (see `summarize_route()`,
+                            written once, after all the routes),
+                            None to cache them only in this session
+        > simplify          simplification of the routes, "douglas-peucker" | "visvalingam" | None (every GPS fix)
+        > simplify_zoom     zoom level the routes are simplified for (the error is below half a pixel at
+                            this zoom, so it is not visible at the initial zoom of the map, 11)
+        > precision         number of decimals of the coordinates of the routes and of the points, None to keep full precision
+        > points_mode       how the points are added to the map:
+                                - "cluster"     one FastMarkerCluster, the points are serialized as a single array
+                                                and the markers (with a shared icon) are created in the browser
+                                - "markers"     one folium.Marker (with its own icon) for each point
 
     Given latitude, longitude and a list of layers, it creates and returns a folium interactive map
     """
@@ -166,8 +218,25 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
     for layer in list_of_layers:
         folium.TileLayer(layer).add_to(base_map)
 
+    # setup the offline reverse geocoder and find all the start and end locations at once
+    with span("reverse_geocode"):
+        if reverse_geocoder == "offline":
+            reverse_geocoder = get_default_reverse_geocoder()
+            if reverse_geocoder is None:
+                print("> ISTAT Shapefile not found, Reverse Geocoding with Nominatim")
+                reverse_geocoder = "nominatim"
+        if reverse_geocoder != "nominatim" and len(list_of_routes) > 0:
+            start_end_points = [route[0]["geometry"].values[[0, -1]] for route in list_of_routes]
+            reverse_geocode_points(
+                reverse_geocoder,
+                [p.y for points in start_end_points for p in points],
+                [p.x for points in start_end_points for p in points]
+                )
+
     # add routes
     print("> Adding routes")
+    full_size = 0
+    reduced_size = 0
     for route in list_of_routes:
 
         # extract info of route
@@ -188,8 +257,14 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
             print("ERROR: incorrect type provided")
             return 0
 
-        # extract coords from geodf
-        coords = extract_lat_lon_for_folium(geodf)
+        # extract coords from geodf (simplified and quantized)
+        with span("simplify", route=title):
+            if simplify is None:
+                coords = extract_lat_lon_for_folium(geodf, precision=precision)
+            else:
+                coords = extract_lat_lon_for_folium(geodf, simplify_zoom, simplify, precision)
+            full_size += coords_size(zip(geodf.geometry.y.values.tolist(), geodf.geometry.x.values.tolist()))
+            reduced_size += coords_size(coords)
 
         # plot route
         route = folium.PolyLine(
@@ -198,15 +273,14 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
             weight=3,
             opacity=0.75)
 
-        # obtain info about route
-        distance = get_total_distance(geodf)
-        travel_time = get_travel_time(geodf)
-        altitude = get_altitude(geodf)
-        start_end = get_start_end_locations(geodf)
+        # obtain info about route (one vectorized pass, cached by the content of the route)
+        with span("route_stats", route=title):
+            distance, travel_time, altitude = summary_to_html(summarize_route(geodf, route_stats_cache, save=False))
+            start_end = get_start_end_locations(geodf, reverse_geocoder)
 
         # prepare popup
         html = style + "<h3>" + title + "</h3>" + "<p>" + distance + "</p><p>" + travel_time + "</p><p>" + altitude + "</p><p>" + start_end + "</p>"
-        iframe = folium.IFrame(html=html, width=320, height=200)
+        iframe = folium.IFrame(html=html, width=320, height=250)
 
         # add marker
         marker = folium.Marker(
@@ -223,10 +297,17 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
             route.add_to(bike_group)
             marker.add_to(bike_group)
 
-        print("  - Added", route_type, "route:", title)
+        print("  - Added", route_type, "route:", title, "(" + str(len(coords)), "of", len(geodf), "points)")
+
+    # the new summaries are persisted once, after all the routes
+    save_summaries(route_stats_cache)
+
+    if full_size > 0:
+        print("  - Size of the routes:", round(full_size/1024), "KB ->", round(reduced_size/1024), "KB (" + str(round(full_size/max(reduced_size,1),1)) + "x smaller)")
 
     # add routes
     print("> Adding points")
+    fitness_rows = []                                                       # rows of every "fitness" entry, for the cluster
     for points in list_of_points:
 
         # extract info of points
@@ -235,31 +316,43 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
 
         if points_type == "fitness":
 
-            # add each point to the map
-            for idx,row in geodf.iterrows():
+            # names of all the points, at once
+            with span("points", type=points_type, count=len(geodf)):
+                leisure = geodf["leisure"].str.replace("_", " ").str.title()
+                has_name = geodf["name"].notnull() & (geodf["name"] != "")
+                names = np.where(has_name, leisure + ": " + geodf["name"].astype(str), leisure + " (unknown name)")
+
+                if points_mode == "cluster":
+
+                    # rows [lat, lon, name], with the coordinates rounded like the ones of the routes
+                    lats = geodf.geometry.y.values
+                    lons = geodf.geometry.x.values
+                    if precision is not None:
+                        lats = np.round(lats, precision)
+                        lons = np.round(lons, precision)
+                    fitness_rows += [[float(lat), float(lon), str(name)] for lat, lon, name in zip(lats, lons, names)]
 
-                # obtain point info
-                if row["name"]:
-                    name = row["leisure"].replace("_", " ").title() + ": " + str(row["name"])
                 else:
-                    name = row["leisure"].replace("_", " ").title() + " (unknown name)"
-                lat = row["geometry"].y
-                lon = row["geometry"].x
 
-                # add it to the map
-                marker = folium.Marker(
-                    location=[lat,lon],
-                    #popup=message,
-                    tooltip=name,
-                    icon=folium.features.CustomIcon('../images/icon_fitness.png', icon_size=(25,25))
-                    )
+                    # add each point to the map
+                    for name, lat, lon in zip(names, geodf.geometry.y.values, geodf.geometry.x.values):
+                        marker = folium.Marker(
+                            location=[lat,lon],
+                            #popup=message,
+                            tooltip=name,
+                            icon=folium.features.CustomIcon('../images/icon_fitness.png', icon_size=(25,25))
+                            )
 
-                marker.add_to(fitness_group)
+                        marker.add_to(fitness_group)
 
         else:
             print("ERROR: incorrect type provided")
             return 0
 
+    # a single payload with all the fitness points, the markers are created in the browser with a shared icon
+    if points_mode == "cluster":
+        fitness_group = FastMarkerCluster(fitness_rows, callback=FITNESS_CALLBACK, name="Fitness/Sports Centre", show=False)
+
     # add groups to base_map
     run_group.add_to(base_map)
     bike_group.add_to(base_map)
@@ -273,7 +366,9 @@ def create_folium_map(lat,lon,list_of_layers,list_of_routes,list_of_points):
     return base_map
 
 
-def create_folium_map_choropleth(lat,lon,list_of_layers,geodf,column):
+@traced("create_folium_map_choropleth")
+def create_folium_map_choropleth(lat,lon,list_of_layers,geodf,column,layer_mode="geojson",simplify_zoom=12,precision=COORDS_PRECISION,
+                                 export_path=None,tiles_url=None,tiles_max_zoom=12):
     """
     Input:
         > lat               latitude of the location we want to display
@@ -281,9 +376,25 @@ def create_folium_map_choropleth(lat,lon,list_of_layers,geodf,column):
         > list_of_layers    list of compatible layers that the map will have
         > geodf             GeoDataFrame with polygons
         > column            column that must be present in the geodf on which the choropleth will be based
+        > layer_mode        how the municipalities are added to the map:
+                                - "geojson"     a single GeoJson layer (projected, simplified and quantized once),
+                                                with colors, tooltips and popups driven by its properties
+                                - "topojson"    the polygons are written as TopoJSON in export_path (shared borders
+                                                stored once) and embedded as a single TopoJson layer
+                                - "tiles"       the polygons are written as vector tiles in the folder export_path,
+                                                the map loads only the visible tiles from tiles_url (see `vector_export.py`)
+                                - "legacy"      folium.Choropleth plus one GeoJson with its own popup for each polygon
+        > simplify_zoom     zoom level the polygons are simplified for ("geojson" mode), None to keep every vertex
+        > precision         number of decimals of the coordinates ("geojson" mode), None to keep full precision
+        > export_path       TopoJSON file ("topojson" mode) or folder of the tiles ("tiles" mode)
+        > tiles_url         url of the tiles served from export_path, e.g. "http://localhost:8000/{z}/{x}/{y}.pbf"
+        > tiles_max_zoom    last zoom level of the tiles
 
     Given latitude, longitude and a geodf with given column, it creates and returns a folium interactive map
     """
+    if layer_mode in ["geojson", "topojson", "tiles"]:
+        return _create_choropleth_single_layer(lat, lon, list_of_layers, geodf, column, layer_mode, simplify_zoom, precision,
+                                               export_path, tiles_url, tiles_max_zoom)
 
     # create base map
     house_cost_map = folium.Map(location=[lat,lon], zoom_start = 9)
@@ -294,10 +405,13 @@ def create_folium_map_choropleth(lat,lon,list_of_layers,geodf,column):
     for layer in list_of_layers:
         folium.TileLayer(layer).add_to(house_cost_map)
 
+    # project once (only if needed), for both the choropleth and the popups
+    geodf = as_crs(geodf, 4326)
+
     # create choropleth
     print("> Adding Choropleth")
     folium.Choropleth(
-        geo_data=geodf.to_crs(epsg=4326).to_json(),
+        geo_data=geodf.to_json(),
         name="Municipalities: Choropleth",
         data = geodf,
         columns=['Municipality',column],
@@ -314,7 +428,7 @@ def create_folium_map_choropleth(lat,lon,list_of_layers,geodf,column):
     style='<style>body {;font-family: system-ui,-apple-system,"Segoe UI",Roboto,"Helvetica Neue",Arial,"Noto Sans","Liberation Sans",sans-serif,"Apple Color Emoji","Segoe UI Emoji","Segoe UI Symbol","Noto Color Emoji";}</style>'
 
     # iterate over municipality
-    for idx, row in geodf.to_crs(epsg=4326).iterrows():
+    for idx, row in geodf.iterrows():
 
         # prepare popup information
         html = style + "<center><h3>" + row['Municipality'] + "</h3>" + "<p><b>" + column + " Cost</b>: " + str(round(row[column])) + " &#8364/m\u00b2</p></center>"
@@ -340,12 +454,123 @@ def create_folium_map_choropleth(lat,lon,list_of_layers,geodf,column):
         # add municipality to map
         poly_geoj.add_to(poly_group)
 
-        # add poly_group to base map
-        poly_group.add_to(house_cost_map)
+    # add poly_group to base map
+    poly_group.add_to(house_cost_map)
+
+    # create layer control
+    folium.LayerControl().add_to(house_cost_map)
+
+    # return map
+    print("> Interactive Map Created")
+    return house_cost_map
+
+
+def _create_choropleth_single_layer(lat, lon, list_of_layers, geodf, column, layer_mode, simplify_zoom, precision,
+                                    export_path, tiles_url, tiles_max_zoom):
+    """
+    same map of `create_folium_map_choropleth()`, with all the municipalities in a single layer
+    (GeoJson, TopoJson or vector tiles)
+    """
+    if layer_mode in ["topojson", "tiles"] and export_path is None:
+        raise ValueError("export_path is required with layer_mode='" + layer_mode + "'")
+    if layer_mode == "tiles" and tiles_url is None:
+        raise ValueError("tiles_url is required with layer_mode='tiles'")
+
+    # create base map
+    house_cost_map = folium.Map(location=[lat,lon], zoom_start = 9)
+
+    # add multiple layers
+    print("> Adding multiple layers")
+    for layer in list_of_layers:
+        folium.TileLayer(layer).add_to(house_cost_map)
+
+    # project once (only if needed), keep only the required columns
+    print("> Preparing Municipalities")
+    with span("prepare", municipalities=len(geodf)):
+        municipalities = as_crs(geodf, 4326)[["Municipality", column, "geometry"]].reset_index(drop=True)
+        simplify_tolerance = None
+        if simplify_zoom is not None:
+            simplify_tolerance = zoom_tolerance(simplify_zoom, lat) / 111320            # from meters to degrees
+
+        # colors of the choropleth, like folium.Choropleth(fill_color='Reds', bins=6): 6 equal-width bins
+        # of the known values, each one with a color of the 6-class 'Reds' palette of ColorBrewer
+        # (the maximum is in the last bin), missing values in NAN_FILL_COLOR
+        values = municipalities[column].values.astype(np.float64)
+        bin_edges = np.histogram(values[~np.isnan(values)], bins=CHOROPLETH_BINS)[1]
+        colors = branca.utilities.color_brewer('Reds', n=CHOROPLETH_BINS)
+        colormap = branca.colormap.StepColormap(colors, index=bin_edges, vmin=bin_edges[0], vmax=bin_edges[-1])
+        colormap.caption = 'House ' + column + ' Prices in the Province of Udine (EUR/m\u00b2)'
+        color_idx = np.clip(np.digitize(values, bin_edges) - 1, 0, CHOROPLETH_BINS - 1)
+        municipalities["fill_color"] = [NAN_FILL_COLOR if np.isnan(v) else colors[i] for v, i in zip(values, color_idx)]
+        municipalities["cost_label"] = [("-" if np.isnan(v) else str(int(round(v)))) + " \u20ac/m\u00b2" for v in values]
+
+    if layer_mode == "topojson":
+
+        # shared borders stored once, then embedded in the map
+        print("> Exporting TopoJSON")
+        with span("export", format="topojson"):
+            export_topojson(municipalities, export_path, ["Municipality", column, "fill_color", "cost_label"], simplify_tolerance)
+            with open(export_path, "r", encoding="UTF-8") as topojson_file:
+                topojson_data = json.load(topojson_file)
+
+        print("> Adding Choropleth and Tooltips")
+        folium.TopoJson(
+            data=topojson_data,
+            object_path="objects.data",
+            name="Municipalities: Choropleth",
+            style_function=lambda feature: {
+                'fillColor': feature['properties']['fill_color'],
+                'fillOpacity': 0.6,
+                'color': 'black',
+                'opacity': 0.6,
+                'weight': 1
+            },
+            smooth_factor=0,
+            tooltip=folium.GeoJsonTooltip(fields=["Municipality", "cost_label"], aliases=["Municipality", column + " Cost"])
+            ).add_to(house_cost_map)
+
+    elif layer_mode == "tiles":
+
+        # tiles written once, the browser loads only the visible ones from the static server
+        print("> Exporting Vector Tiles")
+        with span("export", format="tiles"):
+            export_vector_tiles(municipalities, export_path, ["Municipality", column, "fill_color", "cost_label"], max_zoom=tiles_max_zoom)
+
+        print("> Adding Vector Tiles Layer")
+        add_vector_tiles_layer(house_cost_map, tiles_url, popup_fields=["Municipality", "cost_label"], max_zoom=tiles_max_zoom)
+
+    else:
+
+        # a single serialization of all the polygons
+        with span("serialize", format="geojson"):
+            if simplify_tolerance is not None:
+                municipalities = simplify_shared_borders(municipalities, simplify_tolerance)
+            geojson = municipalities.__geo_interface__
+            if precision is not None:
+                geojson = quantize_geojson(geojson, precision)
+
+        print("> Adding Choropleth, Tooltips and Popups")
+        folium.GeoJson(
+            data=geojson,
+            name="Municipalities: Choropleth",
+            style_function=lambda feature: {
+                'fillColor': feature['properties']['fill_color'],
+                'fillOpacity': 0.6,
+                'color': 'black',
+                'opacity': 0.6,
+                'weight': 1
+            },
+            highlight_function=lambda feature: {'weight': 3},
+            smooth_factor=0,
+            tooltip=folium.GeoJsonTooltip(fields=["Municipality"], labels=False),
+            popup=folium.GeoJsonPopup(fields=["Municipality", "cost_label"], aliases=["Municipality", column + " Cost"])
+            ).add_to(house_cost_map)
+
+    colormap.add_to(house_cost_map)
 
     # create layer control
     folium.LayerControl().add_to(house_cost_map)
 
     # return map
     print("> Interactive Map Created")
-    return house_cost_map
\ No newline at end of file
+    return house_cost_map
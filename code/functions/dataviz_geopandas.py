@@ -6,9 +6,20 @@ import matplotlib.pyplot as plt
 import warnings
 import time
 import geopy
-import osmnx as ox
 from shapely.geometry import LineString
 import pandas as pd
+import numpy as np
+import asyncio
+from .osm_cache import get_cached_layer, print_cache_stats
+from .osm_extract import extract_layers, are_layers_cached, get_bounded_osm, clip_to_area
+from .place_categories import PLACE_CATEGORIES, POI_FILTERS, UNI_NAMES
+from .geocoding import geocode, get_geocoder
+from .routing import get_nearest_node, get_nearest_nodes, nearest_facility, route_from_predecessors
+from .routing_graph import get_routing_graph, is_routing_graph_cached, route_coords
+from .instrumentation import span, traced
+from .distance_fields import get_distance_fields, lookup_distance_field
+from .municipality_store import as_crs
+from .scheduler import stage, run_stages, critical_path
 
 # Ignore warnings
 warnings.filterwarnings("ignore")
@@ -62,23 +73,27 @@ def extract_info_from_dict(output_dict):
     return (uni_df, location_df)
 
 
-def extract_data_from_OSM(osm, primary_filter, secondary_filter="all"):
+def extract_data_from_OSM(osm, primary_filter, secondary_filter="all", use_cache=True):
     """
     Input:
         > pyrosm.OSM object
         > primary_filter        string in 'aerialway' | 'aeroway' | 'amenity' | 'boundary' | ...
         > secondary_filter      list of strings in the sub-categories of the primary filter
+        > use_cache             boolean value, if set to True the data is read from (and stored in) the layer cache
     Output:
         > geodataframe with requested data
     """
-    # setup primary filter
-    custom_filter = {primary_filter:True}
+    # setup filter
+    if secondary_filter == "all":
+        custom_filter = {primary_filter:True}
+    else:
+        custom_filter = {primary_filter:secondary_filter}
 
     # obtain the required data
-    if secondary_filter == "all":
-        pois = osm.get_pois(custom_filter = {primary_filter:True})
+    if use_cache:
+        pois = get_cached_layer(osm, "pois", custom_filter)
     else:
-        pois = osm.get_pois(custom_filter = {primary_filter:secondary_filter})
+        pois = osm.get_pois(custom_filter = custom_filter)
     
     # and return it
     return pois
@@ -93,20 +108,97 @@ def count_points_in_area(points_geodf, area_geodf):
     Output:
         > number of points in given area 
     """
-    count = 0
-    for location in points_geodf.geometry.values:
-        if location.within(area_geodf.geometry[0]):
-            count += 1
-    return count
+    return int(count_points_in_areas(points_geodf, area_geodf.iloc[[0]])[0])
+
+
+def count_points_in_areas(points_geodf, areas_geodf, category_column=None):
+    """
+    Input:
+        > points_geodf      geodataframe with locations
+        > areas_geodf       geodataframe with any number of polygons (areas), e.g. see `get_buffer_areas()`
+        > category_column   column of points_geodf with the category of each location (optional)
+
+    Output:
+        > if category_column is None: numpy array with the number of points in each area
+        > otherwise: dataframe with one row per area and one column per category
+
+    Note: all the areas are tested with a single query on the spatial index of the points,
+    which is built once and then kept by the geodataframe
+    """
+    if points_geodf is None or len(points_geodf) == 0:
+        area_idx = point_idx = np.array([], dtype=int)
+    else:
+        if points_geodf.crs is not None and areas_geodf.crs is not None and points_geodf.crs != areas_geodf.crs:
+            points_geodf = points_geodf.to_crs(areas_geodf.crs)
+        area_idx, point_idx = points_geodf.sindex.query_bulk(areas_geodf.geometry, predicate="contains")
+
+    if category_column is None:
+        return np.bincount(area_idx, minlength=len(areas_geodf))
+
+    categories = points_geodf[category_column].values[point_idx] if len(point_idx) > 0 else []
+    counts = pd.crosstab(pd.Series(area_idx, name="area"), pd.Series(categories, name=category_column))
+    return counts.reindex(range(len(areas_geodf)), fill_value=0)
+
+
+def update_dict_with_distance_field(dict_to_update, field, start_location):
+    """
+    Input:
+        > dict_to_update
+        > field             distance field of the locations (see `get_distance_field()`)
+        > start_location    node of the routing graph closest to the address
+
+    Output:
+        > updated dictionary, like `update_dict_with_closest_loc()` but with a single array read
+    """
+
+    # Setup placeholders
+    dict_to_update["closest_name"] = ""
+    dict_to_update["closest_distance"] = 100000
+
+    closest_name, closest_distance = lookup_distance_field(field, start_location)
+
+    # update dict if required
+    if closest_distance is not None and closest_distance < dict_to_update["closest_distance"]:
+        dict_to_update["closest_name"] = closest_name
+        dict_to_update["closest_distance"] = round(closest_distance,2)
+
+    return dict_to_update
+
+
+def get_buffer_areas(locations_geodf, radii=(1000,)):
+    """
+    Input:
+        > locations_geodf   geodataframe with locations (e.g. a batch of addresses)
+        > radii             list of radii (m) of the areas around each location
+
+    Output:
+        > geodataframe (EPSG:4326) with one area for each pair (location, radius),
+          columns 'location_idx' (position of the location) and 'radius'
+    """
+    locations_crs = locations_geodf.to_crs(32632).geometry.reset_index(drop=True)      # get values in 32632
+
+    # one geodf of areas for each radius
+    list_of_areas = []
+    for radius in radii:
+        list_of_areas.append(gpd.GeoDataFrame(
+            {"location_idx": np.arange(len(locations_crs)), "radius": radius},
+            geometry=locations_crs.buffer(radius).values,                               # obtain the areas
+            crs=32632
+            ))
+
+    areas_geodf = gpd.GeoDataFrame(pd.concat(list_of_areas, ignore_index=True), crs=32632)
+
+    return areas_geodf.to_crs(epsg=4326)                                                # go back to 4326
 
 
-def update_dict_with_closest_loc(dict_to_update, loc_geodf, graph, start_location):
+def update_dict_with_closest_loc(dict_to_update, loc_geodf, graph, start_location, cutoff=None):
     """
     Input:
         > dict_to_update
         > loc_geodf
         > graph
         > start_location
+        > cutoff            maximum route length (m) to explore, farther locations are ignored
     
     Output:
         > updated dictionary
@@ -116,35 +208,192 @@ def update_dict_with_closest_loc(dict_to_update, loc_geodf, graph, start_locatio
     dict_to_update["closest_name"] = ""
     dict_to_update["closest_distance"] = 100000
 
-    # iterate over each location
-    for idx,row in loc_geodf.iterrows():
-
-        # obtain name and coords
-        location_name = row["name"]                       
-        geom = row["geometry"]
-        lat = geom.y
-        lon = geom.x
-        coords = (lat, lon)
-        closest_point = ox.get_nearest_node(graph, coords)
-
-        # find shortest path length
-        route = ox.shortest_path(
-            graph, 
-            start_location, 
-            closest_point, 
-            weight='length'
-            )
-        edge_lengths = ox.utils_graph.get_route_edge_attributes(graph, route, 'length')
+    # obtain the closest node of each location, with a single query
+    location_names = list(loc_geodf["name"].values)
+    location_nodes = get_nearest_nodes(graph, loc_geodf.geometry.y.values, loc_geodf.geometry.x.values)
+
+    # find the shortest path lengths of all the locations with a single search
+    closest = nearest_facility(graph, start_location, location_nodes, location_names, cutoff)
                     
+    # update dict if required
+    if closest["closest_distance"] is not None and closest["closest_distance"] < dict_to_update["closest_distance"]:
+        dict_to_update["closest_name"] = closest["closest_name"]
+        dict_to_update["closest_distance"] = round(closest["closest_distance"],2)
+
+    return dict_to_update
+
+
+def prepare_places(osm_layers, list_of_places):
+    """
+    Input:
+        > osm_layers        dictionary returned by `extract_layers()`
+        > list_of_places    list of places (see `plot_udine_map()`)
+
+    Output:
+        > dictionary place -> geodataframe with the selected locations of that place
+          (representative points, for the places that have polygons)
+
+    Note: the names to keep and the use of the representative points are read from PLACE_CATEGORIES
+    """
+    places = {}
+
+    for place in list_of_places:
+
+        category = PLACE_CATEGORIES[place]
+        place_geodf = osm_layers[place].copy()
+
+        # keep only selected rows
+        if category["names"] is not None:
+            place_geodf = place_geodf.loc[place_geodf["name"].isin(category["names"])]
+
+        # extract the representative points from the polygons (if present)
+        if category["points"]:
+            place_geodf["geometry"] = place_geodf.representative_point().geometry
+
+        places[place] = place_geodf
+
+    return places
+
+
+def tag_places(places):
+    """
+    Input:
+        > places    dictionary place -> geodataframe (see `prepare_places()`)
+
+    Output:
+        > a single geodataframe (EPSG:4326) with the locations of all the places,
+          columns 'name', 'category' (the place) and 'geometry'
+    """
+    tagged = [
+        gpd.GeoDataFrame({"name": place_geodf["name"].values, "category": place}, geometry=place_geodf.geometry.values, crs=place_geodf.crs).to_crs(epsg=4326)
+        for place, place_geodf in places.items()
+    ]
+    if len(tagged) == 0:
+        return gpd.GeoDataFrame({"name": [], "category": []}, geometry=[], crs=4326)
+    return gpd.GeoDataFrame(pd.concat(tagged, ignore_index=True), crs=4326)
+
+
+def count_places_in_areas(tagged_places, areas_geodf, list_of_places):
+    """
+    Input:
+        > tagged_places     geodataframe with the locations of all the places (see `tag_places()`)
+        > areas_geodf       geodataframe with any number of polygons (areas), e.g. see `get_buffer_areas()`
+        > list_of_places    list of places to count
+
+    Output:
+        > dictionary place -> numpy array with the number of its locations in each area
+
+    Note: all the places and all the areas are counted with a single query on the spatial index
+    """
+    counts = count_points_in_areas(tagged_places, areas_geodf, "category")
+    return {
+        place: counts[place].values.astype(int) if place in counts.columns else np.zeros(len(areas_geodf), dtype=int)
+        for place in list_of_places
+    }
+
+
+def update_dict_with_distances(dict_to_update, names, distances):
+    """
+    Input:
+        > dict_to_update
+        > names             names of the locations of a place
+        > distances         route length (m) of each location (None if unreachable), e.g. from `nearest_facility()`
+
+    Output:
+        > updated dictionary, like `update_dict_with_closest_loc()` but without any search
+    """
+
+    # Setup placeholders
+    dict_to_update["closest_name"] = ""
+    dict_to_update["closest_distance"] = 100000
+
+    # closest reachable location
+    reachable = [(distance, i) for i, distance in enumerate(distances) if distance is not None]
+    if len(reachable) > 0:
+        closest_distance, closest_pos = min(reachable)
+
         # update dict if required
-        if sum(edge_lengths) < dict_to_update["closest_distance"]:
-            dict_to_update["closest_name"] = location_name
-            dict_to_update["closest_distance"] = round(sum(edge_lengths),2)  
+        if closest_distance < dict_to_update["closest_distance"]:
+            dict_to_update["closest_name"] = names[closest_pos]
+            dict_to_update["closest_distance"] = round(closest_distance,2)
 
     return dict_to_update
 
 
-def plot_udine_map(udine_geodf, udine_osm, list_of_places, custom_address="", show_km_range = False, plot_uni_routes=False, list_of_uni="all", save=False, save_path=""):
+def _extract_pbf_layers(pbf_path, bounding_box, layers, use_cache, place_filters):
+    """
+    extracts the layers from the PBF, within the bounding box if given (see `extract_layers()`);
+    module level, so that the stage can run in another process
+
+    place_filters are the OSM filters of the requested places: a process started with "spawn"
+    imports place_categories.py again, without the categories added by `register_place_category()`
+    """
+    POI_FILTERS.update(place_filters)
+    return extract_layers(pyrosm.OSM(pbf_path, bounding_box=bounding_box), layers, use_cache)
+
+
+def _place_filters(layers):
+    """
+    returns the OSM filters of the places among the given layers (layer -> filter, see POI_FILTERS)
+    """
+    return {layer: POI_FILTERS[layer] for layer in layers if layer in POI_FILTERS}
+
+
+def _clip_layer(osm_layers, layer, area):
+    """
+    returns the given layer clipped to the area (see `clip_to_area()`)
+    """
+    return clip_to_area(osm_layers[layer], area)
+
+
+def _prepare_tagged_places(osm_layers, requested_places):
+    """
+    returns a tuple with the places (see `prepare_places()`) and the tagged locations of all of them
+    except the universities (see `tag_places()`)
+    """
+    places = prepare_places(osm_layers, requested_places)
+    return (places, tag_places({place: places[place] for place in requested_places if place != "university"}))
+
+
+def _geocode_blocking(udine_osm, custom_address, use_cache, geocode_provider, geocode_fallback):
+    """
+    geocodes the address offline, or with the given geopy provider (see `plot_udine_map()`)
+    """
+    if geocode_provider == "offline":
+        return geocode(get_geocoder(udine_osm, use_cache), custom_address, geocode_fallback)
+    return gpd.tools.geocode(custom_address, provider=geocode_provider)
+
+
+async def _geocode_address(udine_osm, custom_address, use_cache, geocode_provider, geocode_fallback):
+    """
+    geocodes the address without blocking the event loop of the scheduler:
+    the index lookup, or the request to the online provider, is awaited from a thread
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _geocode_blocking, udine_osm, custom_address, use_cache, geocode_provider, geocode_fallback)
+
+
+def _load_routing_graph(osm_layers, udine_osm, use_cache):
+    """
+    returns the routing graph (built once, then memory-mapped from the cache)
+    """
+    return get_routing_graph(udine_osm, use_cache, graph_layer=osm_layers.get("graph"))
+
+
+def _address_distance_fields(G, prepared_places, location, udine_polygon, udine_osm, use_cache):
+    """
+    returns the distance fields of the requested places (except the universities),
+    None if the address is not within Udine
+    """
+    location_to_test = location.geometry.values[0]
+    if location_to_test is None or not location_to_test.within(udine_polygon):
+        return None
+    places = prepared_places[0]
+    return get_distance_fields(udine_osm, G, {place: places[place] for place in places if place != "university"}, use_cache)
+
+
+@traced("plot_udine_map")
+def plot_udine_map(udine_geodf, udine_osm, list_of_places, custom_address="", show_km_range = False, plot_uni_routes=False, list_of_uni="all", save=False, save_path="", use_cache=True, geocode_provider="offline", geocode_fallback=None, bbox_pushdown=True, plot=True, use_distance_fields=True, concurrent=True):
     """
     Input:
         > udine_geodf       geodataframe of Udine
@@ -158,6 +407,7 @@ def plot_udine_map(udine_geodf, udine_osm, list_of_places, custom_address="", sh
                                 - "bicycle rental"
                                 - "car rental"
                                 - "bus station"
+                                - any place added with `register_place_category()` (see `place_categories.py`)
         > custom_address    Udine address
         > show_km_range     boolean value, if set to True shows on the map the 1km area around the given address
         > plot_uni_routes   boolean value, if set to True shows the closest universities routes (by length)
@@ -170,299 +420,208 @@ def plot_udine_map(udine_geodf, udine_osm, list_of_places, custom_address="", sh
                                 - "Università degli Studi di Udine - Polo Scientifico dei Rizzi"
         > save              boolean value, if set to True saves the plot as .jpg
         > save_path         path and name of plot to save
+        > use_cache         boolean value, if set to True the OSM layers are read from (and stored in) the on-disk
+                            layer cache, which is keyed by the content of the PBF file
+        > geocode_provider  "offline" to geocode the address with the addresses of the PBF file,
+                            or a geopy provider (e.g. "arcgis") to geocode it online
+        > geocode_fallback  geopy provider used if the offline geocoding fails (e.g. "arcgis"), None to disable
+        > bbox_pushdown     boolean value, if set to True buildings and streets are read only within the bounding box
+                            of Udine (places and routing graph are always read from the whole PBF)
+        > plot              boolean value, if set to False runs in headless mode: only the information about
+                            the address is computed (no figure, buildings, streets or clipping)
+        > use_distance_fields   boolean value, if set to True the closest locations are read from the precomputed
+                                distance fields (one multi-source search per place, then reused for every address)
+        > concurrent        boolean value, if set to True the independent stages (extraction, clipping, geocoding,
+                            routing graph, distance fields) run concurrently (see `scheduler.py`), otherwise one after another
+                            (always one after another when the spans trace the memory, see `instrumentation.configure()`)
     """
 
-    # keep track of time
+    # keep track of time (the stages are also recorded as spans, see `instrumentation.py`)
     start = time.time()
 
-    # obtain the buildings
-    print("> Obtaining Buildings from OSM")
-    udine_buildings = udine_osm.get_buildings()
-
-    # obtain the streets
-    print("> Obtaining Streets from OSM")
-    udine_streets_driving = udine_osm.get_network(network_type="driving")
-    udine_streets_walking = udine_osm.get_network(network_type="walking")
-    
-    # clip the buildings and streets obtained based on the map of Udine
-    print("> Clipping Buildings and Streets")
-    udine_buildings_clipped = gpd.clip(udine_buildings, udine_geodf.to_crs(epsg=4326))
-    udine_streets_driving_clipped = gpd.clip(udine_streets_driving, udine_geodf.to_crs(epsg=4326))
-    udine_streets_walking_clipped = gpd.clip(udine_streets_walking, udine_geodf.to_crs(epsg=4326))
-
-    # create the base map of Udine
-    print("> Generating Base Map")
-    base = udine_geodf.to_crs(epsg=4326).plot(
-        figsize=(100, 100),
-        color="#B5CEA8",
-        edgecolor="#7AA762",
-        linewidth=10
-        )
-
-    # add buildings
-    print("> Adding Buildings")
-    udine_buildings_clipped.plot(
-        ax=base,
-        color="#DC9596"
-        )
-
-    # add streets
-    print("> Adding Streets")
-    udine_streets_driving_clipped.plot(ax=base, color="#1F1F1F", lw=0.8, alpha=0.8)
-    udine_streets_walking_clipped.plot(ax=base, color="#3D3D3D", lw=0.6, alpha=0.8)
-
-    # dictionary that will contain all the information required
-    info_dict = {}
-
-    # add additional elements, if requested
-
-    if "university" in list_of_places:
-
-        print("> Adding Universities")
-
-        # obtain the data
-        universities = extract_data_from_OSM(udine_osm, "amenity", ["university"])
-
-        # by inspecting the results, we find the list of geometries to be kept 
-        # (those corresponding to real university locations)
-        uni_names = [
-            "Dipartimento di Scienze Giuridiche",
-            "Università degli Studi di Udine - Facoltà di Medicina e Chirurgia - Corsi di Laurea Area Sanitaria",
-            "Università degli Studi di Udine - Facoltà di Scienze della Formazione",
-            "Università degli Studi di Udine - Dipartimento di Area medica",
-            "Università degli Studi di Udine - Polo Scientifico dei Rizzi"
-        ]
-
-        # keep the found values
-        universities = universities.loc[universities["name"].isin(uni_names)]
-
-        # we store the buildings separately
-        universities_buildings = universities.loc[universities["osm_type"] != "node"]
-
-        # and we find the representative points of the original dataset 
-        universities["geometry"] = universities.representative_point().geometry
-
-        # add universities to the plot
-        universities_buildings.plot(
-            ax=base,
-            color="#D68586",
-            markersize=1000,
-            edgecolor="black",
-            linewidth=2
-        )
-
-        # and their representative points
-        universities.plot(
-            ax=base,
-            color="#FF9F1C",
-            edgecolor="black",
-            marker='*',
-            markersize=5000,
-            linewidth=4
-        )
-
-    if "supermarket" in list_of_places:
+    # map of Udine in EPSG:4326 (projected once, only if needed), used for clipping, plotting and checking the address
+    udine_geodf = as_crs(udine_geodf, 4326)
+    udine_area = udine_geodf.unary_union
+
+    # the layers required (buildings and streets only within the bounding box of Udine, if requested)
+    # note: in headless mode (plot=False) buildings and streets are not required at all
+    map_osm = get_bounded_osm(udine_osm, udine_geodf) if bbox_pushdown else udine_osm
+    map_layers = ["buildings", "driving", "walking"] if plot else []
+    required_layers = [place for place in list_of_places if place in POI_FILTERS]
+    requested_places = [place for place in PLACE_CATEGORIES if place in list_of_places]
+    if custom_address != "" and not (use_cache and is_routing_graph_cached(udine_osm)):
+        required_layers.append("graph")
+
+    # stages of the data, each one starts as soon as its dependencies are done (see `scheduler.py`):
+    # the extraction runs in a process if the PBF has to be decoded, in a thread if the layers are cached
+    stages = {}
+    if map_osm is udine_osm:
+        # a single pass for buildings, streets and places
+        layers = map_layers + required_layers
+        executor = "thread" if use_cache and are_layers_cached(udine_osm, layers) else "process"
+        stages["extract"] = stage(_extract_pbf_layers, executor=executor, args=(udine_osm.filepath, getattr(udine_osm, "bounding_box", None), layers, use_cache, _place_filters(layers)))
+        map_stage = places_stage = "extract"
+    else:
+        map_stage, places_stage = "extract_map", "extract_places"
+        for name, osm, layers in [(map_stage, map_osm, map_layers), (places_stage, udine_osm, required_layers)]:
+            if name == map_stage and len(layers) == 0:
+                continue
+            executor = "thread" if use_cache and are_layers_cached(osm, layers) else "process"
+            stages[name] = stage(_extract_pbf_layers, executor=executor, args=(osm.filepath, getattr(osm, "bounding_box", None), layers, use_cache, _place_filters(layers)))
 
-        print("> Adding Supermarket")
+    if plot:
+        for layer in map_layers:
+            stages["clip_" + layer] = stage(_clip_layer, [map_stage], args=(layer, udine_area))
 
-        # obtain the data
-        supermarkets = extract_data_from_OSM(udine_osm, "shop", ["supermarket"])
+    stages["places"] = stage(_prepare_tagged_places, [places_stage], args=(requested_places,))
 
-        # extract the representative points from the polygons (if present)
-        supermarkets["geometry"] = supermarkets.representative_point().geometry
-        
-        # add supermarkets to the plot
-        supermarkets.plot(
-            ax=base,
-            color="#7776BC",
-            edgecolor="black",
-            markersize=250,
-            linewidth=2
-        )
-
-    if "hospital" in list_of_places:
+    if custom_address != "":
+        stages["geocode"] = stage(_geocode_address, executor="async", args=(udine_osm, custom_address, use_cache, geocode_provider, geocode_fallback))
+        stages["graph"] = stage(_load_routing_graph, [places_stage], args=(udine_osm, use_cache))
+        if use_distance_fields:
+            stages["distance_fields"] = stage(_address_distance_fields, ["graph", "places", "geocode"], args=(udine_geodf.geometry.values[0], udine_osm, use_cache))
+
+    print("> Obtaining Buildings, Streets and Places from OSM")
+    if plot:
+        print("> Clipping Buildings and Streets")
+    if custom_address != "":
+        print("> Geocoding Address and Loading the Routing Graph")
+    timings = {}
+    results = run_stages(stages, concurrent=concurrent, timings=timings)
+    path, path_time = critical_path(stages, timings)
+    print("> Data Ready in", round(max(end for _, end in timings.values()), 2), "seconds (critical path: " + " -> ".join(path) + ", " + str(round(path_time, 2)) + " seconds)")
+
+    # results of the stages
+    osm_layers = dict(results[map_stage]) if map_stage in results else {}
+    osm_layers.update(results[places_stage])
+    places, tagged_places = results["places"]
+
+    if plot:
+
+        # buildings and streets clipped based on the map of Udine
+        udine_buildings_clipped = results["clip_buildings"]
+        udine_streets_driving_clipped = results["clip_driving"]
+        udine_streets_walking_clipped = results["clip_walking"]
+
+        # create the base map of Udine
+        with span("plot", layer="base map"):
+            print("> Generating Base Map")
+            base = udine_geodf.plot(
+                figsize=(100, 100),
+                color="#B5CEA8",
+                edgecolor="#7AA762",
+                linewidth=10
+                )
 
-        print("> Adding Hospitals")
+            # add buildings
+            print("> Adding Buildings")
+            udine_buildings_clipped.plot(
+                ax=base,
+                color="#DC9596"
+                )
 
-        # obtain the data
-        hospitals = extract_data_from_OSM(udine_osm, "amenity", ["hospital"])
-        hospitals["geometry"] = hospitals.representative_point().geometry
+            # add streets
+            print("> Adding Streets")
+            udine_streets_driving_clipped.plot(ax=base, color="#1F1F1F", lw=0.8, alpha=0.8)
+            udine_streets_walking_clipped.plot(ax=base, color="#3D3D3D", lw=0.6, alpha=0.8)
 
-        # keep only selected rows
-        hospitals_names = [
-            'Pronto Soccorso Udine',
-            'Policlinico Città di Udine Polo 1',
-            'Policlinico Città di Udine Polo 2',
-            'Ospedale Civile "Santa Maria della Misericordia"'
-        ]
-        hospitals = hospitals.loc[hospitals["name"].isin(hospitals_names)]
-
-        # add hospitals to the plot
-        hospitals.plot(
-            ax=base,
-            color="#8A2E2F",
-            edgecolor="black",
-            marker='P',
-            markersize=1000,
-            linewidth=3
-        )
+    # dictionary that will contain all the information required
+    info_dict = {}
 
-    if "eating place" in list_of_places:
-        
-        print("> Adding Eating Places")
-        
-        # obtain the data of both restaurants and fast_foods
-        eating_places = extract_data_from_OSM(udine_osm, "amenity", ["restaurant","fast_food"])
-        eating_places["geometry"] = eating_places.representative_point().geometry
-
-        # add eating places to the plot
-        eating_places.plot(
-            ax=base,
-            color="#03B591",
-            edgecolor="black",
-            marker='h',
-            markersize=200,
-            linewidth=2,
-            alpha=0.75
-        )
+    # add the requested places to the plot (style and names from PLACE_CATEGORIES)
+    for place in requested_places:
 
-    if "bicycle rental" in list_of_places:
-        
-        print("> Adding Bicycle Rental Locations")
-        
-        # obtain the data
-        bicycle_rental = extract_data_from_OSM(udine_osm, "amenity", ["bicycle_rental"])
-
-        # add bicycle rental to the plot
-        bicycle_rental.plot(
-            ax=base,
-            color="#FFFFFF",
-            edgecolor="black",
-            marker='>',
-            markersize=450,
-            linewidth=2
-        )
+        category = PLACE_CATEGORIES[place]
+        print("> Adding " + category["label"])
 
-    if "car rental" in list_of_places:
-        
-        print("> Adding Car Rental Locations")
-        
-        # obtain the data
-        car_rental = extract_data_from_OSM(udine_osm, "amenity", ["car_rental"])
-
-        # add car rental to the plot
-        car_rental.plot(
-            ax=base,
-            color="#B8B8B8",
-            edgecolor="black",
-            marker='<',
-            markersize=450,
-            linewidth=2
-        )
+        if plot:
+            with span("plot", layer=place):
 
-    if "bus station" in list_of_places:
-        
-        print("> Adding Bus Stations")
-        
-        # obtain the data
-        bus_station = extract_data_from_OSM(udine_osm, "amenity", ["bus_station"])
+                # the polygons of the selected locations (e.g. the university buildings), if required
+                if category["polygon_style"] is not None:
+                    polygons = osm_layers[place]
+                    if category["names"] is not None:
+                        polygons = polygons.loc[polygons["name"].isin(category["names"])]
+                    polygons = polygons.loc[polygons["osm_type"] != "node"]
+                    polygons.plot(ax=base, **category["polygon_style"])
 
-        # keep only selected rows
-        bus_station_names = [
-            'Autostazione di Udine',
-            'Terminal Studenti'
-        ]
-        bus_station = bus_station.loc[bus_station["name"].isin(bus_station_names)]
-        bus_station["geometry"] = bus_station.representative_point().geometry
-
-        # add bus station to the plot
-        bus_station.plot(
-            ax=base,
-            color="#F8F272",
-            edgecolor="black",
-            marker='v',
-            markersize=450,
-            linewidth=2
-        )
+                # and the locations (representative points, if required)
+                places[place].plot(ax=base, **category["style"])
 
     # add custom address location to the map
     if custom_address != "":
 
         print("> Adding info about provided Address to the Map")
 
-        # find coordinates
-        print(" - Geocoding Address")
-        location = gpd.tools.geocode(custom_address, provider="arcgis")
+        # coordinates found by the geocoding stage
+        location = results["geocode"]
 
         # check that the coordinates are within the map of Udine
         print(" - Checking that the position found is within the boundaries of Udine")
         location_to_test = location.geometry.values[0]
-        udine_for_test = udine_geodf.reset_index().to_crs(epsg=4326).geometry[0]
+        udine_for_test = udine_geodf.geometry.values[0]
 
-        if (location_to_test.within(udine_for_test)):
+        if (location_to_test is not None and location_to_test.within(udine_for_test)):
 
             # plot the point
             print(" - The location is within boundaries, adding Location to the Map")
-            location.plot(
-                ax=base,
-                color="#30B4C5",
-                edgecolor="black",
-                marker='D',
-                markersize=2500,
-                linewidth=4
-            )
+            if plot:
+                location.plot(
+                    ax=base,
+                    color="#30B4C5",
+                    edgecolor="black",
+                    marker='D',
+                    markersize=2500,
+                    linewidth=4
+                )
 
             # logic to show routes from custom address to universities, if requested
             print(" - Obtaining Information about Required Locations")
 
-            # create osmnx network
-            nodes, edges = udine_osm.get_network(nodes=True)
-            G = udine_osm.to_graph(nodes, edges, graph_type="networkx")
-            nodes_for_route, edges_for_route = ox.graph_to_gdfs(G)
+            # routing graph loaded by its stage
+            G = results["graph"]
 
             # find closest point to custom address
             address_coords = (location["geometry"].y.values[0], location["geometry"].x.values[0])
-            closest_point_to_address = ox.get_nearest_node(G, address_coords)
-
-            # UNIVERSITY
-            # find closest points to required universities
-            list_of_uni_closest_points = []
+            closest_point_to_address = get_nearest_node(G, address_coords)
 
+            # facilities to search from the address: the required universities (for their routes) and,
+            # without the distance fields, the locations of every other place
             if list_of_uni == "all":
-                list_of_uni = uni_names
-
-            for idx,row in universities.iterrows():
-                uni_name = row["name"]                       
-                if uni_name in list_of_uni:
-                    geom = row["geometry"]
-                    lat = geom.y
-                    lon = geom.x
-                    coords = (lat, lon)
-                    list_of_uni_closest_points.append([uni_name, ox.get_nearest_node(G, coords)])
-
-            # find closest routes and distances
+                list_of_uni = UNI_NAMES
+
+            other_places = [place for place in requested_places if place != "university"]
+            facilities = tagged_places.iloc[0:0] if use_distance_fields else tagged_places
+            if "university" in places:
+                required_unis = places["university"].loc[places["university"]["name"].isin(list_of_uni)]
+                facilities = gpd.GeoDataFrame(pd.concat([tag_places({"university": required_unis}), facilities], ignore_index=True), crs=4326)
+
+            # find closest routes and distances of all the facilities, with a single search from the address
+            with span("search", categories=list(pd.unique(facilities["category"]))):
+                facility_points = facilities.representative_point()
+                facility_nodes = get_nearest_nodes(G, facility_points.y.values, facility_points.x.values)
+                closest = nearest_facility(G, closest_point_to_address, facility_nodes, list(facilities["name"].values))
+            facility_categories = facilities["category"].values
+
+            # UNIVERSITY
             uni_dict = {}
-            for uni_point in list_of_uni_closest_points:
-                
-                # obtain closest route (by length)
-                closest_route = ox.shortest_path(
-                    G, 
-                    closest_point_to_address, 
-                    uni_point[1], 
-                    weight='length'
-                    )
+            is_uni = facility_categories == "university"
+            uni_distances = [d for d, keep in zip(closest["distances"], is_uni) if keep]
+            for uni_name, uni_point, uni_distance in zip(facilities["name"].values[is_uni], np.asarray(facility_nodes)[is_uni], uni_distances):
 
                 # obtain distance info
-                edge_lengths = ox.utils_graph.get_route_edge_attributes(G, closest_route, 'length')
-                uni_dict[uni_point[0]] = round(sum(edge_lengths),2)
+                uni_dict[uni_name] = round(uni_distance,2) if uni_distance is not None else None
 
-                # note: ox gives us the nodes id --> we want a LineString
-                route_nodes = nodes_for_route.loc[closest_route]
-                route_line = LineString(route_nodes['geometry'].tolist())
-                route_geodf = gpd.GeoDataFrame(geometry=[route_line], crs=ox.settings.default_crs)
+                # obtain closest route (by length), from the shortest path tree
+                closest_route = route_from_predecessors(closest["predecessors"], uni_point, closest_point_to_address)
 
                 # plot the routes, if requested
-                if plot_uni_routes:
+                if plot and plot_uni_routes and closest_route is not None and len(closest_route) > 1:
+
+                    # note: we have the nodes positions --> we want a LineString
+                    route_line = LineString(route_coords(G, closest_route))
+                    route_geodf = gpd.GeoDataFrame(geometry=[route_line], crs=4326)
+
                     route_geodf.plot(
                         ax=base,
                         color="#B33951",
@@ -483,8 +642,12 @@ def plot_udine_map(udine_geodf, udine_osm, list_of_places, custom_address="", sh
             location_crs_1km_geodf = gpd.GeoDataFrame(geometry=[location_crs_1km], crs=32632)   # create geodf for plot
             location_crs_1km_geodf = location_crs_1km_geodf.to_crs(epsg=4326)                   # go back to 4326
 
+            # precomputed distance fields of the requested locations (persisted next to the routing graph), from their stage
+            if use_distance_fields:
+                fields = results["distance_fields"]
+
             # plot the area, if requested
-            if show_km_range:
+            if plot and show_km_range:
                 location_crs_1km_geodf.plot(
                     ax=base,
                     color="#8CD9E3",
@@ -493,107 +656,74 @@ def plot_udine_map(udine_geodf, udine_osm, list_of_places, custom_address="", sh
                     alpha = 0.30
                 )
 
-            # SUPERMARKET
-            if "supermarket" in list_of_places:
-
-                print("    * Supermarkets")
-                supermarket_dict = {}
-
-                # points in 1km area
-                count = count_points_in_area(supermarkets, location_crs_1km_geodf)
-                supermarket_dict["in_1km_area"] = count
-
-                # find closest to address
-                supermarket_dict = update_dict_with_closest_loc(supermarket_dict, supermarkets, G, closest_point_to_address)                
-
-                info_dict["supermarket"] = supermarket_dict
-
-            # HOSPITAL
-            if "hospital" in list_of_places:
-
-                print("    * Hospitals")
-                hospital_dict = {}
-
-                # points in 1km area
-                count = count_points_in_area(hospitals, location_crs_1km_geodf)
-                hospital_dict["in_1km_area"] = count
-
-                # find closest to address
-                hospital_dict = update_dict_with_closest_loc(hospital_dict, hospitals, G, closest_point_to_address)
-
-                info_dict["hospital"] = hospital_dict
-
-            # EATING PLACE
-            if "eating place" in list_of_places:
-
-                print("    * Eating Places")
-                eating_place_dict = {}
+            # points of every place in the 1km area, with a single query
+            with span("count", categories=other_places):
+                counts = count_places_in_areas(tagged_places, location_crs_1km_geodf, other_places)
 
-                # points in 1km area
-                count = count_points_in_area(eating_places, location_crs_1km_geodf)
-                eating_place_dict["in_1km_area"] = count
-
-                # find closest to address
-                eating_place_dict = update_dict_with_closest_loc(eating_place_dict, eating_places, G, closest_point_to_address)
-
-                info_dict["eating_place"] = eating_place_dict
-
-            # BICYCLE RENTAL
-            if "bicycle rental" in list_of_places:
-
-                print("    * Bicycle Rentals")
-                bicycle_rental_dict = {}
-
-                # points in 1km area
-                count = count_points_in_area(bicycle_rental, location_crs_1km_geodf)
-                bicycle_rental_dict["in_1km_area"] = count
+            for place in other_places:
 
-                # find closest to address
-                bicycle_rental_dict = update_dict_with_closest_loc(bicycle_rental_dict, bicycle_rental, G, closest_point_to_address)
-
-                info_dict["bicycle_rental"] = bicycle_rental_dict
-
-            # CAR RENTAL
-            if "car rental" in list_of_places:
-
-                print("    * Car Rentals")
-                car_rental_dict = {}
+                print("    * " + PLACE_CATEGORIES[place]["label"])
+                place_dict = {}
 
                 # points in 1km area
-                count = count_points_in_area(car_rental, location_crs_1km_geodf)
-                car_rental_dict["in_1km_area"] = count
-
-                # find closest to address
-                car_rental_dict = update_dict_with_closest_loc(car_rental_dict, car_rental, G, closest_point_to_address)
+                place_dict["in_1km_area"] = int(counts[place][0])
 
-                info_dict["car_rental"] = car_rental_dict
+                # find closest to address (from the distance field, or from the single search above)
+                if use_distance_fields:
+                    place_dict = update_dict_with_distance_field(place_dict, fields[place], closest_point_to_address)
+                else:
+                    is_place = facility_categories == place
+                    place_distances = [d for d, keep in zip(closest["distances"], is_place) if keep]
+                    place_dict = update_dict_with_distances(place_dict, list(facilities["name"].values[is_place]), place_distances)
 
-            # BUS STATION
-            if "bus station" in list_of_places:
-
-                print("    * Bus Stations")
-                bus_station_dict = {}
-
-                # points in 1km area
-                count = count_points_in_area(bus_station, location_crs_1km_geodf)
-                bus_station_dict["in_1km_area"] = count
-
-                # find closest to address
-                bus_station_dict = update_dict_with_closest_loc(bus_station_dict, bus_station, G, closest_point_to_address)
-
-                info_dict["bus_station"] = bus_station_dict
+                info_dict[PLACE_CATEGORIES[place]["output_key"]] = place_dict
 
         else:
             print(" - ATTENTION: the provided address was not within the boundaries of Udine. \n   No information was added to the map. Please check that the address you wrote is correct.")
 
     # save the plot, if requested
-    if save:
+    if plot and save:
         print("> Saving the image")
-        plt.savefig(save_path)
+        with span("save"):
+            plt.savefig(save_path)
 
     # show total time of computation
     end = time.time()
     print("\n> Elapsed Time:", round(end - start,2), "seconds")
+    if use_cache:
+        print_cache_stats()
 
     # returning information
-    return info_dict
\ No newline at end of file
+    return info_dict
+
+
+def compute_udine_info(udine_geodf, udine_osm, list_of_places, custom_address, list_of_uni="all", use_cache=True, geocode_provider="offline", geocode_fallback=None):
+    """
+    Headless version of `plot_udine_map()`: no figure is created, no layer is plotted or clipped
+
+    Input:
+        > see `plot_udine_map()`
+
+    Output:
+        > tuple with three elements
+            - pos 0: dictionary with the information about the address (like `plot_udine_map()`)
+            - pos 1: df about universities (see `extract_info_from_dict()`)
+            - pos 2: df about other locations (see `extract_info_from_dict()`)
+    """
+    info_dict = plot_udine_map(
+        udine_geodf,
+        udine_osm,
+        list_of_places,
+        custom_address=custom_address,
+        list_of_uni=list_of_uni,
+        use_cache=use_cache,
+        geocode_provider=geocode_provider,
+        geocode_fallback=geocode_fallback,
+        plot=False
+        )
+
+    if len(info_dict) == 0:
+        return (info_dict, None, None)
+
+    uni_df, location_df = extract_info_from_dict(info_dict)
+    return (info_dict, uni_df, location_df)
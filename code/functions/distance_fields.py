@@ -0,0 +1,147 @@
+# Import Libraries
+import os
+import re
+import json
+import hashlib
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+from .routing import get_nearest_nodes
+from .routing_graph import get_routing_graph_path
+
+
+# maximum length of the readable part of the file names of the fields
+FIELD_SLUG_LENGTH = 40
+
+
+def compute_distance_field(graph, facility_nodes):
+    """
+    Input:
+        > graph             routing graph (see `routing_graph.py`)
+        > facility_nodes    list of node positions, one for each facility
+
+    Output:
+        > tuple with two arrays, with one value for every node of the graph
+            - pos 0: route length (m) from the node to its nearest facility (inf if unreachable)
+            - pos 1: position (in facility_nodes) of the nearest facility (-1 if unreachable)
+
+    Note: a single multi-source Dijkstra is run from all the facilities together, on the
+    transposed graph, so the distances are the ones from the nodes to the facilities
+    """
+    n_nodes = len(graph["node_ids"])
+    facility_nodes = np.asarray(facility_nodes, dtype=int)
+
+    if len(facility_nodes) == 0:
+        return (np.full(n_nodes, np.inf), np.full(n_nodes, -1, dtype=np.int32))
+
+    reversed_matrix = graph["matrix"].transpose().tocsr()
+    distances, _, sources = dijkstra(
+        reversed_matrix,
+        directed=True,
+        indices=np.unique(facility_nodes),
+        min_only=True,
+        return_predecessors=True
+        )
+
+    # from the source node to the facility (the first one, if several facilities share the same node)
+    node_to_facility = np.full(n_nodes, -1, dtype=np.int32)
+    node_to_facility[facility_nodes[::-1]] = np.arange(len(facility_nodes), dtype=np.int32)[::-1]
+    facility = np.where(sources >= 0, node_to_facility[np.maximum(sources, 0)], -1).astype(np.int32)
+
+    return (distances, facility)
+
+
+def _fields_key(category, names, coords):
+    """
+    returns a key that identifies the facilities of a category (names and coordinates), safe as a file name:
+    a short slug of the category (e.g. "university_polo_scientifico_dei_rizzi") plus the hash of the content
+    """
+    content = json.dumps([category, [str(n) for n in names], np.round(coords, 6).tolist()])
+    slug = re.sub(r"[^a-z0-9]+", "_", category.lower()).strip("_")[:FIELD_SLUG_LENGTH]
+    return slug + "_" + hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+
+def get_distance_field(graph, category, place_geodf, fields_dir=None):
+    """
+    Input:
+        > graph         routing graph
+        > category      name of the category (e.g. "supermarket")
+        > place_geodf   geodataframe with the facilities of the category (column 'name')
+        > fields_dir    folder where the fields are persisted, None to disable the persistence
+
+    Output:
+        > distance field of the category, i.e. a dictionary with
+            - "distances"   route length from every node of the graph to the nearest facility
+            - "facility"    position of the nearest facility for every node of the graph (-1 if none)
+            - "names"       list with the name of each facility
+    """
+    points = place_geodf.representative_point()
+    coords = np.column_stack([points.x.values, points.y.values]) if len(points) > 0 else np.zeros((0, 2))
+    names = list(place_geodf["name"].values)
+
+    # load the field, if already computed
+    if fields_dir is not None:
+        field_path = os.path.join(fields_dir, _fields_key(category, names, coords))
+        if os.path.exists(field_path + "_facility.npy"):
+            return {
+                "distances": np.load(field_path + "_distances.npy", mmap_mode="r"),
+                "facility": np.load(field_path + "_facility.npy", mmap_mode="r"),
+                "names": names
+            }
+
+    # otherwise compute it: facilities snapped to the graph, then one multi-source search
+    facility_nodes = get_nearest_nodes(graph, coords[:, 1], coords[:, 0])
+    distances, facility = compute_distance_field(graph, facility_nodes)
+
+    if fields_dir is not None:
+        # written under temporary names and then renamed, the facilities last (their file marks a complete field)
+        os.makedirs(fields_dir, exist_ok=True)
+        for suffix, array in [("_distances.npy", distances), ("_facility.npy", facility)]:
+            tmp_path = field_path + suffix + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_path, "wb") as field_file:
+                np.save(field_file, array)
+            os.replace(tmp_path, field_path + suffix)
+
+    return {"distances": distances, "facility": facility, "names": names}
+
+
+def get_distance_fields(osm, graph, places, use_cache=True, per_facility=()):
+    """
+    Input:
+        > osm               pyrosm.OSM object the graph comes from
+        > graph             routing graph
+        > places            dictionary category -> geodataframe (e.g. obtained with `prepare_places()`)
+        > use_cache         boolean value, if set to True the fields are persisted next to the routing graph
+        > per_facility      list of categories for which a separate field is computed for each facility
+                            (e.g. ["university"], to know the distance of every university);
+                            these fields are named "<category>: <facility name>"
+
+    Output:
+        > dictionary field name -> distance field (see `get_distance_field()`)
+    """
+    fields_dir = get_routing_graph_path(osm) + "_distance_fields" if use_cache else None
+
+    fields = {}
+    for category, place_geodf in places.items():
+        if category in per_facility:
+            for i in range(len(place_geodf)):
+                name = place_geodf["name"].values[i]
+                fields[category + ": " + str(name)] = get_distance_field(graph, category + ": " + str(name), place_geodf.iloc[[i]], fields_dir)
+        else:
+            fields[category] = get_distance_field(graph, category, place_geodf, fields_dir)
+
+    return fields
+
+
+def lookup_distance_field(field, node):
+    """
+    Input:
+        > field     distance field (see `get_distance_field()`)
+        > node      position of a node of the graph (e.g. the node closest to an address)
+
+    Output:
+        > tuple (name of the nearest facility, route length), ("", None) if no facility is reachable
+    """
+    facility = int(field["facility"][node])
+    if facility < 0:
+        return ("", None)
+    return (field["names"][facility], float(field["distances"][node]))
@@ -0,0 +1,299 @@
+# Import Libraries
+import os
+import re
+import json
+import difflib
+import unicodedata
+import geopandas as gpd
+from collections import OrderedDict
+from shapely.geometry import Point
+from .osm_cache import get_pbf_cache_dir, read_cached_layer, write_cached_layer
+
+
+# OSM tags used to build the geocoding index
+ADDRESS_TAGS = ["addr:street", "addr:housenumber", "addr:city", "addr:postcode"]
+
+# common abbreviations of the Italian street types
+STREET_ABBREVIATIONS = {
+    "v": "via",
+    "vle": "viale",
+    "p": "piazza",
+    "pza": "piazza",
+    "pzza": "piazza",
+    "p.za": "piazza",
+    "p.zza": "piazza",
+    "p.le": "piazzale",
+    "ple": "piazzale",
+    "c.so": "corso",
+    "cso": "corso",
+    "l.go": "largo",
+    "lgo": "largo",
+    "v.le": "viale",
+    "v.lo": "vicolo",
+    "vlo": "vicolo"
+}
+
+# minimum similarity of two street names for the fuzzy matching
+FUZZY_CUTOFF = 0.8
+
+# maximum number of results kept in the persistent cache
+MAX_CACHE_SIZE = 10000
+
+# geocoders already built in this session: (PBF path, use_cache) -> geocoder
+_GEOCODERS = {}
+
+
+def normalize_text(text):
+    """
+    returns the given text lowercase, without accents, punctuation and repeated spaces,
+    and with the abbreviations of the street types expanded (e.g. 'P.zza' -> 'piazza')
+    """
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii").lower()
+    words = [STREET_ABBREVIATIONS.get(word, word) for word in text.split()]
+    text = re.sub(r"[^a-z0-9/ ]", " ", " ".join(words))
+    words = [STREET_ABBREVIATIONS.get(word, word) for word in text.split()]
+    return " ".join(words)
+
+
+def parse_address(address):
+    """
+    Input:
+        > address       e.g. "Via delle Scienze 206, 33100 Udine"
+
+    Output:
+        > tuple (street, housenumber, city), normalized ("" for missing parts)
+    """
+    parts = [part.strip() for part in address.split(",") if part.strip() != ""]
+    if len(parts) == 0:
+        return ("", "", "")
+
+    street = parts[0]
+    housenumber = ""
+    others = parts[1:]
+
+    # house number at the end of the street part, or as a separate part
+    match = re.match(r"^(.*?)\s+(\d+\s?[a-zA-Z]?(?:/\w+)?)$", street)
+    if match:
+        street, housenumber = match.group(1), match.group(2)
+    elif len(others) > 0 and re.match(r"^\d+\s?[a-zA-Z]?(?:/\w+)?$", others[0]):
+        housenumber = others[0]
+        others = others[1:]
+
+    # city: the first remaining part, without the postcode
+    city = ""
+    for part in others:
+        part = re.sub(r"\b\d{5}\b", "", part).strip()
+        if part != "":
+            city = part
+            break
+
+    return (normalize_text(street), normalize_text(housenumber).replace(" ", ""), normalize_text(city))
+
+
+def get_address_points(osm, use_cache=True):
+    """
+    Input:
+        > osm           pyrosm.OSM object
+        > use_cache     boolean value, if set to True the addresses are read from (and stored in) the layer cache
+
+    Output:
+        > geodataframe with the OSM features that have an address (point geometry and addr:* columns)
+    """
+    if use_cache:
+        cached = read_cached_layer(osm, "addresses")
+        if cached is not False:
+            return cached
+
+    addresses = osm.get_data_by_custom_filter(
+        custom_filter={"addr:street": True},
+        filter_type="keep",
+        tags_as_columns=ADDRESS_TAGS
+        )
+
+    if addresses is not None:
+        addresses = addresses[ADDRESS_TAGS + ["geometry"]].copy()
+        addresses["geometry"] = addresses.representative_point().geometry
+
+    if use_cache:
+        write_cached_layer(addresses, osm, "addresses")
+
+    return addresses
+
+
+def build_geocoder(osm, use_cache=True):
+    """
+    Input:
+        > osm           pyrosm.OSM object
+        > use_cache     boolean value, if set to True the addresses and the results are read from (and stored in) the cache
+
+    Output:
+        > geocoder, i.e. a dictionary with
+            - "index"       street -> city -> housenumber -> (lat, lon)
+            - "streets"     list of the streets in the index (used for the fuzzy matching)
+            - "cache"       ordered dictionary address -> (lat, lon), least recently used first
+            - "cache_path"  path of the json file of the persistent cache (None if not persistent)
+            - "dirty"       True if the cache has results not yet written on disk
+    """
+    index = {}
+    address_points = get_address_points(osm, use_cache)
+
+    if address_points is not None:
+        for street, housenumber, city, geom in zip(
+                address_points["addr:street"], address_points["addr:housenumber"],
+                address_points["addr:city"], address_points.geometry):
+            street = normalize_text(street)
+            if street == "":
+                continue
+            numbers = index.setdefault(street, {}).setdefault(normalize_text(city), {})
+            numbers[normalize_text(housenumber).replace(" ", "")] = (geom.y, geom.x)
+
+    geocoder = {
+        "index": index,
+        "streets": list(index.keys()),
+        "cache": OrderedDict(),
+        "cache_path": None,
+        "dirty": False
+    }
+
+    # load the persistent cache of the results
+    if use_cache:
+        geocoder["cache_path"] = os.path.join(get_pbf_cache_dir(osm.filepath), "geocoding_cache.json")
+        if os.path.exists(geocoder["cache_path"]):
+            with open(geocoder["cache_path"], "r", encoding="UTF-8") as cache_file:
+                geocoder["cache"] = OrderedDict((k, tuple(v)) for k, v in json.load(cache_file))
+
+    return geocoder
+
+
+def get_geocoder(osm, use_cache=True):
+    """
+    returns the geocoder of the given pyrosm.OSM object, building it only the first time (see `build_geocoder()`)
+    """
+    key = (os.path.abspath(osm.filepath), use_cache)
+    if key not in _GEOCODERS:
+        _GEOCODERS[key] = build_geocoder(osm, use_cache)
+    return _GEOCODERS[key]
+
+
+def _lookup(geocoder, street, housenumber, city):
+    """
+    looks for the address in the index, returns (lat, lon) or None
+    """
+    index = geocoder["index"]
+
+    # exact street, otherwise the most similar one
+    if street not in index:
+        matches = difflib.get_close_matches(street, geocoder["streets"], n=1, cutoff=FUZZY_CUTOFF)
+        if len(matches) == 0:
+            return None
+        street = matches[0]
+
+    # same city if possible, otherwise any city
+    cities = index[street]
+    if city in cities:
+        candidates = [cities[city]]
+    else:
+        candidates = list(cities.values())
+
+    # exact house number
+    for numbers in candidates:
+        if housenumber in numbers:
+            return numbers[housenumber]
+
+    # otherwise the closest house number on the same street
+    all_numbers = {n: coords for numbers in candidates for n, coords in numbers.items()}
+    numeric = {int(re.match(r"\d+", n).group()): coords for n, coords in all_numbers.items() if re.match(r"\d+", n)}
+    target = re.match(r"\d+", housenumber)
+    if target and len(numeric) > 0:
+        closest = min(numeric.keys(), key=lambda n: abs(n - int(target.group())))
+        return numeric[closest]
+
+    # otherwise the first address of the street
+    return next(iter(all_numbers.values()))
+
+
+def _add_to_cache(geocoder, key, value):
+    """
+    adds a result to the LRU cache, removing the least recently used results if required
+    """
+    geocoder["cache"][key] = value
+    geocoder["cache"].move_to_end(key)
+    geocoder["dirty"] = True
+    while len(geocoder["cache"]) > MAX_CACHE_SIZE:
+        geocoder["cache"].popitem(last=False)
+
+
+def save_geocoder_cache(geocoder):
+    """
+    writes the LRU cache of the results on disk (if the geocoder has a persistent cache and new results)
+
+    Note: the file is written under a temporary name and then renamed, so an interrupted run
+    never leaves a truncated cache
+    """
+    if geocoder["cache_path"] is None or not geocoder.get("dirty", False):
+        return
+    tmp_path = geocoder["cache_path"] + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, "w", encoding="UTF-8") as cache_file:
+        json.dump(list(geocoder["cache"].items()), cache_file)
+    os.replace(tmp_path, geocoder["cache_path"])
+    geocoder["dirty"] = False
+
+
+def geocode_address(geocoder, address, fallback_provider=None):
+    """
+    Input:
+        > geocoder              geocoder obtained with `build_geocoder()`
+        > address               e.g. "Via delle Scienze 206, Udine"
+        > fallback_provider     geopy provider used if the address is not found offline (e.g. "arcgis"), None to disable
+
+    Output:
+        > tuple (lat, lon), or None if the address was not found
+    """
+    key = " ".join(address.lower().split())
+
+    # cached result
+    if key in geocoder["cache"]:
+        geocoder["cache"].move_to_end(key)
+        return geocoder["cache"][key]
+
+    # offline lookup
+    coords = _lookup(geocoder, *parse_address(address))
+
+    # online fallback, if requested
+    if coords is None and fallback_provider is not None:
+        geom = gpd.tools.geocode(address, provider=fallback_provider).geometry.values[0]
+        if geom is not None and not geom.is_empty:
+            coords = (geom.y, geom.x)
+
+    # only the addresses found are cached, so that a later call can still use the fallback
+    if coords is not None:
+        _add_to_cache(geocoder, key, coords)
+
+    return coords
+
+
+def geocode(geocoder, addresses, fallback_provider=None):
+    """
+    Input:
+        > geocoder              geocoder obtained with `build_geocoder()`
+        > addresses             address or list of addresses
+        > fallback_provider     geopy provider used if an address is not found offline (e.g. "arcgis")
+
+    Output:
+        > geodataframe (EPSG:4326) with columns 'geometry' and 'address', like `gpd.tools.geocode()`
+          (empty geometry for the addresses that were not found)
+    """
+    if isinstance(addresses, str):
+        addresses = [addresses]
+
+    geoms = []
+    for address in addresses:
+        coords = geocode_address(geocoder, address, fallback_provider)
+        geoms.append(Point(coords[1], coords[0]) if coords is not None else Point())
+
+    # written once for the whole batch, and only if there are new results
+    save_geocoder_cache(geocoder)
+
+    return gpd.GeoDataFrame({"address": addresses}, geometry=geoms, crs=4326)
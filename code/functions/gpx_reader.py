@@ -0,0 +1,166 @@
+# Import Libraries
+import os
+from array import array
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+
+# default folder of the Strava activities (relative to the 'code' folder, like the other data paths)
+STRAVA_PATH = "../data/strava"
+
+# value of NaT in the int64 buffer of the times (nanoseconds since the epoch)
+NAT_NS = np.iinfo(np.int64).min
+
+
+def _local_name(tag):
+    """
+    returns the name of an xml tag without its namespace (e.g. '{http://...}trkpt' -> 'trkpt')
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_time(text):
+    """
+    returns the time of a gpx point as nanoseconds since the epoch (UTC), NAT_NS if missing
+    """
+    if text is None or not text.strip():
+        return NAT_NS
+    text = text.strip()
+    if text.endswith("Z"):
+        return int(np.datetime64(text[:-1], "ns").astype(np.int64))
+    # other offsets (or naive times, taken as UTC)
+    return pd.Timestamp(text).value
+
+
+def read_gpx_arrays(path):
+    """
+    Input:
+        > path      local path of the gpx file
+
+    Output:
+        > list with one dictionary for each segment of each track, with
+            - "track_idx", "segment_idx"    indexes of the segment (like `gpx_file.tracks[i].segments[j]`)
+            - "longitude", "latitude"       float arrays
+            - "altitude"                    float array (nan if missing)
+            - "time"                        array of naive datetimes (UTC), NaT if missing
+
+    Note: the file is streamed with iterparse, every point is parsed into typed buffers
+    (float64 coordinates and altitudes, int64 nanoseconds for the times) and then discarded,
+    so no object is kept for the single points and the arrays are not copied at the end
+    """
+    segments = []
+    track_idx = -1
+    segment_idx = -1
+    lons, lats, eles, times = array("d"), array("d"), array("d"), array("q")
+    ele, time = np.nan, NAT_NS
+
+    with open(path, "rb") as gpx_file:
+        for event, elem in ET.iterparse(gpx_file, events=("start", "end")):
+            tag = _local_name(elem.tag)
+
+            if event == "start":
+                if tag == "trk":
+                    track_idx += 1
+                    segment_idx = -1
+                elif tag == "trkseg":
+                    segment_idx += 1
+                    lons, lats, eles, times = array("d"), array("d"), array("d"), array("q")
+                elif tag == "trkpt":
+                    ele, time = np.nan, NAT_NS
+                continue
+
+            if tag == "ele":
+                try:
+                    ele = float(elem.text)
+                except (TypeError, ValueError):
+                    ele = np.nan
+            elif tag == "time":
+                time = _parse_time(elem.text)
+            elif tag == "trkpt":
+                lons.append(float(elem.get("lon")))
+                lats.append(float(elem.get("lat")))
+                eles.append(ele)
+                times.append(time)
+                elem.clear()
+            elif tag == "trkseg":
+                segments.append({
+                    "track_idx": track_idx,
+                    "segment_idx": segment_idx,
+                    "longitude": np.frombuffer(lons, dtype=np.float64),
+                    "latitude": np.frombuffer(lats, dtype=np.float64),
+                    "altitude": np.frombuffer(eles, dtype=np.float64),
+                    "time": np.frombuffer(times, dtype=np.int64).view("datetime64[ns]")
+                })
+                elem.clear()
+            elif tag == "trk":
+                elem.clear()
+
+    return segments
+
+
+def geodf_from_arrays(segment):
+    """
+    Input:
+        > segment   dictionary of arrays, see `read_gpx_arrays()`
+
+    Output:
+        > geodataframe of the segment, like `create_geodf_from_segment()`
+          (columns 'longitude', 'latitude', 'altitude', 'time', 'geometry')
+    """
+    gpx_dataframe = pd.DataFrame({name: segment[name] for name in ["longitude", "latitude", "altitude", "time"]})
+
+    geo_df = gpd.GeoDataFrame(
+        gpx_dataframe,
+        crs = 4326,
+        geometry = gpd.points_from_xy(segment["longitude"], segment["latitude"], segment["altitude"])
+        )
+
+    return geo_df
+
+
+def read_gpx_geodf(path, track_idx=0, segment_idx=0):
+    """
+    Input:
+        > path          local path of the gpx file
+        > track_idx     index of track (first layer)
+        > segment_idx   index of segment (second layer)
+
+    Output:
+        > geodataframe with the points of the required segment (see `geodf_from_arrays()`)
+    """
+    for segment in read_gpx_arrays(path):
+        if segment["track_idx"] == track_idx and segment["segment_idx"] == segment_idx:
+            return geodf_from_arrays(segment)
+    raise IndexError("Segment " + str(segment_idx) + " of track " + str(track_idx) + " not found in " + str(path))
+
+
+def read_gpx_folder(folder=STRAVA_PATH, n_workers=None):
+    """
+    Input:
+        > folder        folder with the gpx files (e.g. the Strava activities)
+        > n_workers     number of processes (default: number of cpus), 1 to read the files in this process
+
+    Output:
+        > dictionary file name (without extension) -> geodataframe of the first segment of the first track
+          (see `read_gpx_geodf()`), files without points are skipped
+
+    The files are parsed in parallel, the workers send back only the numpy arrays of the points
+    """
+    names = sorted(name for name in os.listdir(folder) if name.lower().endswith(".gpx"))
+    paths = [os.path.join(folder, name) for name in names]
+
+    if n_workers == 1 or len(paths) <= 1:
+        all_segments = [read_gpx_arrays(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            all_segments = list(executor.map(read_gpx_arrays, paths, chunksize=max(1, len(paths) // (4 * (n_workers or os.cpu_count() or 1)))))
+
+    geodfs = {}
+    for name, segments in zip(names, all_segments):
+        if len(segments) > 0 and len(segments[0]["longitude"]) > 0:
+            geodfs[os.path.splitext(name)[0]] = geodf_from_arrays(segments[0])
+
+    return geodfs
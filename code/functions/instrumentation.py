@@ -0,0 +1,215 @@
+# Import Libraries
+import os
+import io
+import json
+import time
+import pstats
+import threading
+import cProfile
+import functools
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+
+
+# environment variable with the path of a json lines file: if set, the spans are written there
+# (e.g. to scrape them in production) without calling `configure()`
+SPANS_PATH_VARIABLE = "UDINE_SPANS_PATH"
+
+# number of functions kept in the cProfile summary of a span
+PROFILE_TOP_FUNCTIONS = 25
+
+# current configuration (see `configure()`)
+_CONFIG = {"sinks": [], "trace_memory": False, "profile": False}
+
+# stack of the open spans (a tuple), one for each thread and asyncio task: the spans of concurrent stages
+# (see `scheduler.py`) are nested under the span that was open when the stage was started
+_STACK = contextvars.ContextVar("udine_spans", default=())
+
+
+class JsonLinesSink:
+    """
+    sink that appends each span, as a json object, to a json lines file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()                                        # spans of concurrent stages
+
+    def __call__(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="UTF-8") as spans_file:
+                spans_file.write(line)
+
+
+class ListSink:
+    """
+    sink that keeps the spans in a list (attribute 'records'), e.g. to inspect them in a notebook
+    """
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+
+def print_sink(record):
+    """
+    sink that prints a line for each span, indented by depth
+    """
+    line = "  " * record["depth"] + "[span] " + record["name"] + ": " + str(round(record["wall_time"], 3)) + " s wall, " + str(round(record["cpu_time"], 3)) + " s cpu"
+    if record["memory_peak_mb"] is not None:
+        line += ", " + str(round(record["memory_peak_mb"], 2)) + " MB peak"
+    print(line)
+
+
+def configure(sinks=None, trace_memory=False, profile=False):
+    """
+    Input:
+        > sinks             list of callables, each one receives every closed span (a dictionary),
+                            e.g. [JsonLinesSink("spans.jsonl")], [print_sink] or [ListSink()];
+                            an empty list (or None) disables the instrumentation (default)
+        > trace_memory      boolean value, if set to True the peak of the memory allocated by python
+                            during each span is traced (with tracemalloc, slower); the peak of tracemalloc
+                            is process-wide, so the stages of `run_stages()` then run one after another
+        > profile           boolean value, if set to True the outermost spans are profiled with cProfile
+                            and their records contain the summary of the most expensive functions
+
+    Note: by default there is no sink, so the spans cost almost nothing and print nothing
+    """
+    _CONFIG["sinks"] = list(sinks) if sinks else []
+    _CONFIG["trace_memory"] = trace_memory
+    _CONFIG["profile"] = profile
+
+
+def is_enabled():
+    """
+    returns True if the spans are recorded (i.e. at least a sink is configured)
+    """
+    return len(_CONFIG["sinks"]) > 0
+
+
+def is_tracing_memory():
+    """
+    returns True if the spans trace the memory peak (see `configure()`)
+    """
+    return is_enabled() and _CONFIG["trace_memory"]
+
+
+def start_span(name, **attributes):
+    """
+    Input:
+        > name          name of the stage (e.g. "extract")
+        > attributes    additional information stored in the record (e.g. category="supermarket")
+
+    Output:
+        > open span, to be closed with `end_span()` (None if the instrumentation is disabled)
+
+    Note: `span()` is the context manager version, prefer it when the stage is a single block
+    """
+    if not is_enabled():
+        return None
+
+    stack = _STACK.get()
+    record = {
+        "name": name,
+        "path": "/".join([s["record"]["name"] for s in stack] + [name]),
+        "depth": len(stack),
+        "start": time.time(),
+        "attributes": attributes
+    }
+    open_span = {"record": record, "wall": time.perf_counter(), "cpu": time.process_time(), "profiler": None}
+
+    if _CONFIG["trace_memory"]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            open_span["started_tracing"] = True
+        current, peak = tracemalloc.get_traced_memory()
+        if stack and "memory_peak" in stack[-1]:
+            stack[-1]["memory_peak"] = max(stack[-1]["memory_peak"], peak)          # keep the peak of the parent
+        tracemalloc.reset_peak()
+        open_span["memory_start"] = current
+        open_span["memory_peak"] = current
+
+    if _CONFIG["profile"] and len(stack) == 0:
+        open_span["profiler"] = cProfile.Profile()
+        open_span["profiler"].enable()
+
+    _STACK.set(stack + (open_span,))
+    return open_span
+
+
+def end_span(open_span):
+    """
+    closes the given span (see `start_span()`), sends its record to the sinks and returns it
+    """
+    if open_span is None:
+        return None
+
+    record = open_span["record"]
+    record["wall_time"] = time.perf_counter() - open_span["wall"]
+    record["cpu_time"] = time.process_time() - open_span["cpu"]
+    record["memory_peak_mb"] = None
+
+    if open_span["profiler"] is not None:
+        open_span["profiler"].disable()
+        summary = io.StringIO()
+        pstats.Stats(open_span["profiler"], stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        record["profile"] = summary.getvalue()
+
+    # the spans are closed in order, remove this one (and any span left open inside it)
+    stack = _STACK.get()
+    if any(s is open_span for s in stack):
+        stack = stack[:[s is open_span for s in stack].index(True)]
+        _STACK.set(stack)
+
+    if "memory_start" in open_span and tracemalloc.is_tracing():
+        peak = max(open_span["memory_peak"], tracemalloc.get_traced_memory()[1])
+        record["memory_peak_mb"] = (peak - open_span["memory_start"]) / 2**20
+        if stack and "memory_peak" in stack[-1]:
+            stack[-1]["memory_peak"] = max(stack[-1]["memory_peak"], peak)
+        if open_span.get("started_tracing"):
+            tracemalloc.stop()
+
+    for sink in _CONFIG["sinks"]:
+        sink(record)
+
+    return record
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    context manager that records wall time, cpu time and (optionally) memory peak of the enclosed stage,
+    e.g.
+        with span("extract"):
+            ...
+
+    see `start_span()` and `configure()`
+    """
+    open_span = start_span(name, **attributes)
+    try:
+        yield open_span
+    finally:
+        end_span(open_span)
+
+
+def traced(name):
+    """
+    decorator that records every call of the decorated function as a span with the given name, e.g.
+        @traced("create_folium_map")
+        def create_folium_map(...):
+            ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# spans written to a json lines file, if requested through the environment
+if os.environ.get(SPANS_PATH_VARIABLE):
+    configure([JsonLinesSink(os.environ[SPANS_PATH_VARIABLE])])
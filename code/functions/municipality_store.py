@@ -0,0 +1,200 @@
+# Import Libraries
+import os
+import re
+import json
+import unicodedata
+import pandas as pd
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyproj import CRS
+
+
+# default path of the ISTAT municipalities (relative to the 'code' folder, like the other data paths)
+MUNICIPALITIES_PATH = "../data/Com01012021_g/Com01012021_g_WGS84.shp"
+
+# default path of the house costs of the municipalities (relative to the 'code' folder, like the other data paths)
+HOUSE_COST_PATH = "../data/udine_municipalities_house_cost.csv"
+
+# default path of the GeoParquet store of the municipalities
+STORE_PATH = "../data/cache/municipalities.parquet"
+
+# province code of Udine in the ISTAT data (column COD_PROV)
+UDINE_PROVINCE_CODE = 30
+
+# crs of the geometries kept in the store: column name -> epsg
+GEOMETRY_COLUMNS = {"geometry": 4326, "geometry_32632": 32632}
+
+# key of the parquet metadata with the size and modification time of the source files
+SOURCES_METADATA_KEY = b"municipality_store_sources"
+
+# municipalities already loaded in this session: (store path, parameters) -> geodataframe
+_LOADED = {}
+
+
+def normalize_name(name):
+    """
+    returns the name of a municipality without accents, case and punctuation (e.g. "Forni di Sopra" -> "forni di sopra"),
+    used to join sources that write the names differently
+    """
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join([c for c in name if not unicodedata.combining(c)])
+    return re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+
+
+def as_crs(geodf, epsg):
+    """
+    returns the geodataframe in the given crs, without any reprojection (nor copy) if it is already there
+    """
+    if geodf.crs is not None and geodf.crs.to_epsg() == epsg:
+        return geodf
+    return geodf.to_crs(epsg=epsg)
+
+
+def _sources_stats(paths):
+    """
+    returns size and modification time of the given files (the ones of the whole shapefile, for a .shp)
+    """
+    files = []
+    for path in paths:
+        if path.endswith(".shp"):
+            files += [path[:-4] + ext for ext in [".shp", ".dbf", ".shx", ".prj"] if os.path.exists(path[:-4] + ext)]
+        else:
+            files.append(path)
+    return [[os.path.abspath(f), os.path.getsize(f), os.path.getmtime(f)] for f in files]
+
+
+def build_municipality_store(municipalities_path=MUNICIPALITIES_PATH, house_cost_path=HOUSE_COST_PATH, store_path=STORE_PATH,
+                             house_cost_province=UDINE_PROVINCE_CODE):
+    """
+    Input:
+        > municipalities_path   path of the shapefile with the ISTAT municipalities
+        > house_cost_path       path of the csv with the house costs (columns 'Municipality', 'Sale', 'Rent')
+        > store_path            path of the GeoParquet file to write
+        > house_cost_province   province code of the municipalities of the csv (names are unique only within a province)
+
+    Output:
+        > path of the store, a GeoParquet file with
+            - the attributes of the shapefile, plus 'name_key' (see `normalize_name()`)
+            - the house costs joined by name ('Municipality', 'Sale', 'Rent', missing outside the csv)
+            - the geometry in EPSG:4326 ('geometry') and in EPSG:32632 ('geometry_32632'), both as WKB
+          sorted by province, with one row group for each province (so a province is read without the others)
+    """
+    print("> Building the Municipality Store")
+    municipalities = gpd.read_file(municipalities_path).to_crs(epsg=4326)
+    municipalities["name_key"] = municipalities["COMUNE"].map(normalize_name)
+
+    # join the house costs by province and normalized name
+    house_cost = pd.read_csv(house_cost_path)
+    house_cost["name_key"] = house_cost["Municipality"].map(normalize_name)
+    house_cost["COD_PROV"] = house_cost_province
+    missing = sorted(set(house_cost["name_key"]) - set(municipalities.loc[municipalities["COD_PROV"] == house_cost_province, "name_key"]))
+    if missing:
+        print("WARNING: house costs without a municipality:", ", ".join(missing))
+    municipalities = municipalities.merge(house_cost, on=["COD_PROV", "name_key"], how="left")
+    municipalities = municipalities.sort_values(["COD_PROV", "name_key"]).reset_index(drop=True)
+
+    # both geometries as WKB, so that no reprojection is needed when reading
+    df = pd.DataFrame(municipalities.drop(columns="geometry"))
+    for column, epsg in GEOMETRY_COLUMNS.items():
+        df[column] = as_crs(municipalities, epsg).geometry.to_wkb().values
+
+    # GeoParquet metadata, the file can also be read with `gpd.read_parquet()`
+    geo_metadata = {
+        "primary_column": "geometry",
+        "columns": {
+            column: {"crs": CRS.from_epsg(epsg).to_wkt(), "encoding": "WKB"} for column, epsg in GEOMETRY_COLUMNS.items()
+        },
+        "version": "0.1.0",
+        "schema_version": "0.1.0",
+        "creator": {"library": "geopandas", "version": gpd.__version__}
+    }
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"geo"] = json.dumps(geo_metadata).encode("utf-8")
+    metadata[SOURCES_METADATA_KEY] = json.dumps(_sources_stats([municipalities_path, house_cost_path])).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    # one row group for each province (the rows are sorted by province)
+    os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+    provinces = df["COD_PROV"].values
+    writer = pq.ParquetWriter(store_path + ".tmp", table.schema)
+    try:
+        offset = 0
+        for length in pd.Series(provinces).groupby(provinces, sort=False).size().values:
+            writer.write_table(table.slice(offset, length))
+            offset += length
+    finally:
+        writer.close()
+    os.replace(store_path + ".tmp", store_path)
+
+    return store_path
+
+
+def get_municipality_store(municipalities_path=MUNICIPALITIES_PATH, house_cost_path=HOUSE_COST_PATH, store_path=STORE_PATH):
+    """
+    returns the path of the store, building it only if it is missing or older than its sources
+    (see `build_municipality_store()`)
+    """
+    if os.path.exists(store_path):
+        metadata = pq.read_schema(store_path).metadata or {}
+        if metadata.get(SOURCES_METADATA_KEY) == json.dumps(_sources_stats([municipalities_path, house_cost_path])).encode("utf-8"):
+            return store_path
+    return build_municipality_store(municipalities_path, house_cost_path, store_path)
+
+
+def load_municipalities(province_code=UDINE_PROVINCE_CODE, columns=None, crs=4326, names=None, house_cost_only=False,
+                        municipalities_path=MUNICIPALITIES_PATH, house_cost_path=HOUSE_COST_PATH, store_path=STORE_PATH):
+    """
+    Input:
+        > province_code         code of the province to read (COD_PROV), None to read the whole country
+        > columns               list of attribute columns to read (e.g. ["Municipality", "Sale"]), None to read all of them
+        > crs                   4326 or 32632, the crs of the returned geometry (no reprojection: both are stored),
+                                None to return a dataframe without geometry
+        > names                 list of names of municipalities to keep (e.g. ["Udine"]), None to keep all of them
+        > house_cost_only       boolean value, if set to True only the municipalities with house costs are returned
+                                (like the merge of the R notebook)
+        > municipalities_path   path of the shapefile with the ISTAT municipalities (source of the store)
+        > house_cost_path       path of the csv with the house costs (source of the store)
+        > store_path            path of the GeoParquet store, built the first time (see `build_municipality_store()`)
+
+    Output:
+        > geodataframe with the required municipalities and columns
+
+    Note: only the row groups of the province and the required columns are read, and only the WKB of the
+    required crs is decoded; the result is kept in memory for the following calls of the session
+    """
+    store_path = get_municipality_store(municipalities_path, house_cost_path, store_path)
+    key = (os.path.abspath(store_path), os.path.getmtime(store_path), province_code, tuple(columns) if columns is not None else None,
+           crs, tuple(names) if names is not None else None, house_cost_only)
+
+    if key not in _LOADED:
+
+        geometry_column = {4326: "geometry", 32632: "geometry_32632", None: None}[crs]
+
+        # columns and row groups to read
+        if columns is not None:
+            read_columns = list(columns) + [c for c in ["Municipality", geometry_column] if c is not None and c not in columns]
+        else:
+            read_columns = [c for c in pq.read_schema(store_path).names if c not in GEOMETRY_COLUMNS or c == geometry_column]
+        filters = []
+        if province_code is not None:
+            filters.append(("COD_PROV", "=", province_code))
+        if names is not None:
+            filters.append(("name_key", "in", set([normalize_name(n) for n in names])))
+
+        df = pq.read_table(store_path, columns=read_columns, filters=filters if filters else None).to_pandas()
+
+        if house_cost_only:
+            df = df[df["Municipality"].notnull()]
+        if columns is not None and "Municipality" not in columns:
+            df = df.drop(columns="Municipality")
+        df = df.reset_index(drop=True)
+
+        if geometry_column is None:
+            _LOADED[key] = df
+        else:
+            geometry = gpd.GeoSeries.from_wkb(df.pop(geometry_column).values, crs=crs)
+            _LOADED[key] = gpd.GeoDataFrame(df, geometry=geometry.values, crs=crs)
+
+    return _LOADED[key].copy()
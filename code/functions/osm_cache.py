@@ -0,0 +1,260 @@
+# Import Libraries
+import os
+import json
+import shutil
+import hashlib
+import geopandas as gpd
+
+
+# counters used to report the effectiveness of the cache
+_CACHE_STATS = {"hits": 0, "misses": 0}
+
+# memo of already computed PBF hashes: (path, size, mtime) -> hash
+_PBF_HASHES = {}
+
+
+def get_pbf_hash(pbf_path, chunk_size=1024*1024):
+    """
+    Input:
+        > pbf_path      path of the .osm.pbf file
+        > chunk_size    number of bytes read at each step
+
+    Output:
+        > sha1 hash (hex string) of the content of the file
+
+    Note: the hash is memoized on (path, size, modification time), so the file is read only once per session
+    """
+    stat = os.stat(pbf_path)
+    memo_key = (os.path.abspath(pbf_path), stat.st_size, stat.st_mtime)
+
+    if memo_key not in _PBF_HASHES:
+        sha1 = hashlib.sha1()
+        with open(pbf_path, "rb") as pbf_file:
+            for chunk in iter(lambda: pbf_file.read(chunk_size), b""):
+                sha1.update(chunk)
+        _PBF_HASHES[memo_key] = sha1.hexdigest()
+
+    return _PBF_HASHES[memo_key]
+
+
+def get_default_cache_dir(pbf_path):
+    """
+    returns the default cache folder, i.e. a 'cache' folder next to the PBF file
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(pbf_path)), "cache")
+
+
+def get_pbf_cache_dir(pbf_path, cache_dir=None):
+    """
+    Input:
+        > pbf_path      path of the .osm.pbf file
+        > cache_dir     root folder of the cache (default: 'cache' folder next to the PBF)
+
+    Output:
+        > folder that stores the cached data of the given PBF
+
+    Note: every PBF content has its own sub-folder. When the content of the file changes,
+    the sub-folders of the old versions of the same file are removed (automatic invalidation)
+    """
+    if cache_dir is None:
+        cache_dir = get_default_cache_dir(pbf_path)
+
+    pbf_name = os.path.basename(pbf_path).split(".")[0]
+    pbf_hash = get_pbf_hash(pbf_path)
+    pbf_dir = os.path.join(cache_dir, pbf_name + "_" + pbf_hash[:16])
+
+    if not os.path.isdir(pbf_dir):
+
+        # invalidate the data obtained from previous versions of the file
+        if os.path.isdir(cache_dir):
+            for folder in os.listdir(cache_dir):
+                if folder.startswith(pbf_name + "_") and folder != os.path.basename(pbf_dir):
+                    shutil.rmtree(os.path.join(cache_dir, folder), ignore_errors=True)
+
+        os.makedirs(pbf_dir, exist_ok=True)
+
+    return pbf_dir
+
+
+def get_layer_key(kind, custom_filter=None, **kwargs):
+    """
+    returns a short string that identifies a layer, given its kind, its custom filter and other parameters
+    """
+    params = {"kind": kind, "custom_filter": custom_filter}
+    params.update(kwargs)
+    params_hash = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return kind + "_" + params_hash[:16]
+
+
+def get_osm_layer_key(osm, kind, custom_filter=None, **kwargs):
+    """
+    returns the key of a layer extracted from the given pyrosm.OSM object,
+    the bounding box of the object (if any) is part of the key
+    """
+    bounding_box = getattr(osm, "bounding_box", None)
+    if bounding_box is not None:
+        kwargs["bounding_box"] = bounding_box
+    return get_layer_key(kind, custom_filter, **kwargs)
+
+
+def _prepare_for_parquet(geodf):
+    """
+    casts the columns with mixed types (not supported by parquet) to string, keeping missing values
+    """
+    geodf = geodf.copy()
+    for col in geodf.columns:
+        if col != geodf.geometry.name and geodf[col].dtype == object:
+            geodf[col] = geodf[col].apply(lambda x: x if x is None or isinstance(x, str) else str(x))
+    return geodf
+
+
+def _write_layer(geodf, path):
+    """
+    writes a geodataframe (or None, if the layer is empty) in the cache
+
+    Note: the file is written under a temporary name and then renamed, so a run interrupted
+    while writing never leaves a truncated layer that the next run would read as a hit
+    """
+    final_path = path + (".empty" if geodf is None else ".parquet")
+    tmp_path = final_path + "." + str(os.getpid()) + ".tmp"
+    if geodf is None:
+        open(tmp_path, "w").close()
+    else:
+        _prepare_for_parquet(geodf).to_parquet(tmp_path)
+    os.replace(tmp_path, final_path)
+
+
+def _read_layer(path):
+    """
+    reads a layer from the cache, returns False if the layer is not present
+    """
+    if os.path.exists(path + ".parquet"):
+        return gpd.read_parquet(path + ".parquet")
+    if os.path.exists(path + ".empty"):
+        return None
+    return False
+
+
+def _extract_layer(osm, kind, custom_filter=None, **kwargs):
+    """
+    extracts the required layer from the pyrosm.OSM object
+    """
+    if kind == "buildings":
+        return osm.get_buildings(custom_filter=custom_filter)
+    elif kind == "network":
+        return osm.get_network(network_type=kwargs.get("network_type", "walking"), nodes=kwargs.get("nodes", False))
+    elif kind == "pois":
+        return osm.get_pois(custom_filter=custom_filter)
+    else:
+        raise ValueError("Unknown layer kind: " + str(kind))
+
+
+def read_cached_layer(osm, kind, custom_filter=None, cache_dir=None, **kwargs):
+    """
+    Input:
+        > osm               pyrosm.OSM object
+        > kind              kind of layer, e.g. 'buildings' | 'network' | 'pois'
+        > custom_filter     custom filter of the layer
+        > cache_dir         root folder of the cache (default: 'cache' folder next to the PBF)
+        > **kwargs          other parameters of the layer
+
+    Output:
+        > the cached layer (None for empty layers), or False if the layer is not in the cache
+
+    Note: hits and misses are counted in the cache statistics
+    """
+    pbf_dir = get_pbf_cache_dir(osm.filepath, cache_dir)
+    layer_path = os.path.join(pbf_dir, get_osm_layer_key(osm, kind, custom_filter, **kwargs))
+
+    if kwargs.get("nodes", False):
+        cached = (_read_layer(layer_path + "_nodes"), _read_layer(layer_path + "_edges"))
+        if cached[0] is False or cached[1] is False:
+            cached = False
+    else:
+        cached = _read_layer(layer_path)
+
+    if cached is False:
+        _CACHE_STATS["misses"] += 1
+    else:
+        _CACHE_STATS["hits"] += 1
+
+    return cached
+
+
+def is_layer_cached(osm, kind, custom_filter=None, cache_dir=None, **kwargs):
+    """
+    returns True if the layer is in the cache (see `read_cached_layer()`), without reading it
+    and without counting it in the cache statistics
+    """
+    layer_path = os.path.join(get_pbf_cache_dir(osm.filepath, cache_dir), get_osm_layer_key(osm, kind, custom_filter, **kwargs))
+    paths = [layer_path + "_nodes", layer_path + "_edges"] if kwargs.get("nodes", False) else [layer_path]
+    return all(os.path.exists(path + ".parquet") or os.path.exists(path + ".empty") for path in paths)
+
+
+def write_cached_layer(layer, osm, kind, custom_filter=None, cache_dir=None, **kwargs):
+    """
+    Input:
+        > layer             geodataframe to store (tuple of nodes and edges for networks with nodes=True)
+        > osm               pyrosm.OSM object the layer comes from
+        > kind, custom_filter, cache_dir, **kwargs      see `read_cached_layer()`
+    """
+    pbf_dir = get_pbf_cache_dir(osm.filepath, cache_dir)
+    layer_path = os.path.join(pbf_dir, get_osm_layer_key(osm, kind, custom_filter, **kwargs))
+
+    if kwargs.get("nodes", False):
+        _write_layer(layer[0], layer_path + "_nodes")
+        _write_layer(layer[1], layer_path + "_edges")
+    else:
+        _write_layer(layer, layer_path)
+
+
+def get_cached_layer(osm, kind, custom_filter=None, cache_dir=None, **kwargs):
+    """
+    Input:
+        > osm               pyrosm.OSM object
+        > kind              kind of layer, in 'buildings' | 'network' | 'pois'
+        > custom_filter     custom filter passed to pyrosm (buildings and pois only)
+        > cache_dir         root folder of the cache (default: 'cache' folder next to the PBF)
+        > **kwargs          other parameters of the layer, e.g. network_type="driving" or nodes=True for networks
+
+    Output:
+        > geodataframe with requested data (tuple of nodes and edges geodataframes for networks with nodes=True)
+
+    The layer is read from the cache if present, otherwise it is extracted from the PBF and stored in the cache.
+    The cache is keyed by the content of the PBF, so it is automatically invalidated when the file changes.
+    """
+    cached = read_cached_layer(osm, kind, custom_filter, cache_dir, **kwargs)
+    if cached is not False:
+        return cached
+
+    # extract the layer and store it
+    layer = _extract_layer(osm, kind, custom_filter, **kwargs)
+    write_cached_layer(layer, osm, kind, custom_filter, cache_dir, **kwargs)
+
+    return layer
+
+
+def get_cache_stats():
+    """
+    returns a dictionary with the number of hits, misses and the hit ratio of the layer cache
+    """
+    total = _CACHE_STATS["hits"] + _CACHE_STATS["misses"]
+    stats = dict(_CACHE_STATS)
+    stats["hit_ratio"] = round(_CACHE_STATS["hits"] / total, 2) if total > 0 else 0.0
+    return stats
+
+
+def print_cache_stats():
+    """
+    prints info about hits and misses of the layer cache
+    """
+    stats = get_cache_stats()
+    print("> Layer Cache:", stats["hits"], "hits,", stats["misses"], "misses (hit ratio:", str(stats["hit_ratio"]) + ")")
+
+
+def reset_cache_stats():
+    """
+    resets the counters of the layer cache
+    """
+    _CACHE_STATS["hits"] = 0
+    _CACHE_STATS["misses"] = 0
@@ -0,0 +1,223 @@
+# Import Libraries
+import numpy as np
+import pandas as pd
+import pyrosm
+from pyrosm.config import Conf
+from .osm_cache import read_cached_layer, write_cached_layer, is_layer_cached
+from .municipality_store import as_crs
+from .place_categories import POI_FILTERS
+
+
+# exclusion filters of the networks, taken from the installed pyrosm (the ones of `osm.get_network()`):
+# a street is removed from the network if one of its tags has one of the listed values ("all" keeps every street)
+NETWORK_FILTERS = {
+    "all": {},
+    "walking": Conf.network_filters.walking,
+    "driving": Conf.network_filters.driving
+}
+
+# layers that can be requested to `extract_layers()`, besides the places in POI_FILTERS
+NETWORK_LAYERS = ["all", "driving", "walking", "graph"]
+
+# pyrosm.OSM objects limited to a bounding box: (PBF path, bounding box) -> pyrosm.OSM
+_BOUNDED_OSM = {}
+
+
+def get_bounded_osm(osm, area_geodf):
+    """
+    Input:
+        > osm           pyrosm.OSM object
+        > area_geodf    geodataframe with the area of interest
+
+    Output:
+        > pyrosm.OSM object on the same PBF, limited to the bounding box of the area
+
+    Note: pyrosm filters the data by bounding box while reading it, so the features
+    outside of the area are never materialized
+    """
+    bounding_box = [float(b) for b in as_crs(area_geodf, 4326).total_bounds]
+    key = (osm.filepath, tuple(bounding_box))
+    if key not in _BOUNDED_OSM:
+        _BOUNDED_OSM[key] = pyrosm.OSM(osm.filepath, bounding_box=bounding_box)
+    return _BOUNDED_OSM[key]
+
+
+def clip_to_area(geodf, area):
+    """
+    Input:
+        > geodf     geodataframe to clip
+        > area      shapely polygon (same crs of geodf)
+
+    Output:
+        > geodataframe with the features of geodf clipped to the area (like `gpd.clip()`)
+
+    Note: the spatial index of geodf (prepared predicates) is used to keep the features that
+    are completely inside the area as they are, only the ones crossing the border are intersected
+    """
+    if geodf is None or len(geodf) == 0:
+        return geodf
+
+    idx_intersects = geodf.sindex.query(area, predicate="intersects")
+    idx_inside = geodf.sindex.query(area, predicate="contains")
+    idx_border = np.setdiff1d(idx_intersects, idx_inside)
+
+    inside = geodf.iloc[np.sort(idx_inside)]
+    border = geodf.iloc[np.sort(idx_border)].copy()
+    border["geometry"] = border.geometry.intersection(area)
+    border = border.loc[~border.geometry.is_empty]
+
+    return pd.concat([inside, border]).sort_index()
+
+
+def filter_network(edges, network_type):
+    """
+    Input:
+        > edges             geodataframe of streets extracted with network_type="all"
+        > network_type      string in 'all' | 'walking' | 'driving'
+
+    Output:
+        > geodataframe with the streets of the required network
+    """
+    keep = pd.Series(True, index=edges.index)
+    for tag, values in NETWORK_FILTERS[network_type].items():
+        if tag in edges.columns:
+            keep &= ~edges[tag].isin(values)
+    return edges.loc[keep]
+
+
+def build_features_filter(places):
+    """
+    Input:
+        > places    list of places (keys of POI_FILTERS)
+
+    Output:
+        > pyrosm custom filter that keeps buildings and every requested place at once
+    """
+    custom_filter = {"building": True}
+    for place in places:
+        primary_filter, secondary_filter = POI_FILTERS[place]
+        values = custom_filter.get(primary_filter, [])
+        custom_filter[primary_filter] = values + [v for v in secondary_filter if v not in values]
+    return custom_filter
+
+
+def _extract_features(osm, places, with_buildings):
+    """
+    extracts buildings and places with a single pass over the ways/nodes/relations of the PBF
+    """
+    custom_filter = build_features_filter(places)
+    if not with_buildings:
+        del custom_filter["building"]
+
+    features = osm.get_data_by_custom_filter(
+        custom_filter=custom_filter,
+        filter_type="keep",
+        tags_as_columns=list(custom_filter.keys()) + ["name"]
+        )
+
+    layers = {}
+
+    if with_buildings:
+        if features is None:
+            layers["buildings"] = None
+        else:
+            is_building = features["building"].notnull() & (features["osm_type"] != "node")
+            layers["buildings"] = features.loc[is_building].reset_index(drop=True)
+
+    for place in places:
+        primary_filter, secondary_filter = POI_FILTERS[place]
+        if features is None or primary_filter not in features.columns:
+            layers[place] = None
+        else:
+            layers[place] = features.loc[features[primary_filter].isin(secondary_filter)].reset_index(drop=True)
+
+    return layers
+
+
+def _extract_networks(osm, network_layers):
+    """
+    extracts all the requested networks with a single pass over the streets of the PBF
+    """
+    nodes, edges = osm.get_network(network_type="all", nodes=True)
+
+    layers = {}
+    for layer in network_layers:
+        if layer == "graph":
+            # nodes and edges of the walking network, ready for `osm.to_graph()`
+            walking_edges = filter_network(edges, "walking")
+            node_ids = pd.concat([walking_edges["u"], walking_edges["v"]]).unique()
+            layers["graph"] = (nodes.loc[nodes["id"].isin(node_ids)], walking_edges)
+        else:
+            layers[layer] = filter_network(edges, layer)
+
+    return layers
+
+
+def _layer_cache_params(layer):
+    """
+    returns the parameters that identify a layer of `extract_layers()` in the layer cache
+    """
+    network_filter = NETWORK_FILTERS.get("walking" if layer == "graph" else layer)
+    return {"layer": layer, "nodes": (layer == "graph"), "place_filter": POI_FILTERS.get(layer), "network_filter": network_filter}
+
+
+def are_layers_cached(osm, layers):
+    """
+    returns True if all the given layers of `extract_layers()` are in the layer cache (nothing is read)
+    """
+    return all(is_layer_cached(osm, "single_pass", **_layer_cache_params(layer)) for layer in layers)
+
+
+def extract_layers(osm, layers, use_cache=True):
+    """
+    Input:
+        > osm           pyrosm.OSM object
+        > layers        list of layers required by the run, possible values:
+                            - "buildings"
+                            - "all"         all the streets
+                            - "driving"     streets of the driving network
+                            - "walking"     streets of the walking network
+                            - "graph"       tuple (nodes, edges) of the walking network, for `osm.to_graph()`
+                            - any place in POI_FILTERS (e.g. "supermarket", see `place_categories.py`)
+        > use_cache     boolean value, if set to True the layers are read from (and stored in) the layer cache
+
+    Output:
+        > dictionary layer -> geodataframe (None if no data was found)
+
+    The PBF is decoded once by pyrosm. All the networks are then obtained from a single extraction
+    of the full street network, and buildings and places from a single extraction with a custom filter
+    that merges all of them, instead of scanning the data once per layer.
+    """
+    for layer in layers:
+        if layer not in NETWORK_LAYERS and layer not in POI_FILTERS and layer != "buildings":
+            raise ValueError("Unknown layer: " + str(layer))
+
+    result = {}
+    missing = []
+
+    # look for the layers in the cache
+    for layer in layers:
+        if use_cache:
+            cached = read_cached_layer(osm, "single_pass", **_layer_cache_params(layer))
+            if cached is not False:
+                result[layer] = cached
+                continue
+        missing.append(layer)
+
+    # extract the missing layers, one pass for the networks and one for the other features
+    missing_networks = [layer for layer in missing if layer in NETWORK_LAYERS]
+    missing_features = [layer for layer in missing if layer not in NETWORK_LAYERS]
+
+    if missing_networks:
+        result.update(_extract_networks(osm, missing_networks))
+
+    if missing_features:
+        places = [layer for layer in missing_features if layer != "buildings"]
+        result.update(_extract_features(osm, places, "buildings" in missing_features))
+
+    # store the new layers
+    if use_cache:
+        for layer in missing:
+            write_cached_layer(result[layer], osm, "single_pass", **_layer_cache_params(layer))
+
+    return result
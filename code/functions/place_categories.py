@@ -0,0 +1,137 @@
+# Import Libraries
+import copy
+
+
+# by inspecting the results, we find the list of geometries to be kept
+# (those corresponding to real university locations)
+UNI_NAMES = [
+    "Dipartimento di Scienze Giuridiche",
+    "Università degli Studi di Udine - Facoltà di Medicina e Chirurgia - Corsi di Laurea Area Sanitaria",
+    "Università degli Studi di Udine - Facoltà di Scienze della Formazione",
+    "Università degli Studi di Udine - Dipartimento di Area medica",
+    "Università degli Studi di Udine - Polo Scientifico dei Rizzi"
+]
+
+# hospitals to be kept
+HOSPITALS_NAMES = [
+    'Pronto Soccorso Udine',
+    'Policlinico Città di Udine Polo 1',
+    'Policlinico Città di Udine Polo 2',
+    'Ospedale Civile "Santa Maria della Misericordia"'
+]
+
+# bus stations to be kept
+BUS_STATION_NAMES = [
+    'Autostazione di Udine',
+    'Terminal Studenti'
+]
+
+# places that can be requested in `plot_udine_map()`, in the order they are plotted: place -> category, i.e. a dictionary with
+#   - "filter"          (primary filter, list of values of the secondary filter) of the OSM tags
+#   - "names"           list of names of the locations to keep (None to keep all of them)
+#   - "points"          boolean value, if set to True the polygons are replaced by their representative points
+#   - "style"           keyword arguments of `GeoDataFrame.plot()` for the locations
+#   - "polygon_style"   keyword arguments of `GeoDataFrame.plot()` for the polygons of the locations (None to skip them)
+#   - "output_key"      key of the information about the place in the dictionary returned by `plot_udine_map()`
+#   - "label"           name of the place in the progress messages
+PLACE_CATEGORIES = {
+    "university": {
+        "filter": ("amenity", ["university"]),
+        "names": UNI_NAMES,
+        "points": True,
+        "style": {"color": "#FF9F1C", "edgecolor": "black", "marker": "*", "markersize": 5000, "linewidth": 4},
+        "polygon_style": {"color": "#D68586", "markersize": 1000, "edgecolor": "black", "linewidth": 2},
+        "output_key": "university",
+        "label": "Universities"
+    },
+    "supermarket": {
+        "filter": ("shop", ["supermarket"]),
+        "names": None,
+        "points": True,
+        "style": {"color": "#7776BC", "edgecolor": "black", "markersize": 250, "linewidth": 2},
+        "polygon_style": None,
+        "output_key": "supermarket",
+        "label": "Supermarkets"
+    },
+    "hospital": {
+        "filter": ("amenity", ["hospital"]),
+        "names": HOSPITALS_NAMES,
+        "points": True,
+        "style": {"color": "#8A2E2F", "edgecolor": "black", "marker": "P", "markersize": 1000, "linewidth": 3},
+        "polygon_style": None,
+        "output_key": "hospital",
+        "label": "Hospitals"
+    },
+    "eating place": {
+        "filter": ("amenity", ["restaurant", "fast_food"]),
+        "names": None,
+        "points": True,
+        "style": {"color": "#03B591", "edgecolor": "black", "marker": "h", "markersize": 200, "linewidth": 2, "alpha": 0.75},
+        "polygon_style": None,
+        "output_key": "eating_place",
+        "label": "Eating Places"
+    },
+    "bicycle rental": {
+        "filter": ("amenity", ["bicycle_rental"]),
+        "names": None,
+        "points": False,
+        "style": {"color": "#FFFFFF", "edgecolor": "black", "marker": ">", "markersize": 450, "linewidth": 2},
+        "polygon_style": None,
+        "output_key": "bicycle_rental",
+        "label": "Bicycle Rental Locations"
+    },
+    "car rental": {
+        "filter": ("amenity", ["car_rental"]),
+        "names": None,
+        "points": False,
+        "style": {"color": "#B8B8B8", "edgecolor": "black", "marker": "<", "markersize": 450, "linewidth": 2},
+        "polygon_style": None,
+        "output_key": "car_rental",
+        "label": "Car Rental Locations"
+    },
+    "bus station": {
+        "filter": ("amenity", ["bus_station"]),
+        "names": BUS_STATION_NAMES,
+        "points": True,
+        "style": {"color": "#F8F272", "edgecolor": "black", "marker": "v", "markersize": 450, "linewidth": 2},
+        "polygon_style": None,
+        "output_key": "bus_station",
+        "label": "Bus Stations"
+    }
+}
+
+# OSM filters of the places: place -> (primary filter, list of values of the secondary filter)
+POI_FILTERS = {place: category["filter"] for place, category in PLACE_CATEGORIES.items()}
+
+
+def register_place_category(place, primary_filter, values, names=None, points=True, style=None, polygon_style=None, output_key=None, label=None):
+    """
+    Input:
+        > place             name of the place, to be used in list_of_places (e.g. "pharmacy")
+        > primary_filter    OSM key of the place (e.g. "amenity")
+        > values            list of values of the key (e.g. ["pharmacy"])
+        > names             list of names of the locations to keep (None to keep all of them)
+        > points            boolean value, if set to True the polygons are replaced by their representative points
+        > style             keyword arguments of `GeoDataFrame.plot()` for the locations
+        > polygon_style     keyword arguments of `GeoDataFrame.plot()` for the polygons of the locations (optional)
+        > output_key        key of the information in the output of `plot_udine_map()` (default: place with underscores)
+        > label             name of the place in the progress messages (default: place, capitalized)
+
+    Output:
+        > the new category (see PLACE_CATEGORIES)
+
+    Note: the new place is extracted in the same pass over the PBF of the other places,
+    and counted and searched together with them
+    """
+    category = {
+        "filter": (primary_filter, list(values)),
+        "names": names,
+        "points": points,
+        "style": copy.deepcopy(style) if style is not None else {"color": "#333333", "edgecolor": "black", "markersize": 250, "linewidth": 2},
+        "polygon_style": polygon_style,
+        "output_key": output_key if output_key is not None else place.replace(" ", "_"),
+        "label": label if label is not None else place.title()
+    }
+    PLACE_CATEGORIES[place] = category
+    POI_FILTERS[place] = category["filter"]
+    return category
@@ -0,0 +1,155 @@
+# Import Libraries
+import heapq
+import numpy as np
+from shapely.geometry import LineString
+from .route_stats import EARTH_RADIUS
+
+
+# meters per pixel at the equator at zoom 0 (web mercator, 256 px tiles)
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+# default tolerance of the simplification, as a fraction of a pixel at the target zoom
+PIXEL_TOLERANCE = 0.5
+
+# default number of decimals of the coordinates (5 decimals ~ 1 meter)
+COORDS_PRECISION = 5
+
+SIMPLIFY_METHODS = ["douglas-peucker", "visvalingam"]
+
+
+def zoom_tolerance(zoom, lat, pixel_tolerance=PIXEL_TOLERANCE):
+    """
+    returns the tolerance (m) that corresponds to the given fraction of a pixel, at the given zoom and latitude
+    """
+    return pixel_tolerance * METERS_PER_PIXEL_Z0 * np.cos(np.radians(lat)) / (2 ** zoom)
+
+
+def _local_xy(lats, lons):
+    """
+    returns an (n, 2) array with the coordinates in meters (equirectangular projection around the first point)
+    """
+    lat0 = np.radians(lats[0])
+    x = np.radians(lons - lons[0]) * np.cos(lat0) * EARTH_RADIUS
+    y = np.radians(lats - lats[0]) * EARTH_RADIUS
+    return np.column_stack([x, y])
+
+
+def _douglas_peucker(xy, tolerance):
+    """
+    returns the positions of the points kept by the Douglas-Peucker algorithm (shapely)
+    """
+    simplified = np.asarray(LineString(xy).simplify(tolerance, preserve_topology=False).coords)
+    if len(simplified) == 0:
+        return np.array([0, len(xy) - 1])
+    # the kept points are a subsequence of the original ones: find their positions in order
+    keep = []
+    i = 0
+    for point in simplified:
+        while not np.array_equal(xy[i], point):
+            i += 1
+        keep.append(i)
+    return np.array(keep)
+
+
+def _visvalingam(xy, tolerance):
+    """
+    returns the positions of the points kept by the Visvalingam-Whyatt algorithm,
+    removing the points whose effective area is smaller than tolerance^2
+    """
+    n = len(xy)
+    prev_idx = np.arange(-1, n - 1)
+    next_idx = np.arange(1, n + 1)
+    removed = np.zeros(n, dtype=bool)
+
+    def area(i):
+        a, b, c = xy[prev_idx[i]], xy[i], xy[next_idx[i]]
+        return abs((b[0] - a[0]) * (c[1] - a[1]) - (c[0] - a[0]) * (b[1] - a[1])) / 2
+
+    # triangle areas of all the inner points, at once
+    a, b, c = xy[:-2], xy[1:-1], xy[2:]
+    areas = np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])) / 2
+    heap = [(areas[i - 1], i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+    current = np.concatenate([[np.inf], areas, [np.inf]])
+
+    min_area = tolerance * tolerance
+    while heap:
+        point_area, i = heapq.heappop(heap)
+        if removed[i] or point_area != current[i]:
+            continue
+        if point_area >= min_area:
+            break
+        removed[i] = True
+        p, q = prev_idx[i], next_idx[i]
+        next_idx[p] = q
+        prev_idx[q] = p
+        # the area of a neighbour never becomes smaller than the one of the removed point
+        for j in [p, q]:
+            if 0 < j < n - 1:
+                current[j] = max(area(j), point_area)
+                heapq.heappush(heap, (current[j], j))
+
+    return np.flatnonzero(~removed)
+
+
+def simplify_coords(lats, lons, zoom=None, method="douglas-peucker", pixel_tolerance=PIXEL_TOLERANCE):
+    """
+    Input:
+        > lats, lons        arrays with the coordinates of the polyline
+        > zoom              zoom level the simplification is tuned for, None to keep every point
+        > method            simplification algorithm, one of SIMPLIFY_METHODS
+        > pixel_tolerance   maximum error, as a fraction of a pixel at the given zoom
+
+    Output:
+        > tuple (lats, lons) with the points kept
+    """
+    if method not in SIMPLIFY_METHODS:
+        raise ValueError("Unknown simplification method: " + str(method))
+
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if zoom is None or len(lats) < 3:
+        return (lats, lons)
+
+    xy = _local_xy(lats, lons)
+    tolerance = zoom_tolerance(zoom, np.mean(lats), pixel_tolerance)
+    if method == "douglas-peucker":
+        keep = _douglas_peucker(xy, tolerance)
+    else:
+        keep = _visvalingam(xy, tolerance)
+
+    return (lats[keep], lons[keep])
+
+
+def quantize_coords(lats, lons, precision=COORDS_PRECISION):
+    """
+    returns the coordinates rounded to the given number of decimals, without consecutive duplicates
+    """
+    lats = np.round(np.asarray(lats, dtype=np.float64), precision)
+    lons = np.round(np.asarray(lons, dtype=np.float64), precision)
+    keep = np.ones(len(lats), dtype=bool)
+    keep[1:] = (np.diff(lats) != 0) | (np.diff(lons) != 0)
+    return (lats[keep], lons[keep])
+
+
+def coords_size(coords):
+    """
+    returns the number of characters used by the given list of (lat, lon) tuples in the html of the map
+    """
+    return sum(len(repr(lat)) + len(repr(lon)) + 4 for lat, lon in coords)
+
+
+def quantize_geojson(geojson, precision=COORDS_PRECISION):
+    """
+    returns the given geojson dictionary (e.g. `geodf.__geo_interface__`) with the coordinates rounded
+    to the given number of decimals
+    """
+    def round_coords(coords):
+        if len(coords) > 0 and isinstance(coords[0], (int, float)):
+            return [round(c, precision) for c in coords]
+        return [round_coords(c) for c in coords]
+
+    for feature in geojson["features"]:
+        if feature["geometry"] is not None:
+            feature["geometry"]["coordinates"] = round_coords(feature["geometry"]["coordinates"])
+    return geojson
@@ -0,0 +1,151 @@
+# Import Libraries
+import os
+import json
+import numpy as np
+import geopandas as gpd
+import pyrosm
+from .osm_cache import get_pbf_cache_dir
+from .osm_extract import extract_layers
+from .municipality_store import MUNICIPALITIES_PATH, load_municipalities
+
+
+# default PBF with the streets of Udine (relative to the 'code' folder, like the other data paths)
+UDINE_PBF_PATH = "../data/udine.osm.pbf"
+
+# number of decimals used to quantize the coordinates in the cache (4 decimals ~ 10 meters)
+CACHE_PRECISION = 4
+
+# maximum distance (m) of the nearest street
+MAX_STREET_DISTANCE = 250
+
+# reverse geocoders already built in this session: (municipalities path, PBF path) -> reverse geocoder
+_REVERSE_GEOCODERS = {}
+
+
+def build_reverse_geocoder(municipalities_path=MUNICIPALITIES_PATH, osm=None, use_cache=True):
+    """
+    Input:
+        > municipalities_path   path of the shapefile with the ISTAT municipalities
+        > osm                   pyrosm.OSM object used to find the nearest named street (optional)
+        > use_cache             boolean value, if set to True the results are read from (and stored in) a persistent cache
+
+    Output:
+        > reverse geocoder, i.e. a dictionary with
+            - "municipalities"  geodataframe (EPSG:4326) with the names of the municipalities, with spatial index
+            - "streets"         geodataframe (EPSG:32632) with the named streets, with spatial index (None without osm)
+            - "cache"           dictionary quantized "lat,lon" -> location name
+            - "cache_path"      path of the json file of the persistent cache (None if not persistent)
+    """
+    municipalities = load_municipalities(province_code=None, columns=["COMUNE"], municipalities_path=municipalities_path)
+    municipalities.sindex                                                   # build the spatial index once
+
+    streets = None
+    if osm is not None:
+        streets = extract_layers(osm, ["all"], use_cache)["all"]
+        streets = streets.loc[streets["name"].notnull(), ["name", "geometry"]].to_crs(32632).reset_index(drop=True)
+        streets.sindex                                                      # build the spatial index once
+
+    reverse_geocoder = {
+        "municipalities": municipalities,
+        "streets": streets,
+        "cache": {},
+        "cache_path": None
+    }
+
+    # load the persistent cache of the results
+    if use_cache:
+        if osm is not None:
+            cache_dir = get_pbf_cache_dir(osm.filepath)
+        else:
+            cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(municipalities_path))), "cache")
+        os.makedirs(cache_dir, exist_ok=True)
+        reverse_geocoder["cache_path"] = os.path.join(cache_dir, "reverse_geocoding_cache.json")
+        if os.path.exists(reverse_geocoder["cache_path"]):
+            with open(reverse_geocoder["cache_path"], "r", encoding="UTF-8") as cache_file:
+                reverse_geocoder["cache"] = json.load(cache_file)
+
+    return reverse_geocoder
+
+
+def get_reverse_geocoder(municipalities_path=MUNICIPALITIES_PATH, osm=None, use_cache=True):
+    """
+    returns the reverse geocoder for the given data, building it only the first time (see `build_reverse_geocoder()`)
+    """
+    key = (os.path.abspath(municipalities_path), os.path.abspath(osm.filepath) if osm is not None else None, use_cache)
+    if key not in _REVERSE_GEOCODERS:
+        _REVERSE_GEOCODERS[key] = build_reverse_geocoder(municipalities_path, osm, use_cache)
+    return _REVERSE_GEOCODERS[key]
+
+
+def get_default_reverse_geocoder(pbf_path=UDINE_PBF_PATH, municipalities_path=MUNICIPALITIES_PATH, use_cache=True):
+    """
+    returns the reverse geocoder of the ISTAT municipalities plus the nearest named street of the given PBF
+    (see `get_reverse_geocoder()`), with the municipalities only if the PBF is missing;
+    None if the shapefile of the municipalities is missing (e.g. a checkout without the .shp file)
+    """
+    if not os.path.exists(municipalities_path):
+        return None
+    osm = pyrosm.OSM(pbf_path) if os.path.exists(pbf_path) else None
+    return get_reverse_geocoder(municipalities_path, osm, use_cache)
+
+
+def _cache_key(lat, lon):
+    """
+    returns the key of the cache for the given coordinates (quantized)
+    """
+    return "%.*f,%.*f" % (CACHE_PRECISION, lat, CACHE_PRECISION, lon)
+
+
+def reverse_geocode_points(reverse_geocoder, lats, lons):
+    """
+    Input:
+        > reverse_geocoder  reverse geocoder obtained with `build_reverse_geocoder()`
+        > lats, lons        lists of coordinates
+
+    Output:
+        > list with the name of each location, e.g. "Via Roma, Udine" ("" if outside every municipality)
+
+    Note: all the points that are not in the cache are geocoded together,
+    with one query on the spatial index of the municipalities and one on the streets
+    """
+    keys = [_cache_key(lat, lon) for lat, lon in zip(lats, lons)]
+    missing = sorted(set(key for key in keys if key not in reverse_geocoder["cache"]))
+
+    if len(missing) > 0:
+
+        coords = np.array([[float(c) for c in key.split(",")] for key in missing])
+        points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(coords[:, 1], coords[:, 0]), crs=4326)
+
+        # municipality of each point
+        municipality_names = [""] * len(points)
+        point_idx, mun_idx = reverse_geocoder["municipalities"].sindex.query_bulk(points.geometry, predicate="intersects")
+        for p, m in zip(point_idx, mun_idx):
+            municipality_names[p] = reverse_geocoder["municipalities"]["COMUNE"].values[m]
+
+        # nearest named street of each point
+        street_names = [""] * len(points)
+        if reverse_geocoder["streets"] is not None:
+            points_crs = points.to_crs(32632)
+            point_idx, street_idx = reverse_geocoder["streets"].sindex.nearest(points_crs.geometry, return_all=False, max_distance=MAX_STREET_DISTANCE)
+            for p, s in zip(point_idx, street_idx):
+                street_names[p] = reverse_geocoder["streets"]["name"].values[s]
+
+        # store the results
+        for key, street, municipality in zip(missing, street_names, municipality_names):
+            reverse_geocoder["cache"][key] = ", ".join([name for name in [street, municipality] if name != ""])
+
+        # written under a temporary name and then renamed, an interrupted run never leaves a truncated cache
+        if reverse_geocoder["cache_path"] is not None:
+            tmp_path = reverse_geocoder["cache_path"] + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_path, "w", encoding="UTF-8") as cache_file:
+                json.dump(reverse_geocoder["cache"], cache_file)
+            os.replace(tmp_path, reverse_geocoder["cache_path"])
+
+    return [reverse_geocoder["cache"][key] for key in keys]
+
+
+def reverse_geocode(reverse_geocoder, lat, lon):
+    """
+    returns the name of the location at the given coordinates, see `reverse_geocode_points()`
+    """
+    return reverse_geocode_points(reverse_geocoder, [lat], [lon])[0]
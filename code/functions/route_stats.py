@@ -0,0 +1,233 @@
+# Import Libraries
+import os
+import json
+import hashlib
+import numpy as np
+from .gpx_reader import read_gpx_arrays
+
+
+# mean radius of the Earth (m), used by the haversine formula
+EARTH_RADIUS = 6371008.8
+
+# minimum speed (m/s) of a step to be considered moving (slower steps are pauses)
+MOVING_SPEED_THRESHOLD = 0.5
+
+# summaries already computed: content hash -> summary
+_SUMMARIES = {}
+
+# json files of the summaries read in this session: absolute path -> {"keys": hashes stored in the file, "dirty": new summaries to write}
+_CACHE_FILES = {}
+
+
+def haversine_steps(lons, lats):
+    """
+    returns the distance (m) between each pair of consecutive points, with the haversine formula
+    """
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    dlon = np.diff(lons)
+    dlat = np.diff(lats)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lats[:-1]) * np.cos(lats[1:]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def summarize_arrays(lons, lats, altitudes=None, times=None):
+    """
+    Input:
+        > lons, lats    arrays with the coordinates of the points of the route
+        > altitudes     array with the elevation of each point (m), optional
+        > times         array with the time of each point (datetime64), optional, sorted in ascending order
+
+    Output:
+        > dictionary with the summary of the route
+            - "distance"        total length (m)
+            - "duration"        seconds from the first to the last point (None without times)
+            - "moving_time"     seconds spent moving faster than MOVING_SPEED_THRESHOLD (None without times)
+            - "moving_speed"    average speed while moving (km/h, None without times)
+            - "min_altitude", "max_altitude", "elevation_gain"  (m, None without altitudes)
+
+    Every value is computed with vectorized operations on the arrays, in one pass
+    """
+    steps = haversine_steps(lons, lats)
+
+    summary = {
+        "distance": float(steps.sum()),
+        "duration": None,
+        "moving_time": None,
+        "moving_speed": None,
+        "min_altitude": None,
+        "max_altitude": None,
+        "elevation_gain": None
+    }
+
+    times = np.asarray(times, dtype="datetime64[ns]") if times is not None else np.zeros(0, dtype="datetime64[ns]")
+    valid_times = times[~np.isnat(times)]
+    if len(valid_times) > 1:
+        summary["duration"] = float((valid_times[-1] - valid_times[0]) / np.timedelta64(1, "s"))
+        seconds = np.diff(times) / np.timedelta64(1, "s")                 # nan if one of the times is missing
+        moving = (seconds > 0) & (steps > MOVING_SPEED_THRESHOLD * seconds)
+        summary["moving_time"] = float(seconds[moving].sum())
+        if summary["moving_time"] > 0:
+            summary["moving_speed"] = float(steps[moving].sum() / summary["moving_time"] * 3.6)
+
+    altitudes = np.asarray(altitudes, dtype=np.float64) if altitudes is not None else np.zeros(0)
+    if not np.all(np.isnan(altitudes)):
+        summary["min_altitude"] = float(np.nanmin(altitudes))
+        summary["max_altitude"] = float(np.nanmax(altitudes))
+        summary["elevation_gain"] = float(np.nansum(np.clip(np.diff(altitudes), 0, None)))
+
+    return summary
+
+
+def _geodf_arrays(geodf):
+    """
+    returns (lons, lats, altitudes, times) of a route geodataframe (see `create_geodf_from_segment()`)
+    """
+    lons = geodf.geometry.x.values
+    lats = geodf.geometry.y.values
+    altitudes = geodf["altitude"].values.astype(np.float64) if "altitude" in geodf.columns else None
+    times = geodf["time"].values if "time" in geodf.columns else None
+    return (lons, lats, altitudes, times)
+
+
+def content_hash(*arrays):
+    """
+    returns the sha1 of the content of the given arrays (None values are skipped)
+    """
+    sha1 = hashlib.sha1()
+    for array in arrays:
+        if array is not None:
+            sha1.update(np.ascontiguousarray(array).tobytes())
+    return sha1.hexdigest()
+
+
+def summarize_route(geodf, cache_path=None, save=True):
+    """
+    Input:
+        > geodf         geodataframe of a route, with 'altitude' and 'time' columns (see `create_geodf_from_segment()`)
+        > cache_path    json file where the summaries are persisted, None to keep them only in this session
+        > save          boolean value, if set to False a new summary is written only by `save_summaries()`
+                        (e.g. once after many routes)
+
+    Output:
+        > summary of the route, see `summarize_arrays()`
+
+    The summaries are cached by the hash of the content of the route, so a route
+    that did not change is never processed again
+    """
+    arrays = _geodf_arrays(geodf)
+    key = content_hash(*arrays)
+    return _cached_summary(key, lambda: summarize_arrays(*arrays), cache_path, save)
+
+
+def summarize_gpx(path, cache_path=None, save=True):
+    """
+    Input:
+        > path          local path of a gpx file
+        > cache_path    json file where the summaries are persisted, None to keep them only in this session
+        > save          boolean value, if set to False a new summary is written only by `save_summaries()`
+
+    Output:
+        > summary of the first segment of the first track, see `summarize_arrays()`
+
+    The summaries are cached by the hash of the content of the file, so the file
+    is parsed only if it changed
+    """
+    with open(path, "rb") as gpx_file:
+        key = hashlib.sha1(gpx_file.read()).hexdigest()
+
+    def compute():
+        segment = read_gpx_arrays(path)[0]
+        return summarize_arrays(segment["longitude"], segment["latitude"], segment["altitude"], segment["time"])
+
+    return _cached_summary(key, compute, cache_path, save)
+
+
+def _read_summaries(path):
+    """
+    returns the summaries stored in the given json file (empty if missing)
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="UTF-8") as cache_file:
+        return json.load(cache_file)
+
+
+def _cache_file(cache_path):
+    """
+    returns the state of the given json file of summaries, reading it (into _SUMMARIES) only the first time
+    """
+    path = os.path.abspath(cache_path)
+    if path not in _CACHE_FILES:
+        persisted = _read_summaries(path)
+        _SUMMARIES.update(persisted)
+        _CACHE_FILES[path] = {"keys": set(persisted), "dirty": False}
+    return _CACHE_FILES[path]
+
+
+def save_summaries(cache_path):
+    """
+    writes the new summaries of the given json file (see `summarize_route()`), if any
+
+    Note: the summaries written in the meantime by another run are kept, and the file is replaced
+    atomically (a concurrent run never reads a truncated file)
+    """
+    if cache_path is None:
+        return
+    state = _cache_file(cache_path)
+    if not state["dirty"]:
+        return
+
+    path = os.path.abspath(cache_path)
+    persisted = _read_summaries(path)
+    persisted.update({key: _SUMMARIES[key] for key in state["keys"]})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, "w", encoding="UTF-8") as cache_file:
+        json.dump(persisted, cache_file)
+    os.replace(tmp_path, path)
+    state["keys"] = set(persisted)
+    state["dirty"] = False
+
+
+def _cached_summary(key, compute, cache_path, save=True):
+    """
+    returns the summary with the given key from the cache (in memory, with the json file read once),
+    computing it if missing
+    """
+    state = _cache_file(cache_path) if cache_path is not None else None
+
+    if key not in _SUMMARIES:
+        _SUMMARIES[key] = compute()
+
+    if state is not None and key not in state["keys"]:
+        state["keys"].add(key)
+        state["dirty"] = True
+        if save:
+            save_summaries(cache_path)
+
+    return _SUMMARIES[key]
+
+
+def summary_to_html(summary):
+    """
+    Input:
+        > summary   summary of a route, see `summarize_arrays()`
+
+    Output:
+        > list of html strings (distance, time, altitude), shown in the popups of the routes
+    """
+    distance = "<b>Distance</b>: %s m (%s km)" % (round(summary["distance"]), round(summary["distance"]/1000,2))
+
+    travel_time = "<b>Time</b>: -"
+    if summary["duration"] is not None:
+        travel_time = "<b>Time</b>: %sh %02dm" % (int(summary["duration"] // 3600), int(summary["duration"] % 3600 // 60))
+        if summary["moving_speed"] is not None:
+            travel_time += "<br><b>Moving Speed</b>: %s km/h" % round(summary["moving_speed"], 1)
+
+    altitude = "<b>Altitude</b>: -"
+    if summary["min_altitude"] is not None:
+        altitude = "<b>Min Altitude</b>: %s meters<br><b>Max Altitude</b>: %s meters<br><b>Elevation Gain</b>: %s meters" % (
+            summary["min_altitude"], summary["max_altitude"], round(summary["elevation_gain"]))
+
+    return [distance, travel_time, altitude]
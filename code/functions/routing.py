@@ -0,0 +1,166 @@
+# Import Libraries
+import heapq
+import numpy as np
+from itertools import count
+from .routing_graph import csr_single_source_dijkstra, csr_route
+from .snapping import snap_to_nodes
+
+
+def single_source_dijkstra(graph, source, targets=None, cutoff=None, weight="length"):
+    """
+    Input:
+        > graph         networkx graph (e.g. obtained with `udine_osm.to_graph()`)
+        > source        id of the start node
+        > targets       collection of node ids, the search stops as soon as all of them are reached
+        > cutoff        maximum distance to explore (same unit of the weight)
+        > weight        name of the edge attribute used as weight
+
+    Output:
+        > tuple with two dictionaries
+            - pos 0: node -> distance from source (only for the settled nodes)
+            - pos 1: node -> predecessor in the shortest path tree (None for the source)
+
+    Note: for multigraphs, the lightest of the parallel edges is used (like osmnx does)
+    """
+    is_multigraph = graph.is_multigraph()
+    adjacency = graph.adj
+
+    remaining = set(targets) if targets is not None else None
+    distances = {}
+    predecessors = {source: None}
+    tentative = {source: 0}
+
+    # the counter avoids comparing nodes when two distances are equal
+    counter = count()
+    heap = [(0, next(counter), source)]
+
+    while heap:
+        dist, _, node = heapq.heappop(heap)
+
+        if node in distances:
+            continue
+        distances[node] = dist
+
+        # early exit, all the targets have been reached
+        if remaining is not None:
+            remaining.discard(node)
+            if not remaining:
+                break
+
+        for neighbour, data in adjacency[node].items():
+            if is_multigraph:
+                edge_weight = min(d.get(weight, 1) for d in data.values())
+            else:
+                edge_weight = data.get(weight, 1)
+
+            new_dist = dist + edge_weight
+            if cutoff is not None and new_dist > cutoff:
+                continue
+
+            if neighbour not in distances and new_dist < tentative.get(neighbour, float("inf")):
+                tentative[neighbour] = new_dist
+                predecessors[neighbour] = node
+                heapq.heappush(heap, (new_dist, next(counter), neighbour))
+
+    # keep only the predecessors of settled nodes
+    predecessors = {node: predecessors[node] for node in distances}
+
+    return (distances, predecessors)
+
+
+def route_from_predecessors(predecessors, target, source=None):
+    """
+    Input:
+        > predecessors  predecessor dictionary returned by `single_source_dijkstra()`,
+                        or predecessor array of a routing graph search
+        > target        id of the end node
+        > source        id of the start node (required only for routing graph searches)
+
+    Output:
+        > list of node ids from the source to the target (None if the target was not reached)
+    """
+    if isinstance(predecessors, np.ndarray):
+        return csr_route(predecessors, source, target)
+
+    if target not in predecessors:
+        return None
+
+    route = [target]
+    while predecessors[route[-1]] is not None:
+        route.append(predecessors[route[-1]])
+
+    return route[::-1]
+
+
+def get_nearest_node(graph, coords):
+    """
+    Input:
+        > graph     networkx graph or routing graph (see `routing_graph.py`)
+        > coords    tuple (lat, lon)
+
+    Output:
+        > id of the closest node (position of the node, for routing graphs)
+    """
+    return get_nearest_nodes(graph, [coords[0]], [coords[1]])[0]
+
+
+def get_nearest_nodes(graph, lats, lons):
+    """
+    Input:
+        > graph         networkx graph or routing graph (see `routing_graph.py`)
+        > lats, lons    lists of coordinates
+
+    Output:
+        > list with the id of the closest node of each point (position of the node, for routing graphs)
+
+    Note: all the points are snapped with a single query of the KD-tree of the graph (see `snapping.py`)
+    """
+    return snap_to_nodes(graph, lons, lats)[0].tolist()
+
+
+def nearest_facility(graph, source, facility_nodes, facility_names=None, cutoff=None, weight="length"):
+    """
+    Input:
+        > graph             networkx graph or routing graph (see `routing_graph.py`)
+        > source            id of the start node (e.g. the node closest to an address)
+        > facility_nodes    list of node ids, one for each facility
+        > facility_names    list of names of the facilities (default: the node ids)
+        > cutoff            maximum distance to explore, farther facilities are considered unreachable
+        > weight            name of the edge attribute used as weight
+
+    Output:
+        > dictionary with
+            - "closest_name"        name of the closest facility ("" if none is reachable)
+            - "closest_node"        node of the closest facility (None if none is reachable)
+            - "closest_distance"    distance of the closest facility (None if none is reachable)
+            - "distances"           list with the distance of every facility (None if unreachable)
+            - "predecessors"        shortest path tree, see `route_from_predecessors()`
+
+    A single Dijkstra search from the source is run for all the facilities together
+    """
+    if facility_names is None:
+        facility_names = list(facility_nodes)
+
+    if isinstance(graph, dict):
+        # routing graph: a single scipy search, the weight is always the length
+        all_distances, predecessors = csr_single_source_dijkstra(graph, source, cutoff)
+        facility_distances = [float(all_distances[node]) if np.isfinite(all_distances[node]) else None for node in facility_nodes]
+    else:
+        distances, predecessors = single_source_dijkstra(graph, source, facility_nodes, cutoff, weight)
+        facility_distances = [distances.get(node) for node in facility_nodes]
+
+    result = {
+        "closest_name": "",
+        "closest_node": None,
+        "closest_distance": None,
+        "distances": facility_distances,
+        "predecessors": predecessors
+    }
+
+    for name, node, dist in zip(facility_names, facility_nodes, result["distances"]):
+        if dist is not None and (result["closest_distance"] is None or dist < result["closest_distance"]):
+            result["closest_name"] = name
+            result["closest_node"] = node
+            result["closest_distance"] = dist
+
+    return result
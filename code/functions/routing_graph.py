@@ -0,0 +1,217 @@
+# Import Libraries
+import os
+import shutil
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, connected_components
+from .osm_cache import get_pbf_cache_dir, get_osm_layer_key
+from .osm_extract import extract_layers, NETWORK_FILTERS
+
+
+# arrays that define a routing graph on disk
+GRAPH_ARRAYS = ["indptr", "indices", "lengths", "node_ids", "lon", "lat"]
+
+# minimum length of an edge: explicit zeros could be dropped by the sparse matrix
+MIN_EDGE_LENGTH = 1e-6
+
+# cache key of the routing graph (only the largest connected component of the walking network)
+ROUTING_GRAPH_KIND = "routing_graph_walking_largest_component"
+
+
+def build_routing_graph(nodes, edges, bidirectional=True, largest_component=True):
+    """
+    Input:
+        > nodes             geodataframe of nodes (columns 'id', 'lon', 'lat'), as returned by pyrosm
+        > edges             geodataframe of edges (columns 'u', 'v', 'length'), as returned by pyrosm;
+                            the edges whose nodes are not in nodes are dropped
+        > bidirectional     boolean value, if set to True every edge can be walked in both directions
+        > largest_component boolean value, if set to True only the largest (weakly) connected component is kept,
+                            like `to_graph(retain_all=False)` of pyrosm: points are never snapped to isolated
+                            fragments (e.g. a private path) from which no facility can be reached
+
+    Output:
+        > dictionary with the routing graph in CSR format:
+            - "indptr", "indices", "lengths"    adjacency of node i: indices[indptr[i]:indptr[i+1]]
+            - "node_ids"                        OSM id of each node
+            - "lon", "lat"                      coordinates of each node
+            - "matrix"                          scipy CSR matrix that shares the arrays above
+    """
+    node_ids = nodes["id"].values.astype(np.int64)
+    order = np.argsort(node_ids)
+    node_ids = node_ids[order]
+
+    # from OSM ids to positions, dropping the edges with a node missing from the nodes (e.g. cut by the bounding box)
+    edge_u = edges["u"].values.astype(np.int64)
+    edge_v = edges["v"].values.astype(np.int64)
+    u = np.minimum(np.searchsorted(node_ids, edge_u), max(len(node_ids) - 1, 0))
+    v = np.minimum(np.searchsorted(node_ids, edge_v), max(len(node_ids) - 1, 0))
+    lengths = np.maximum(edges["length"].values.astype(np.float64), MIN_EDGE_LENGTH)
+    if len(node_ids) == 0:
+        known = np.zeros(len(edge_u), dtype=bool)
+    else:
+        known = (node_ids[u] == edge_u) & (node_ids[v] == edge_v)
+    u, v, lengths = u[known], v[known], lengths[known]
+
+    if bidirectional:
+        u, v = np.concatenate([u, v]), np.concatenate([v, u])
+        lengths = np.concatenate([lengths, lengths])
+
+    # keep only the shortest of the parallel edges (the sparse matrix would sum them)
+    sort_idx = np.lexsort((lengths, v, u))
+    u, v, lengths = u[sort_idx], v[sort_idx], lengths[sort_idx]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    u, v, lengths = u[first], v[first], lengths[first]
+
+    lon = nodes["lon"].values.astype(np.float64)[order]
+    lat = nodes["lat"].values.astype(np.float64)[order]
+
+    if largest_component and len(node_ids) > 0:
+        n = len(node_ids)
+        _, labels = connected_components(csr_matrix((lengths, (u, v)), shape=(n, n)), directed=True, connection="weak")
+        keep = labels == np.argmax(np.bincount(labels))
+        new_position = np.cumsum(keep) - 1
+        edge_keep = keep[u]                                                 # both nodes of an edge are in the same component
+        u, v, lengths = new_position[u[edge_keep]], new_position[v[edge_keep]], lengths[edge_keep]
+        node_ids, lon, lat = node_ids[keep], lon[keep], lat[keep]
+
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(u, minlength=len(node_ids)), out=indptr[1:])
+
+    graph = {
+        "indptr": indptr,
+        "indices": v.astype(np.int32),
+        "lengths": lengths,
+        "node_ids": node_ids,
+        "lon": lon,
+        "lat": lat
+    }
+    graph["matrix"] = _to_matrix(graph)
+
+    return graph
+
+
+def _to_matrix(graph):
+    """
+    returns the scipy CSR matrix of the routing graph, without copying its arrays
+    """
+    n = len(graph["node_ids"])
+    return csr_matrix((graph["lengths"], graph["indices"], graph["indptr"]), shape=(n, n), copy=False)
+
+
+def save_routing_graph(graph, path):
+    """
+    Input:
+        > graph     routing graph, see `build_routing_graph()`
+        > path      folder where the arrays of the graph are saved (as .npy files)
+    """
+    # written in a temporary folder, then renamed: an interrupted run never leaves a partial graph in the cache
+    tmp_path = path + "." + str(os.getpid()) + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name in GRAPH_ARRAYS:
+        np.save(os.path.join(tmp_path, name + ".npy"), graph[name])
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def load_routing_graph(path, mmap=True):
+    """
+    Input:
+        > path      folder with the arrays of the graph, see `save_routing_graph()`
+        > mmap      boolean value, if set to True the arrays are memory-mapped instead of read
+
+    Output:
+        > routing graph, see `build_routing_graph()`
+    """
+    mmap_mode = "r" if mmap else None
+    graph = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in GRAPH_ARRAYS}
+    graph["matrix"] = _to_matrix(graph)
+    return graph
+
+
+def get_routing_graph_path(osm, cache_dir=None):
+    """
+    returns the folder of the cached routing graph of the given pyrosm.OSM object
+    """
+    return os.path.join(get_pbf_cache_dir(osm.filepath, cache_dir), get_osm_layer_key(osm, ROUTING_GRAPH_KIND, network_filter=NETWORK_FILTERS["walking"]))
+
+
+def is_routing_graph_cached(osm, cache_dir=None):
+    """
+    returns True if the routing graph of the given pyrosm.OSM object is in the cache
+    """
+    graph_path = get_routing_graph_path(osm, cache_dir)
+    return all(os.path.exists(os.path.join(graph_path, name + ".npy")) for name in GRAPH_ARRAYS)
+
+
+def get_routing_graph(osm, use_cache=True, cache_dir=None, graph_layer=None):
+    """
+    Input:
+        > osm           pyrosm.OSM object
+        > use_cache     boolean value, if set to True the graph is loaded from (and saved in) the cache
+        > cache_dir     root folder of the cache (default: 'cache' folder next to the PBF)
+        > graph_layer   tuple (nodes, edges) already extracted with `extract_layers(osm, ["graph"])`, if available
+
+    Output:
+        > routing graph of the walking network, see `build_routing_graph()`
+
+    The graph is built once and stored next to the cached layers of the PBF,
+    later runs memory-map it without rebuilding any networkx object.
+    """
+    if use_cache and is_routing_graph_cached(osm, cache_dir):
+        return load_routing_graph(get_routing_graph_path(osm, cache_dir))
+
+    if graph_layer is None:
+        graph_layer = extract_layers(osm, ["graph"], use_cache)["graph"]
+    graph = build_routing_graph(graph_layer[0], graph_layer[1])
+
+    if use_cache:
+        save_routing_graph(graph, get_routing_graph_path(osm, cache_dir))
+
+    return graph
+
+
+def csr_single_source_dijkstra(graph, source, cutoff=None):
+    """
+    Input:
+        > graph     routing graph
+        > source    position of the start node
+        > cutoff    maximum distance to explore (m)
+
+    Output:
+        > tuple with two arrays
+            - pos 0: distance of every node from the source (inf if not reached)
+            - pos 1: predecessor of every node in the shortest path tree (-9999 if none)
+    """
+    limit = np.inf if cutoff is None else cutoff
+    distances, predecessors = dijkstra(graph["matrix"], directed=True, indices=source, limit=limit, return_predecessors=True)
+    return (distances, predecessors)
+
+
+def csr_route(predecessors, source, target):
+    """
+    Input:
+        > predecessors  predecessor array returned by `csr_single_source_dijkstra()`
+        > source        position of the start node
+        > target        position of the end node
+
+    Output:
+        > list of node positions from the source to the target (None if the target was not reached)
+    """
+    if target != source and predecessors[target] < 0:
+        return None
+
+    route = [target]
+    while predecessors[route[-1]] >= 0:
+        route.append(int(predecessors[route[-1]]))
+
+    return route[::-1]
+
+
+def route_coords(graph, route):
+    """
+    returns the list of (lon, lat) coordinates of a route made of node positions
+    """
+    route = np.asarray(route)
+    return list(zip(graph["lon"][route], graph["lat"][route]))
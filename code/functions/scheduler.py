@@ -0,0 +1,173 @@
+# Import Libraries
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .instrumentation import span, is_tracing_memory
+
+
+# where a stage can run:
+#   - "thread"      in a pool of threads (I/O, or compute that releases the GIL, e.g. pygeos / scipy)
+#   - "process"     in a pool of processes (pure python compute, e.g. the PBF decoding),
+#                   function, arguments and result must be picklable
+#   - "async"       as a coroutine on the event loop of the scheduler (e.g. network I/O)
+EXECUTORS = ["thread", "process", "async"]
+
+
+def stage(func, deps=(), executor="thread", args=(), kwargs=None):
+    """
+    Input:
+        > func          function of the stage (a coroutine function for executor "async")
+        > deps          list of names of the stages whose results are required
+        > executor      where the stage runs (see EXECUTORS)
+        > args          additional positional arguments
+        > kwargs        keyword arguments
+
+    Output:
+        > stage, i.e. a dictionary to be used in `run_stages()`;
+          the function is called as func(*results of deps, *args, **kwargs)
+    """
+    if executor not in EXECUTORS:
+        raise ValueError("Unknown executor: " + str(executor))
+    return {"func": func, "deps": list(deps), "executor": executor, "args": tuple(args), "kwargs": dict(kwargs or {})}
+
+
+def topological_order(stages):
+    """
+    returns the names of the stages ordered so that every stage follows its dependencies,
+    raises a ValueError if a dependency is missing or if the dependencies have a cycle
+    """
+    order = []
+    state = {}                                                              # name -> "visiting" | "done"
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError("Cyclic dependencies: " + " -> ".join(path + [name]))
+        state[name] = "visiting"
+        for dep in stages[name]["deps"]:
+            if dep not in stages:
+                raise ValueError("Stage '" + name + "' depends on the unknown stage '" + dep + "'")
+            visit(dep, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in stages:
+        visit(name, [])
+
+    return order
+
+
+async def _run_dag(stages, order, concurrent, max_workers, process_workers, timings):
+    """
+    runs the stages on the event loop, each one as soon as its dependencies are done
+    """
+    loop = asyncio.get_running_loop()
+    threads = ThreadPoolExecutor(max_workers=max_workers if concurrent else 1)
+    processes = None
+    n_process_stages = sum(stages[name]["executor"] == "process" for name in order)
+    if n_process_stages > 0:
+        if process_workers is None:
+            process_workers = min(n_process_stages, os.cpu_count() or 1)
+        processes = ProcessPoolExecutor(max_workers=process_workers if concurrent else 1)
+    start = time.perf_counter()
+
+    async def run(name, tasks):
+        current = stages[name]
+        inputs = [await tasks[dep] for dep in current["deps"]] + list(current["args"])
+
+        with span(name, executor=current["executor"]):
+            stage_start = time.perf_counter()
+            if current["executor"] == "async":
+                result = await current["func"](*inputs, **current["kwargs"])
+            elif current["executor"] == "process":
+                result = await loop.run_in_executor(processes, _call, current["func"], inputs, current["kwargs"])
+            else:
+                # the thread runs in a copy of the context, so the spans of the stage are nested under this one
+                context = contextvars.copy_context()
+                result = await loop.run_in_executor(threads, context.run, _call, current["func"], inputs, current["kwargs"])
+
+        if timings is not None:
+            timings[name] = (stage_start - start, time.perf_counter() - start)
+        return result
+
+    try:
+        tasks = {}
+        if concurrent:
+            for name in order:
+                tasks[name] = asyncio.ensure_future(run(name, tasks))
+            await asyncio.gather(*tasks.values())
+        else:
+            for name in order:
+                tasks[name] = asyncio.ensure_future(run(name, tasks))
+                await tasks[name]
+        return {name: tasks[name].result() for name in order}
+    finally:
+        threads.shutdown(wait=True)
+        if processes is not None:
+            processes.shutdown(wait=True)
+
+
+def _call(func, inputs, kwargs):
+    """
+    calls the function of a stage (module level, so that it can be sent to a process)
+    """
+    return func(*inputs, **kwargs)
+
+
+def run_stages(stages, concurrent=True, max_workers=None, process_workers=None, timings=None):
+    """
+    Input:
+        > stages            dictionary name -> stage (see `stage()`)
+        > concurrent        boolean value, if set to False the stages run one after another (in topological order)
+        > max_workers       number of threads of the pool (default: the one of ThreadPoolExecutor)
+        > process_workers   number of processes of the pool (default: one for each "process" stage, at most the number of cpus)
+        > timings           dictionary filled with name -> (start, end) of each stage, in seconds from the start (optional)
+
+    Output:
+        > dictionary name -> result of the stage
+
+    Each stage starts as soon as all its dependencies are done, so the total time is the one of the
+    critical path (see `critical_path()`) instead of the sum of the stages. Every stage is recorded
+    as a span (see `instrumentation.py`). If a stage fails, its exception is raised once the stages
+    already running are done.
+
+    Note: if the spans trace the memory, the stages run one after another even with concurrent=True
+    (the peak of tracemalloc is process-wide, concurrent spans would reset each other's peak)
+    """
+    order = topological_order(stages)
+    if concurrent and is_tracing_memory():
+        print("WARNING: the memory of the spans is traced, the stages run one after another")
+        concurrent = False
+    coroutine = _run_dag(stages, order, concurrent, max_workers, process_workers, timings)
+
+    # an event loop may already be running in this thread (e.g. in a notebook): use another thread
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as loop_thread:
+        return loop_thread.submit(contextvars.copy_context().run, asyncio.run, coroutine).result()
+
+
+def critical_path(stages, timings):
+    """
+    Input:
+        > stages        dictionary name -> stage
+        > timings       dictionary name -> (start, end), filled by `run_stages()`
+
+    Output:
+        > tuple with two elements
+            - pos 0: list of the names of the stages on the critical path (the chain of dependencies that ends last)
+            - pos 1: sum of the durations (s) of those stages
+    """
+    path = []
+    name = max(timings, key=lambda n: timings[n][1]) if timings else None
+    while name is not None:
+        path.append(name)
+        deps = [dep for dep in stages[name]["deps"] if dep in timings]
+        name = max(deps, key=lambda n: timings[n][1]) if deps else None
+    path.reverse()
+    return (path, sum(timings[n][1] - timings[n][0] for n in path))
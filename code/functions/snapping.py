@@ -0,0 +1,174 @@
+# Import Libraries
+import numpy as np
+from pyproj import Transformer
+from scipy.spatial import cKDTree
+
+
+# projected crs used to measure the distances (UTM 32N, the zone of Udine)
+SNAPPING_CRS = 32632
+
+# number of nearest nodes whose edges are checked when snapping to the edges
+EDGE_CANDIDATE_NODES = 8
+
+# points snapped to the edges together (bounds the memory of the padded candidates)
+SNAP_BLOCK = 10000
+
+# transformer from EPSG:4326 to the projected crs (always_xy: lon, lat order)
+_TRANSFORMER = Transformer.from_crs(4326, SNAPPING_CRS, always_xy=True)
+
+
+def project_coords(lons, lats):
+    """
+    returns an (n, 2) array with the given coordinates projected in SNAPPING_CRS (meters)
+    """
+    x, y = _TRANSFORMER.transform(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+    return np.column_stack([np.atleast_1d(x), np.atleast_1d(y)])
+
+
+def _graph_nodes(graph):
+    """
+    returns (node ids, lon, lat) of a routing graph (node positions as ids) or of a networkx graph
+    """
+    if isinstance(graph, dict):
+        return (np.arange(len(graph["node_ids"])), np.asarray(graph["lon"]), np.asarray(graph["lat"]))
+    node_ids, data = zip(*graph.nodes(data=True))
+    return (np.array(node_ids), np.array([d["x"] for d in data]), np.array([d["y"] for d in data]))
+
+
+def build_snapper(graph):
+    """
+    Input:
+        > graph     routing graph (see `routing_graph.py`) or networkx graph (nodes with 'x', 'y' attributes)
+
+    Output:
+        > snapper, i.e. a dictionary with
+            - "tree"        KD-tree over the projected coordinates of the nodes
+            - "xy"          projected coordinates of the nodes
+            - "node_ids"    id of each node (position of the node, for routing graphs)
+            - "graph"       the graph itself (used to snap to the edges)
+    """
+    node_ids, lon, lat = _graph_nodes(graph)
+    xy = project_coords(lon, lat)
+    return {"tree": cKDTree(xy), "xy": xy, "node_ids": node_ids, "graph": graph}
+
+
+def get_snapper(graph):
+    """
+    returns the snapper of the given graph, building it only the first time (see `build_snapper()`)
+    """
+    store = graph if isinstance(graph, dict) else graph.graph
+    if "snapper" not in store:
+        store["snapper"] = build_snapper(graph)
+    return store["snapper"]
+
+
+def snap_to_nodes(graph, lons, lats):
+    """
+    Input:
+        > graph         routing graph or networkx graph
+        > lons, lats    arrays of coordinates (EPSG:4326)
+
+    Output:
+        > tuple with two arrays
+            - pos 0: id of the closest node of each point (position of the node, for routing graphs)
+            - pos 1: distance (m) of each point from its node
+    """
+    snapper = get_snapper(graph)
+    if len(np.atleast_1d(lons)) == 0:
+        return (snapper["node_ids"][:0], np.zeros(0))
+    distances, idx = snapper["tree"].query(project_coords(lons, lats))
+    return (snapper["node_ids"][idx], distances)
+
+
+def snap_geometries(graph, geoms):
+    """
+    returns the ids of the closest nodes of the given point geometries (EPSG:4326), see `snap_to_nodes()`
+    """
+    geoms = list(geoms)
+    return snap_to_nodes(graph, [geom.x for geom in geoms], [geom.y for geom in geoms])[0]
+
+
+def _adjacency(snapper):
+    """
+    returns (indptr, indices) of the adjacency of the snapper's graph in CSR form, as positions in the KD-tree
+    (the arrays of a routing graph, built once for a networkx graph)
+    """
+    graph = snapper["graph"]
+    if isinstance(graph, dict):
+        return (np.asarray(graph["indptr"]), np.asarray(graph["indices"]))
+    if "adjacency" not in snapper:
+        position = {node: i for i, node in enumerate(snapper["node_ids"])}
+        neighbors = [[position[n] for n in graph.neighbors(node)] for node in snapper["node_ids"]]
+        indptr = np.zeros(len(neighbors) + 1, dtype=np.int64)
+        np.cumsum([len(n) for n in neighbors], out=indptr[1:])
+        snapper["adjacency"] = (indptr, np.array([i for n in neighbors for i in n], dtype=np.int64))
+    return snapper["adjacency"]
+
+
+def snap_to_edges(graph, lons, lats, k=EDGE_CANDIDATE_NODES):
+    """
+    Input:
+        > graph         routing graph or networkx graph
+        > lons, lats    arrays of coordinates (EPSG:4326)
+        > k             number of nearest nodes whose edges are candidates
+
+    Output:
+        > dictionary of arrays, with one value for each point
+            - "u", "v"          nodes of the closest edge (edges are straight segments between their nodes)
+            - "fraction"        position of the projection along the edge (0 at u, 1 at v)
+            - "distance"        distance (m) of the point from the edge
+            - "x", "y"          projected coordinates (SNAPPING_CRS) of the snapped point
+
+    Note: the candidate edges are the ones of the k nearest nodes, found with one query of the KD-tree,
+    so an edge longer than the distance of the k-th node can be missed (rare at city scale).
+    The candidates of a block of points are padded to the largest degree and projected at once
+    """
+    snapper = get_snapper(graph)
+    node_ids = snapper["node_ids"]
+    xy = snapper["xy"]
+    indptr, indices = _adjacency(snapper)
+    points = project_coords(lons, lats)
+    k = min(k, len(node_ids))
+
+    _, candidates = snapper["tree"].query(points, k=k)
+    candidates = candidates.reshape(len(points), k)
+
+    result = {name: np.zeros(len(points)) for name in ["fraction", "distance", "x", "y"]}
+    result["u"] = np.empty(len(points), dtype=node_ids.dtype)
+    result["v"] = np.empty(len(points), dtype=node_ids.dtype)
+
+    for start in range(0, len(points), SNAP_BLOCK):
+        block = slice(start, min(start + SNAP_BLOCK, len(points)))
+        cand = candidates[block]                                            # (points, k)
+        p = points[block][:, None, None, :]                                 # (points, 1, 1, 2)
+
+        # all the edges of the candidate nodes as segments, padded to the largest degree: (points, k, degree)
+        degree = indptr[cand + 1] - indptr[cand]
+        offsets = np.arange(max(int(degree.max()), 1))
+        valid = offsets < degree[:, :, None]
+        u_pos = np.broadcast_to(cand[:, :, None], valid.shape)
+        v_pos = np.where(valid, indices[np.minimum(indptr[cand][:, :, None] + offsets, len(indices) - 1)] if len(indices) > 0 else 0, u_pos)
+
+        # projection of every point on all its segments, at once
+        a = xy[u_pos]
+        ab = xy[v_pos] - a
+        length2 = np.maximum((ab * ab).sum(axis=-1), 1e-12)
+        t = np.clip(((p - a) * ab).sum(axis=-1) / length2, 0, 1)
+        proj = a + t[..., None] * ab
+        dist = np.hypot(*np.moveaxis(p - proj, -1, 0))
+
+        # isolated candidates: only the closest node is kept (as a segment of length zero)
+        valid[:, 0, 0] |= ~valid.any(axis=(1, 2))
+        dist = np.where(valid, dist, np.inf)
+
+        n_block = len(cand)
+        best = dist.reshape(n_block, -1).argmin(axis=1)
+        rows = np.arange(n_block)
+        result["u"][block] = node_ids[u_pos.reshape(n_block, -1)[rows, best]]
+        result["v"][block] = node_ids[v_pos.reshape(n_block, -1)[rows, best]]
+        result["fraction"][block] = t.reshape(n_block, -1)[rows, best]
+        result["distance"][block] = dist.reshape(n_block, -1)[rows, best]
+        result["x"][block] = proj[..., 0].reshape(n_block, -1)[rows, best]
+        result["y"][block] = proj[..., 1].reshape(n_block, -1)[rows, best]
+
+    return result
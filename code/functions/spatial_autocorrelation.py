@@ -0,0 +1,267 @@
+# Import Libraries
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import norm
+from concurrent.futures import ProcessPoolExecutor
+
+
+# default number of permutations of the tests
+PERMUTATIONS = 99999
+
+# default seed of the permutations (the results do not depend on the number of workers)
+SEED = 12345
+
+# permutations of the global test drawn together (one sparse product for the whole batch)
+GLOBAL_BATCH = 1000
+
+# observations of the local test handled by a single task
+LOCAL_CHUNK = 32
+
+# names of the quadrants of the Moran scatterplot
+QUADRANTS = {1: "High-High", 2: "Low-High", 3: "Low-Low", 4: "High-Low"}
+
+# state shared with the worker processes (set by `_init_worker()`)
+_WORKER_STATE = {}
+
+
+def row_standardize(W):
+    """
+    returns the given sparse weights with each row divided by its sum (style "W" of spdep),
+    rows without neighbours are kept at zero
+    """
+    W = sparse.csr_matrix(W, dtype=np.float64)
+    row_sums = np.asarray(W.sum(axis=1)).ravel()
+    scale = np.divide(1.0, row_sums, out=np.zeros_like(row_sums), where=row_sums != 0)
+    return sparse.diags(scale) @ W
+
+
+def _init_worker(z, W, random_ids=None):
+    """
+    stores the standardized values, the weights and the random neighbours (local test) in the worker process
+    """
+    _WORKER_STATE["z"] = z
+    _WORKER_STATE["W"] = sparse.csr_matrix(W)
+    _WORKER_STATE["random_ids"] = random_ids
+
+
+def _global_task(task):
+    """
+    returns the Moran's I of a batch of random permutations of the values
+    """
+    seed, n_permutations = task
+    z = _WORKER_STATE["z"]
+    W = _WORKER_STATE["W"]
+    rng = np.random.default_rng(seed)
+
+    # one row for each permutation, then a single sparse product for the whole batch
+    Z = z[rng.permuted(np.tile(np.arange(len(z)), (n_permutations, 1)), axis=1)]
+    lags = (W @ Z.T).T
+    return len(z) / W.sum() * (Z * lags).sum(axis=1) / (z * z).sum()
+
+
+def _sample_without_replacement(rng, n_rows, pool, k):
+    """
+    returns an (n_rows, k) array, each row with k distinct values in range(pool), in random order
+
+    Note: Floyd's algorithm, vectorized over the rows: only k values are drawn for each row
+    (never the whole pool), at step j a value already in the row is replaced by j itself
+    """
+    sample = np.empty((n_rows, k), dtype=np.int32)
+    for col, j in enumerate(range(pool - k, pool)):
+        values = rng.integers(0, j + 1, size=n_rows)
+        taken = (sample[:, :col] == values[:, None]).any(axis=1)
+        sample[:, col] = np.where(taken, j, values)
+    # Floyd's algorithm draws a uniform subset, the order of the values is shuffled afterwards
+    return rng.permuted(sample, axis=1)
+
+
+def _local_task(observations):
+    """
+    returns, for a chunk of observations, the local statistics of the conditional permutations
+    (number of permutations with a larger value, mean and standard deviation)
+    """
+    z = _WORKER_STATE["z"]
+    W = _WORKER_STATE["W"]
+    random_ids = _WORKER_STATE["random_ids"]
+    n = len(z)
+    m2 = (z * z).sum() / n
+
+    results = []
+    for i in observations:
+        weights = W.data[W.indptr[i]:W.indptr[i + 1]]
+        k = len(weights)
+        if k == 0:
+            results.append((0, 0.0, 0.0))
+            continue
+
+        # random neighbours among the other n-1 values: positions >= i are shifted by one (skip the observation itself)
+        ids = random_ids[:, :k]
+        ids = ids + (ids >= i)
+        simulated = z[i] / m2 * (z[ids] * weights).sum(axis=1)
+
+        observed = z[i] / m2 * (z[W.indices[W.indptr[i]:W.indptr[i + 1]]] * weights).sum()
+        results.append((int((simulated >= observed).sum()), float(simulated.mean()), float(simulated.std())))
+
+    return results
+
+
+def _run_tasks(function, tasks, z, W, n_workers, random_ids=None):
+    """
+    runs the tasks in this process or in a pool of processes, returns the list of their results
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    if n_workers <= 1 or len(tasks) <= 1:
+        _init_worker(z, W, random_ids)
+        return [function(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(z, W, random_ids)) as executor:
+        return list(executor.map(function, tasks))
+
+
+def moran(y, W, permutations=PERMUTATIONS, seed=SEED, n_workers=None):
+    """
+    Input:
+        > y             array with the values of the variable (e.g. the Sale column)
+        > W             sparse weights (n x n), e.g. row standardized with `row_standardize()`
+        > permutations  number of random permutations of the values (0 to skip the permutation test)
+        > seed          seed of the permutations
+        > n_workers     number of worker processes (default: number of cores, 1 runs in the main process)
+
+    Output:
+        > dictionary with the global Moran's I and its tests (like `moran.test()` of spdep, alternative "greater")
+            - "I", "expectation"
+            - "variance_normality", "z_normality", "p_normality"
+            - "variance_randomization", "z_randomization", "p_randomization"
+            - "p_permutation"   pseudo p-value of the permutation test (None if permutations is 0)
+    """
+    y = np.asarray(y, dtype=np.float64)
+    W = sparse.csr_matrix(W, dtype=np.float64)
+    n = len(y)
+    z = y - y.mean()
+
+    # moments of the weights
+    S0 = W.sum()
+    S1 = 0.5 * (W + W.T).power(2).sum()
+    S2 = ((np.asarray(W.sum(axis=1)).ravel() + np.asarray(W.sum(axis=0)).ravel()) ** 2).sum()
+
+    I = n / S0 * (z @ (W @ z)) / (z @ z)
+    EI = -1.0 / (n - 1)
+
+    # variance under normality and under randomization
+    var_normality = (n * n * S1 - n * S2 + 3 * S0 * S0) / (S0 * S0 * (n * n - 1)) - EI * EI
+    k = (z ** 4).sum() / n / ((z * z).sum() / n) ** 2
+    var_randomization = (
+        n * ((n * n - 3 * n + 3) * S1 - n * S2 + 3 * S0 * S0) - k * (n * (n - 1) * S1 - 2 * n * S2 + 6 * S0 * S0)
+        ) / ((n - 1) * (n - 2) * (n - 3) * S0 * S0) - EI * EI
+
+    result = {
+        "I": float(I),
+        "expectation": EI,
+        "variance_normality": float(var_normality),
+        "z_normality": float((I - EI) / np.sqrt(var_normality)),
+        "variance_randomization": float(var_randomization),
+        "z_randomization": float((I - EI) / np.sqrt(var_randomization)),
+        "p_permutation": None
+    }
+    result["p_normality"] = float(norm.sf(result["z_normality"]))
+    result["p_randomization"] = float(norm.sf(result["z_randomization"]))
+
+    # permutation test, in batches with independent seeds
+    if permutations > 0:
+        batches = [GLOBAL_BATCH] * (permutations // GLOBAL_BATCH) + ([permutations % GLOBAL_BATCH] if permutations % GLOBAL_BATCH else [])
+        seeds = np.random.SeedSequence(seed).spawn(len(batches))
+        simulated = np.concatenate(_run_tasks(_global_task, list(zip(seeds, batches)), z, W, n_workers))
+        larger = (simulated >= I).sum()
+        result["p_permutation"] = float((min(larger, permutations - larger) + 1) / (permutations + 1))
+
+    return result
+
+
+def local_moran(y, W, permutations=PERMUTATIONS, seed=SEED, n_workers=None):
+    """
+    Input:
+        > y             array with the values of the variable (e.g. the Sale column)
+        > W             sparse weights (n x n), e.g. row standardized with `row_standardize()`
+        > permutations  number of conditional permutations of each observation
+        > seed          seed of the permutations
+        > n_workers     number of worker processes (default: number of cores, 1 runs in the main process)
+
+    Output:
+        > dataframe with one row for each observation (like `localmoran()` of spdep)
+            - "Ii"          local Moran's I
+            - "z", "lag"    standardized value and its spatial lag (axes of the Moran scatterplot)
+            - "quadrant"    quadrant of the Moran scatterplot (see QUADRANTS)
+            - "p_sim"       pseudo p-value of the conditional permutation test (folded)
+            - "z_sim"       z-value of Ii with respect to the permutations
+
+    Conditional permutations: for each observation the values of the other observations are shuffled,
+    keeping its own value fixed. Like the conditional randomization of PySAL, a single matrix of random
+    neighbours (permutations x largest number of neighbours, without replacement among n-1 values)
+    is drawn once and shared by all the observations, and all the permutations of an observation
+    are evaluated at once
+    """
+    y = np.asarray(y, dtype=np.float64)
+    W = sparse.csr_matrix(W, dtype=np.float64)
+    W.sort_indices()
+    n = len(y)
+    z = y - y.mean()
+    m2 = (z * z).sum() / n
+
+    lag = W @ z
+    Ii = z / m2 * lag
+
+    result = pd.DataFrame({"Ii": Ii, "z": z / np.sqrt(m2), "lag": lag / np.sqrt(m2)})
+    result["quadrant"] = np.select(
+        [(z > 0) & (lag > 0), (z <= 0) & (lag > 0), (z <= 0) & (lag <= 0)],
+        [1, 2, 3],
+        default=4
+        )
+
+    if permutations > 0:
+        max_k = min(max(1, int(np.diff(W.indptr).max())), n - 1)
+        random_ids = _sample_without_replacement(np.random.default_rng(seed), permutations, n - 1, max_k)
+        chunks = [list(range(i, min(i + LOCAL_CHUNK, n))) for i in range(0, n, LOCAL_CHUNK)]
+        simulations = [row for chunk_result in _run_tasks(_local_task, chunks, z, W, n_workers, random_ids) for row in chunk_result]
+
+        larger = np.array([row[0] for row in simulations])
+        mean_sim = np.array([row[1] for row in simulations])
+        std_sim = np.array([row[2] for row in simulations])
+        result["p_sim"] = (np.minimum(larger, permutations - larger) + 1) / (permutations + 1)
+        result["z_sim"] = np.divide(Ii - mean_sim, std_sim, out=np.zeros(n), where=std_sim > 0)
+
+    return result
+
+
+def moran_analysis(geodf, weights, columns=("Sale", "Rent"), permutations=PERMUTATIONS, seed=SEED, n_workers=None):
+    """
+    Input:
+        > geodf         geodataframe with the municipalities and the columns to test
+        > weights       dictionary name -> sparse weights (e.g. {"k-nearest neighbours (k=1)": W, ...})
+        > columns       columns of geodf to test
+        > permutations  number of permutations of the tests
+        > seed          seed of the permutations
+        > n_workers     number of worker processes
+
+    Output:
+        > dataframe with one row for each pair (column, neighbourhood), like the tables of the R notebook,
+          the weights are row standardized (style "W") before the tests
+    """
+    rows = []
+    for column in columns:
+        for name, W in weights.items():
+            res = moran(geodf[column].values, row_standardize(W), permutations, seed, n_workers)
+            rows.append({
+                "Variable": column,
+                "Neighbourhood": name,
+                "Moran_I_statistic": round(res["I"], 3),
+                "Expectation": round(res["expectation"], 3),
+                "Moran_I_stat_std_dev": round(res["z_randomization"], 3),
+                "p_value": res["p_randomization"],
+                "p_value_normality": res["p_normality"],
+                "p_value_permutation": res["p_permutation"]
+            })
+    return pd.DataFrame(rows)
@@ -0,0 +1,268 @@
+# Import Libraries
+import os
+import json
+import hashlib
+import numpy as np
+import geopandas as gpd
+from scipy import sparse
+from scipy.spatial import cKDTree
+from scipy.sparse.csgraph import minimum_spanning_tree, connected_components
+from .route_stats import EARTH_RADIUS
+
+
+# default folder of the cached weights (relative to the 'code' folder, like the other data paths)
+WEIGHTS_CACHE_DIR = "../data/cache/spatial_weights"
+
+# radius of the earth (km), the distances between the municipalities are great circle distances (like longlat = T in R)
+EARTH_RADIUS_KM = EARTH_RADIUS / 1000
+
+# neighbourhoods of the R notebook: k of the k-nearest neighbours and distances (km) of the critical cut-off
+KNN_VALUES = [1, 2, 3, 4]
+CUTOFF_DISTANCES = [12, 16, 20, 24]
+
+
+def representative_coords(geodf):
+    """
+    returns an (n, 2) array with longitude and latitude of a point inside each polygon of the geodataframe
+
+    Note: unlike the centroids, the representative points always fall inside their municipality
+    (see 'udine_mun_centroids_problem.png')
+    """
+    points = geodf.to_crs(epsg=4326).representative_point()
+    return np.column_stack([points.x.values, points.y.values])
+
+
+def _unit_vectors(coords):
+    """
+    returns the 3D unit vectors of the given longitudes and latitudes (degrees):
+    the euclidean (chord) distance between them is monotonic in the great circle distance
+    """
+    lons = np.radians(coords[:, 0])
+    lats = np.radians(coords[:, 1])
+    return np.column_stack([np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)])
+
+
+def _chord_to_km(chord):
+    """
+    converts chord distances (on the unit sphere) into great circle distances (km)
+    """
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def _km_to_chord(distance_km):
+    """
+    converts a great circle distance (km) into the chord distance on the unit sphere
+    """
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def _to_matrix(rows, cols, n, values=None):
+    """
+    returns the (n x n) csr matrix with the given entries (ones if no values are given)
+    """
+    if values is None:
+        values = np.ones(len(rows))
+    return sparse.csr_matrix((values, (rows, cols)), shape=(n, n))
+
+
+def knn_weights(coords, k, distances=False):
+    """
+    Input:
+        > coords        (n, 2) array with longitude and latitude of the spatial units
+        > k             number of neighbours of each unit
+        > distances     boolean value, if set to True the entries are the distances (km) instead of ones
+
+    Output:
+        > sparse (n x n) matrix, row i has the k nearest units of unit i (like `knn2nb(knearneigh(..., longlat = T))`)
+    """
+    n = len(coords)
+    k = min(k, n - 1)
+    chords, ids = cKDTree(_unit_vectors(coords)).query(_unit_vectors(coords), k=k + 1)
+    chords = chords.reshape(n, k + 1)
+    ids = ids.reshape(n, k + 1)
+
+    # drop the unit itself (not always the first result, if two units share the same point)
+    keep = ids != np.arange(n)[:, None]
+    keep[keep.sum(axis=1) > k, -1] = False
+    rows = np.repeat(np.arange(n), k)
+    values = _chord_to_km(chords[keep]) if distances else None
+
+    return _to_matrix(rows, ids[keep], n, values)
+
+
+def critical_cutoff(coords, connected=False):
+    """
+    Input:
+        > coords        (n, 2) array with longitude and latitude of the spatial units
+        > connected     boolean value
+                            - False: the cut-off guarantees that every unit has at least one neighbour,
+                              i.e. the maximum distance of the nearest neighbours (as in the R notebook)
+                            - True: the cut-off guarantees that the neighbourhood graph is connected,
+                              i.e. the longest edge of the minimum spanning tree
+
+    Output:
+        > critical cut-off distance (km)
+
+    Note: no (n x n) distance matrix is built. The minimum spanning tree is computed on the pairs closer
+    than the longest edge of a spanning tree of the k-nearest neighbours graph (an upper bound of the
+    cut-off), so it contains every edge of the exact minimum spanning tree
+    """
+    n = len(coords)
+    if n < 2:
+        return 0.0
+
+    nearest = knn_weights(coords, 1, distances=True)
+    if not connected:
+        return float(nearest.data.max())
+
+    # upper bound: spanning tree of the (symmetric) k-nearest neighbours graph, k doubled until it is connected
+    k = 1
+    while True:
+        graph = knn_weights(coords, k, distances=True)
+        graph.data = np.maximum(graph.data, 1e-12)                          # units sharing the same point stay connected
+        graph = graph.maximum(graph.T)
+        if connected_components(graph, directed=False)[0] == 1 or k >= n - 1:
+            break
+        k = min(2 * k, n - 1)
+    upper_bound = minimum_spanning_tree(graph).data.max()
+
+    # exact minimum spanning tree on the pairs within the upper bound
+    tree = cKDTree(_unit_vectors(coords))
+    pairs = tree.query_pairs(_km_to_chord(upper_bound) * (1 + 1e-9), output_type="ndarray").reshape(-1, 2)
+    vectors = _unit_vectors(coords)
+    lengths = _chord_to_km(np.linalg.norm(vectors[pairs[:, 0]] - vectors[pairs[:, 1]], axis=1))
+    spanning_tree = minimum_spanning_tree(_to_matrix(pairs[:, 0], pairs[:, 1], n, np.maximum(lengths, 1e-12)))
+
+    return float(spanning_tree.data.max())
+
+
+def distance_band_weights(coords, max_distance, min_distance=0, distances=False):
+    """
+    Input:
+        > coords        (n, 2) array with longitude and latitude of the spatial units
+        > max_distance  maximum distance (km) between two neighbours
+        > min_distance  minimum distance (km) between two neighbours
+        > distances     boolean value, if set to True the entries are the distances (km) instead of ones
+
+    Output:
+        > sparse symmetric (n x n) matrix, like `dnearneigh(coords, min_distance, max_distance, longlat = T)`
+    """
+    n = len(coords)
+    vectors = _unit_vectors(coords)
+    pairs = cKDTree(vectors).query_pairs(_km_to_chord(max_distance), output_type="ndarray").reshape(-1, 2)
+    lengths = _chord_to_km(np.linalg.norm(vectors[pairs[:, 0]] - vectors[pairs[:, 1]], axis=1))
+
+    keep = lengths > min_distance
+    pairs = pairs[keep]
+    lengths = lengths[keep]
+
+    rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    return _to_matrix(rows, cols, n, np.concatenate([lengths, lengths]) if distances else None)
+
+
+def contiguity_weights(geodf, queen=True):
+    """
+    Input:
+        > geodf         geodataframe with the polygons of the spatial units
+        > queen         boolean value
+                            - True: a single shared boundary point makes two units neighbours
+                            - False (rook): a shared boundary segment is required
+
+    Output:
+        > sparse symmetric (n x n) matrix, like `poly2nb(geodf, queen)`
+
+    Note: the candidate pairs come from a single bulk query of the spatial index
+    """
+    geoms = geodf.geometry.reset_index(drop=True)
+    n = len(geoms)
+    left, right = geoms.sindex.query_bulk(geoms, predicate="intersects")
+
+    keep = left < right
+    left = left[keep]
+    right = right[keep]
+
+    if not queen and len(left) > 0:
+        shared = gpd.GeoSeries(geoms.values[left], crs=geoms.crs).intersection(gpd.GeoSeries(geoms.values[right], crs=geoms.crs))
+        keep = shared.length.values > 0
+        left = left[keep]
+        right = right[keep]
+
+    return _to_matrix(np.concatenate([left, right]), np.concatenate([right, left]), n)
+
+
+def geometry_hash(geodf):
+    """
+    returns the sha1 hash (hex string) of the geometries of the geodataframe, in order
+    """
+    sha1 = hashlib.sha1()
+    for wkb in geodf.geometry.to_wkb():
+        sha1.update(wkb)
+    return sha1.hexdigest()
+
+
+def get_weights(geodf, kind, cache_dir=WEIGHTS_CACHE_DIR, **params):
+    """
+    Input:
+        > geodf         geodataframe with the polygons of the spatial units
+        > kind          type of neighbourhood
+                            - "knn"         k-nearest neighbours of the representative points (param: k)
+                            - "distance"    distance band of the representative points (params: max_distance, min_distance)
+                            - "queen"       contiguity, a shared point is enough
+                            - "rook"        contiguity, a shared segment is required
+        > cache_dir     folder where the weights are persisted (.npz), None to disable the persistence
+        > params        parameters of the neighbourhood (e.g. k=2)
+
+    Output:
+        > sparse (n x n) csr matrix with binary weights (to be standardized, e.g. with `row_standardize()`)
+
+    Note: the cache key is the hash of the geometries plus the parameters, so a change of the polygons
+    (or of their order) invalidates the cached weights
+    """
+    if cache_dir is not None:
+        key = json.dumps({"kind": kind, "params": params, "geometry": geometry_hash(geodf)}, sort_keys=True)
+        weights_path = os.path.join(cache_dir, kind + "_" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".npz")
+        if os.path.exists(weights_path):
+            return sparse.load_npz(weights_path).tocsr()
+
+    if kind == "knn":
+        W = knn_weights(representative_coords(geodf), params["k"])
+    elif kind == "distance":
+        W = distance_band_weights(representative_coords(geodf), params["max_distance"], params.get("min_distance", 0))
+    elif kind in ["queen", "rook"]:
+        W = contiguity_weights(geodf, queen=(kind == "queen"))
+    else:
+        raise ValueError("Unknown kind of neighbourhood: " + str(kind))
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        sparse.save_npz(weights_path, W)
+
+    return W
+
+
+def build_weights(geodf, ks=KNN_VALUES, distances=CUTOFF_DISTANCES, cache_dir=WEIGHTS_CACHE_DIR):
+    """
+    Input:
+        > geodf         geodataframe with the polygons of the spatial units (e.g. the municipalities joined with the house costs)
+        > ks            list with the number of neighbours of the k-nearest neighbours
+        > distances     list with the cut-off distances (km), each one must be at least `critical_cutoff()`
+        > cache_dir     folder where the weights are persisted, None to disable the persistence
+
+    Output:
+        > dictionary name -> sparse weights, with the neighbourhoods of the R notebook
+          (ready for `moran_analysis()`)
+    """
+    cutoff = critical_cutoff(representative_coords(geodf))
+    print("> Critical cut-off distance:", round(cutoff, 2), "km")
+
+    weights = {}
+    for k in ks:
+        weights["k-nearest neighbours (k=" + str(k) + ")"] = get_weights(geodf, "knn", cache_dir, k=k)
+    for distance in distances:
+        if distance < cutoff:
+            print("WARNING: with d=" + str(distance) + " some municipalities have no neighbours")
+        weights["critical cut-off neighbourhood (d=" + str(distance) + ")"] = get_weights(geodf, "distance", cache_dir, max_distance=distance)
+    weights["contiguity-based neighbourhood"] = get_weights(geodf, "queen", cache_dir)
+
+    return weights
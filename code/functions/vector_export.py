@@ -0,0 +1,229 @@
+# Import Libraries
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+from jinja2 import Template
+from shapely.geometry import box
+from branca.element import MacroElement, JavascriptLink
+from .polyline import METERS_PER_PIXEL_Z0
+
+
+# extent of a vector tile (coordinates of the geometries inside a tile)
+TILE_EXTENT = 4096
+
+# buffer around each tile, in pixels of a 256 px tile (avoids visible seams at the borders)
+TILE_BUFFER = 4
+
+# Leaflet plugin used to show the vector tiles
+VECTORGRID_JS = "https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"
+
+
+def export_topojson(geodf, path, columns, simplify_tolerance=None, quantization=1e5):
+    """
+    Input:
+        > geodf             geodataframe with the polygons (e.g. municipalities joined with the house costs)
+        > path              path of the TopoJSON file to write
+        > columns           list of columns stored as properties of the polygons
+        > simplify_tolerance    tolerance (degrees) of the simplification of the arcs, None to keep every vertex
+        > quantization      number of distinct values of each coordinate (TopoJSON quantization)
+
+    Output:
+        > path of the written file
+
+    The shared borders are stored once (arcs), so the file is much smaller than the GeoJSON.
+    Requires the `topojson` package (see `environment/environment.yaml`).
+    """
+    try:
+        import topojson
+    except ImportError:
+        raise ImportError("The TopoJSON export requires the 'topojson' package (pip install topojson)")
+
+    topology = topojson.Topology(
+        geodf.to_crs(epsg=4326)[columns + ["geometry"]],
+        prequantize=quantization,
+        toposimplify=simplify_tolerance if simplify_tolerance is not None else False
+        )
+    with open(path, "w", encoding="UTF-8") as topojson_file:
+        topojson_file.write(topology.to_json())
+
+    return path
+
+
+def simplify_shared_borders(geodf, tolerance):
+    """
+    Input:
+        > geodf         geodataframe with the polygons (e.g. municipalities joined with the house costs)
+        > tolerance     tolerance of the simplification, in units of the crs of geodf
+
+    Output:
+        > copy of geodf with the simplified polygons
+
+    Unlike `GeoSeries.simplify()`, each shared border is simplified once (as an arc of the topology),
+    so neighbouring polygons keep the same border, without gaps nor overlaps.
+    Without the `topojson` package, every polygon is simplified on its own (`preserve_topology=True`)
+    """
+    simplified = geodf.copy()
+    try:
+        import topojson
+    except ImportError:
+        simplified["geometry"] = geodf.geometry.simplify(tolerance, preserve_topology=True)
+        return simplified
+
+    topology = topojson.Topology(geodf[["geometry"]], prequantize=False, toposimplify=tolerance)
+    simplified["geometry"] = topology.to_gdf().geometry.values                 # same order of the polygons
+    return simplified
+
+
+def _write_zoom_tiles(task):
+    """
+    writes all the tiles of one zoom level, returns the number of tiles written
+    """
+    import mercantile
+    import mapbox_vector_tile
+
+    geodf, zoom, tiles_dir, layer_name = task
+
+    # simplified once for the zoom level (half a pixel of tolerance)
+    pixel_size = METERS_PER_PIXEL_Z0 / (2 ** zoom)
+    geodf = geodf.copy()
+    geodf["geometry"] = geodf.geometry.simplify(pixel_size / 2, preserve_topology=True)
+    properties = geodf.drop(columns="geometry").to_dict("records")
+
+    written = 0
+    west, south, east, north = geodf.to_crs(epsg=4326).total_bounds
+    for tile in mercantile.tiles(west, south, east, north, zooms=zoom):
+
+        bounds = mercantile.xy_bounds(tile)
+        tile_box = box(*bounds).buffer(TILE_BUFFER * pixel_size, join_style=2)
+
+        features = []
+        for i in geodf.sindex.query(tile_box, predicate="intersects"):
+            geom = geodf.geometry.values[i].intersection(tile_box)
+            if not geom.is_empty:
+                features.append({"geometry": geom, "properties": properties[i]})
+
+        if len(features) == 0:
+            continue
+
+        tile_data = mapbox_vector_tile.encode(
+            [{"name": layer_name, "features": features}],
+            quantize_bounds=(bounds.left, bounds.bottom, bounds.right, bounds.top),
+            extents=TILE_EXTENT
+            )
+
+        tile_dir = os.path.join(tiles_dir, str(tile.z), str(tile.x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, str(tile.y) + ".pbf"), "wb") as tile_file:
+            tile_file.write(tile_data)
+        written += 1
+
+    return written
+
+
+def export_vector_tiles(geodf, tiles_dir, columns, min_zoom=6, max_zoom=12, layer_name="municipalities", n_workers=None):
+    """
+    Input:
+        > geodf             geodataframe with the polygons (e.g. municipalities joined with the house costs)
+        > tiles_dir         folder where the tiles are written, as {z}/{x}/{y}.pbf
+        > columns           list of columns stored as properties of the polygons
+        > min_zoom          first zoom level
+        > max_zoom          last zoom level
+        > layer_name        name of the layer inside the tiles
+        > n_workers         number of processes (default: number of cpus), 1 to write the tiles in this process
+
+    Output:
+        > dictionary zoom -> number of tiles written
+
+    The zoom levels are written in parallel. The folder can be served by any static file server
+    (e.g. `python -m http.server` from its parent folder) and shown with `add_vector_tiles_layer()`.
+    Requires the `mapbox_vector_tile` and `mercantile` packages (see `environment/environment.yaml`).
+    """
+    try:
+        import mercantile
+        import mapbox_vector_tile
+    except ImportError:
+        raise ImportError("The vector tiles export requires the 'mapbox_vector_tile' and 'mercantile' packages")
+
+    os.makedirs(tiles_dir, exist_ok=True)
+
+    # projected once in web mercator, the tiles crs
+    geodf = geodf.to_crs(epsg=3857)[columns + ["geometry"]].reset_index(drop=True)
+    zooms = list(range(min_zoom, max_zoom + 1))
+    tasks = [(geodf, zoom, tiles_dir, layer_name) for zoom in zooms]
+
+    if n_workers == 1 or len(zooms) == 1:
+        written = [_write_zoom_tiles(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            written = list(executor.map(_write_zoom_tiles, tasks))
+
+    # metadata of the tileset, useful to the clients
+    with open(os.path.join(tiles_dir, "metadata.json"), "w", encoding="UTF-8") as metadata_file:
+        json.dump({"name": layer_name, "minzoom": min_zoom, "maxzoom": max_zoom, "fields": columns}, metadata_file)
+
+    return dict(zip(zooms, written))
+
+
+class VectorGridLayer(MacroElement):
+    """
+    folium layer with the vector tiles served at the given url, shown with Leaflet.VectorGrid
+    (the fill color of each polygon is read from the given property)
+    """
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.vectorGrid.protobuf(
+                {{ this.url|tojson }},
+                {
+                    interactive: true,
+                    maxNativeZoom: {{ this.max_zoom }},
+                    vectorTileLayerStyles: {
+                        {{ this.layer_name|tojson }}: function(properties, zoom) {
+                            return {
+                                fill: true,
+                                fillColor: properties[{{ this.color_property|tojson }}],
+                                fillOpacity: 0.6,
+                                color: "black",
+                                opacity: 0.6,
+                                weight: 1
+                            };
+                        }
+                    }
+                }
+            ).on("click", function(e) {
+                var properties = e.layer.properties;
+                L.popup().setContent(
+                    {{ this.popup_fields|tojson }}.map(function(field) { return "<b>" + field + "</b>: " + properties[field]; }).join("<br>")
+                ).setLatLng(e.latlng).openOn({{ this._parent.get_name() }});
+            }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+        """)
+
+    def __init__(self, url, layer_name="municipalities", color_property="fill_color", popup_fields=(), max_zoom=12, name="Vector Tiles"):
+        super(VectorGridLayer, self).__init__()
+        self._name = name
+        self.url = url
+        self.layer_name = layer_name
+        self.color_property = color_property
+        self.popup_fields = list(popup_fields)
+        self.max_zoom = max_zoom
+
+    def render(self, **kwargs):
+        super(VectorGridLayer, self).render(**kwargs)
+        self.get_root().header.add_child(JavascriptLink(VECTORGRID_JS), name="leaflet_vectorgrid")
+
+
+def add_vector_tiles_layer(folium_map, url, layer_name="municipalities", color_property="fill_color", popup_fields=(), max_zoom=12):
+    """
+    Input:
+        > folium_map        folium map
+        > url               url of the tiles, e.g. "http://localhost:8000/tiles/{z}/{x}/{y}.pbf"
+        > layer_name        name of the layer inside the tiles (see `export_vector_tiles()`)
+        > color_property    property with the fill color of each polygon
+        > popup_fields      properties shown in the popup of a polygon
+        > max_zoom          last zoom level of the tiles (higher zooms reuse its tiles)
+
+    Output:
+        > the map, with the layer added (the browser loads only the tiles it shows)
+    """
+    VectorGridLayer(url, layer_name, color_property, popup_fields, max_zoom).add_to(folium_map)
+    return folium_map
@@ -0,0 +1,13 @@
+"""
+Tests of the functions, on small synthetic fixtures (see `benchmarks/fixtures.py`).
+
+Usage (from the 'code' folder):
+    python -m pytest tests
+"""
+
+# Import Libraries
+import os
+import sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
@@ -0,0 +1,85 @@
+# Import Libraries
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from benchmarks.fixtures import make_grid_network
+from functions.routing_graph import build_routing_graph, csr_single_source_dijkstra, csr_route
+
+
+# side of the grid network (nodes)
+SIDE = 5
+
+# distance between two adjacent nodes of the grid (m)
+SPACING = 50
+
+
+def _add_nodes(nodes, ids, lon, lat):
+    """
+    returns the nodes with new nodes (all in the same position) appended
+    """
+    extra = gpd.GeoDataFrame({"id": ids, "lon": lon, "lat": lat}, geometry=gpd.points_from_xy([lon] * len(ids), [lat] * len(ids)), crs=4326)
+    return pd.concat([nodes, extra], ignore_index=True)
+
+
+def test_grid_graph():
+    nodes, edges = make_grid_network(SIDE, SPACING)
+    graph = build_routing_graph(nodes, edges)
+
+    assert len(graph["node_ids"]) == SIDE * SIDE
+    assert np.all(np.diff(graph["node_ids"]) > 0)
+    # every undirected edge in both directions
+    assert graph["matrix"].nnz == 2 * 2 * SIDE * (SIDE - 1)
+    assert np.allclose(graph["lengths"], SPACING)
+    assert (graph["matrix"] != graph["matrix"].T).nnz == 0
+    # the corner has two neighbours, the center four
+    degree = np.diff(graph["indptr"])
+    assert degree[0] == 2
+    assert degree[SIDE * SIDE // 2] == 4
+
+
+def test_shortest_route_on_grid():
+    nodes, edges = make_grid_network(SIDE, SPACING)
+    graph = build_routing_graph(nodes, edges)
+    source = 0
+    target = SIDE * SIDE - 1
+
+    distances, predecessors = csr_single_source_dijkstra(graph, source)
+    route = csr_route(predecessors, source, target)
+
+    assert distances[target] == 2 * (SIDE - 1) * SPACING
+    assert route[0] == source and route[-1] == target
+    assert len(route) == 2 * (SIDE - 1) + 1
+
+
+def test_edges_with_missing_nodes_are_dropped():
+    nodes, edges = make_grid_network(SIDE, SPACING)
+    dangling = pd.DataFrame({"u": [1, 999999], "v": [999998, 2], "length": [10.0, 10.0]})
+    graph = build_routing_graph(nodes, pd.concat([edges, dangling], ignore_index=True))
+    expected = build_routing_graph(nodes, edges)
+
+    assert np.array_equal(graph["indptr"], expected["indptr"])
+    assert np.array_equal(graph["indices"], expected["indices"])
+
+
+def test_shortest_parallel_edge_is_kept():
+    nodes, edges = make_grid_network(SIDE, SPACING)
+    shortcut = pd.DataFrame({"u": [1], "v": [2], "length": [10.0]})
+    graph = build_routing_graph(nodes, pd.concat([edges, shortcut], ignore_index=True))
+
+    assert graph["matrix"][0, 1] == 10.0
+    assert graph["matrix"][1, 0] == 10.0
+    assert graph["matrix"].nnz == 2 * 2 * SIDE * (SIDE - 1)
+
+
+def test_largest_component():
+    nodes, edges = make_grid_network(SIDE, SPACING)
+    nodes = _add_nodes(nodes, [1000, 1001], nodes["lon"].values[0], nodes["lat"].values[0])
+    edges = pd.concat([edges, pd.DataFrame({"u": [1000], "v": [1001], "length": [5.0]})], ignore_index=True)
+
+    graph = build_routing_graph(nodes, edges)
+    assert len(graph["node_ids"]) == SIDE * SIDE
+    assert 1000 not in graph["node_ids"]
+    assert graph["indices"].max() < SIDE * SIDE
+
+    all_components = build_routing_graph(nodes, edges, largest_component=False)
+    assert len(all_components["node_ids"]) == SIDE * SIDE + 2
@@ -0,0 +1,56 @@
+# Import Libraries
+import numpy as np
+from benchmarks.fixtures import make_grid_network, DEG_PER_METER
+from functions.routing_graph import build_routing_graph
+from functions.snapping import snap_to_nodes, snap_to_edges
+
+
+# side of the grid network (nodes)
+SIDE = 6
+
+# distance between two adjacent nodes of the grid (m)
+SPACING = 50
+
+
+def _grid_graph():
+    return build_routing_graph(*make_grid_network(SIDE, SPACING))
+
+
+def test_nodes_snap_to_themselves():
+    graph = _grid_graph()
+    nodes, distances = snap_to_nodes(graph, graph["lon"], graph["lat"])
+
+    assert np.array_equal(nodes, np.arange(SIDE * SIDE))
+    assert np.allclose(distances, 0, atol=1e-6)
+
+
+def test_snap_to_nodes_picks_the_closest():
+    graph = _grid_graph()
+    # 10 m north of node 7 (40 m from node 7 + SIDE)
+    lat = graph["lat"][7] + 10 * DEG_PER_METER
+    nodes, distances = snap_to_nodes(graph, [graph["lon"][7]], [lat])
+
+    assert nodes[0] == 7
+    assert abs(distances[0] - 10) < 0.5
+
+
+def test_snap_to_edges_projects_on_the_segment():
+    graph = _grid_graph()
+    # 30% of the way from node 7 to node 8 (east), 5 m to the north
+    lon = graph["lon"][7] + 0.3 * (graph["lon"][8] - graph["lon"][7])
+    lat = graph["lat"][7] + 5 * DEG_PER_METER
+    snapped = snap_to_edges(graph, [lon], [lat])
+
+    assert {int(snapped["u"][0]), int(snapped["v"][0])} == {7, 8}
+    fraction = snapped["fraction"][0] if snapped["u"][0] == 7 else 1 - snapped["fraction"][0]
+    assert abs(fraction - 0.3) < 0.01
+    assert abs(snapped["distance"][0] - 5) < 0.5
+
+
+def test_snap_to_edges_matches_the_nodes_on_the_nodes():
+    graph = _grid_graph()
+    snapped = snap_to_edges(graph, graph["lon"], graph["lat"])
+
+    closest_node = np.where(snapped["fraction"] < 0.5, snapped["u"], snapped["v"])
+    assert np.array_equal(closest_node, np.arange(SIDE * SIDE))
+    assert np.allclose(snapped["distance"], 0, atol=1e-6)
@@ -0,0 +1,70 @@
+# Import Libraries
+import numpy as np
+from benchmarks.check_spatial_autocorrelation import rook_lattice
+from functions.spatial_autocorrelation import moran, local_moran, row_standardize, _sample_without_replacement
+
+
+# side of the lattice
+SIDE = 4
+
+
+def _gradient():
+    return np.tile(np.arange(SIDE), SIDE).astype(float)
+
+
+def _checkerboard():
+    return np.array([(i + j) % 2 for i in range(SIDE) for j in range(SIDE)], dtype=float)
+
+
+def test_moran_of_gradient():
+    # values computed by hand, see `benchmarks/check_spatial_autocorrelation.py`
+    result = moran(_gradient(), rook_lattice(SIDE), permutations=0)
+
+    assert np.isclose(result["I"], 2 / 3)
+    assert np.isclose(result["expectation"], -1 / 15)
+    assert np.isclose(result["variance_normality"], 1 / 27 - 1 / 225)
+
+
+def test_moran_of_checkerboard():
+    result = moran(_checkerboard(), row_standardize(rook_lattice(SIDE)), permutations=999, n_workers=1)
+
+    assert np.isclose(result["I"], -1)
+    assert result["p_permutation"] <= 0.01
+
+
+def test_local_moran_of_gradient():
+    result = local_moran(_gradient(), rook_lattice(SIDE), permutations=999, n_workers=1)
+
+    assert np.isclose(result["Ii"].values[0], 2.4)
+    assert np.isclose(result["Ii"].sum(), 40 / 1.25)
+    assert result["quadrant"].values[0] == 3
+    assert np.all((result["p_sim"] > 0) & (result["p_sim"] <= 0.5))
+
+
+def test_local_moran_of_checkerboard():
+    result = local_moran(_checkerboard(), row_standardize(rook_lattice(SIDE)), permutations=0)
+
+    assert np.allclose(result["Ii"], -1)
+    assert np.isin(result["quadrant"].values, [2, 4]).all()
+
+
+def test_local_moran_does_not_depend_on_the_workers():
+    rng = np.random.default_rng(0)
+    y = _gradient() + rng.normal(0, 0.5, SIDE * SIDE)
+    W = row_standardize(rook_lattice(SIDE))
+
+    serial = local_moran(y, W, permutations=499, seed=7, n_workers=1)
+    parallel = local_moran(y, W, permutations=499, seed=7, n_workers=2)
+    assert np.array_equal(serial["p_sim"].values, parallel["p_sim"].values)
+
+
+def test_random_neighbours_are_distinct():
+    sample = _sample_without_replacement(np.random.default_rng(0), 2000, 15, 4)
+
+    assert sample.shape == (2000, 4)
+    assert sample.min() >= 0 and sample.max() < 15
+    assert all(len(set(row)) == 4 for row in sample)
+    # every value, in every position, about 2000 / 15 times
+    for column in range(4):
+        counts = np.bincount(sample[:, column], minlength=15)
+        assert counts.min() > 0.6 * counts.mean() and counts.max() < 1.4 * counts.mean()
@@ -0,0 +1,72 @@
+# Import Libraries
+import numpy as np
+from benchmarks.fixtures import make_municipalities
+from functions.spatial_weights import representative_coords, knn_weights, distance_band_weights, critical_cutoff, contiguity_weights, EARTH_RADIUS_KM
+
+
+# side of the grid of municipalities
+SIDE = 4
+
+
+def _great_circle_km(coords):
+    """
+    returns the (n x n) matrix of the great circle distances (km) between the given longitudes and latitudes
+    """
+    lons = np.radians(coords[:, 0])
+    lats = np.radians(coords[:, 1])
+    a = np.sin((lats[:, None] - lats[None, :]) / 2) ** 2 + np.cos(lats[:, None]) * np.cos(lats[None, :]) * np.sin((lons[:, None] - lons[None, :]) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _random_coords(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.uniform(12.5, 13.8, n), rng.uniform(45.6, 46.6, n)])
+
+
+def test_contiguity_on_grid():
+    municipalities = make_municipalities(SIDE)
+    queen = contiguity_weights(municipalities, queen=True).toarray()
+    rook = contiguity_weights(municipalities, queen=False).toarray()
+
+    assert np.array_equal(queen, queen.T)
+    assert np.all(np.diag(queen) == 0)
+    # corner, border and inner cells of the grid
+    assert queen.sum(axis=1)[0] == 3 and rook.sum(axis=1)[0] == 2
+    assert queen.sum(axis=1)[1] == 5 and rook.sum(axis=1)[1] == 3
+    assert queen.sum(axis=1)[SIDE + 1] == 8 and rook.sum(axis=1)[SIDE + 1] == 4
+    # rook neighbours are also queen neighbours
+    assert np.all(queen[rook > 0] == 1)
+
+
+def test_knn_weights_match_brute_force():
+    coords = _random_coords(60)
+    distances = _great_circle_km(coords)
+    np.fill_diagonal(distances, np.inf)
+
+    for k in [1, 3]:
+        W = knn_weights(coords, k, distances=True)
+        assert np.all(np.diff(W.indptr) == k)
+        assert np.all(W.diagonal() == 0)
+        expected = np.sort(distances, axis=1)[:, :k]
+        assert np.allclose(np.sort(W.toarray(), axis=1)[:, -k:], expected, rtol=1e-9)
+
+
+def test_distance_band_matches_brute_force():
+    coords = _random_coords(60, seed=1)
+    distances = _great_circle_km(coords)
+    np.fill_diagonal(distances, np.inf)
+
+    W = distance_band_weights(coords, 15, min_distance=2)
+    expected = (distances <= 15) & (distances > 2)
+    assert np.array_equal(W.toarray() > 0, expected)
+
+
+def test_critical_cutoff():
+    coords = representative_coords(make_municipalities(SIDE, cell_size=2000))
+    distances = _great_circle_km(coords)
+    np.fill_diagonal(distances, np.inf)
+
+    cutoff = critical_cutoff(coords)
+    assert np.isclose(cutoff, distances.min(axis=1).max())
+    W = distance_band_weights(coords, cutoff * (1 + 1e-9))
+    assert np.all(np.diff(W.indptr) > 0)